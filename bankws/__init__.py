@@ -0,0 +1,55 @@
+'''bankws is a Python 3 library for using bank WebService channel.
+
+Submodules and the main classes are imported when first used, so importing
+the package costs nothing and a job loads only what it needs, e.g. parsing
+statements doesn't import suds or the crypto libraries.
+
+Usage:
+    >>> import bankws
+    >>> ws = bankws.WebService(sender_id, private_key, certificate, bankws.OP)
+    >>> statement = bankws.TransactionListResponse(text)
+'''
+import importlib
+
+_LAZY = {
+    'ApplicationResponse': 'appresponse',
+    'Bank': 'bank',
+    'C2B': 'c2b',
+    'C2BResponse': 'c2b',
+    'CertificateRequest': 'carequest',
+    'CertificateResponse': 'caresponse',
+    'GetFile': 'getfile',
+    'GetFileList': 'getfilelist',
+    'MockBank': 'mockbank',
+    'OP': 'bank',
+    'OPCertificateRequest': 'idservice',
+    'Session': 'session',
+    'SigningService': 'signingservice',
+    'TransactionListResponse': 'transactionlistresponse',
+    'UploadFile': 'uploadfile',
+    'WebService': 'webservice',
+}
+""" Public name to the submodule defining it. """
+
+__all__ = sorted(_LAZY)
+
+
+def __getattr__(name):
+    """ Imports submodule or the module of a public name on first use. """
+    module = _LAZY.get(name)
+    if module is not None:
+        value = getattr(importlib.import_module('.' + module, __name__), name)
+        globals()[name] = value
+        return value
+    if not name.startswith('__'):
+        try:
+            return importlib.import_module('.' + name, __name__)
+        except ModuleNotFoundError as e:
+            if e.name != __name__ + '.' + name:
+                raise
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(
+                         __name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
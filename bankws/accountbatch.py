@@ -0,0 +1,210 @@
+'''Accountbatch module checks and parses many account numbers at once.
+
+Functions give the same results as their one number versions in module
+util, but work on a list or NumPy array with NumPy arithmetic.
+
+Usage:
+    >>> valid_iban_mask(account_numbers)
+    >>> branches, accounts, valid = parse_account_numbers(account_numbers)
+    >>> luhn_modulo10_mask(keys)
+
+External libraries:
+    - NumPy
+'''
+import numpy
+
+try:
+    from bankws import util
+except ImportError:
+    import util
+
+
+def valid_iban_mask(account_numbers):
+    """ Checks many account numbers like L{util.is_valid_iban}
+
+    Country of every number is looked up from a table built from
+    L{util.IBAN_FORMATS}, so numbers of different countries are checked
+    together. Remainder of mod-97 is counted one character at a time for all
+    numbers at once, so no big integers are built.
+
+    @type  account_numbers: list or numpy.ndarray of strings
+    @param account_numbers: IBAN account numbers
+    @rtype: numpy.ndarray
+    @return: Boolean mask, True where account number is valid.
+    """
+    countries, iban_lengths, classes = _iban_table()
+    codes, lengths = _code_matrix(account_numbers, classes.shape[1])
+    codes = codes[:, :classes.shape[1]]
+    key = codes[:, 0] * 65536 + codes[:, 1]
+    country = numpy.searchsorted(countries, key)
+    country = numpy.minimum(country, len(countries) - 1)
+    known = countries[country] == key
+    expected = classes[country]
+    is_digit = (codes >= 48) & (codes <= 57)
+    is_upper = (codes >= 65) & (codes <= 90)
+    is_lower = (codes >= 97) & (codes <= 122)
+    matches = ((expected == 0) | ((expected == _DIGIT) & is_digit) |
+               ((expected == _UPPER) & is_upper) |
+               ((expected == _ALNUM) & (is_digit | is_upper | is_lower)))
+    valid = known & (lengths == iban_lengths[country]) & matches.all(axis=1)
+
+    # Country code and check digits go to the end, letters count as 10-35
+    values = numpy.where(is_digit, codes - 48,
+                         numpy.where(is_lower, codes - 87, codes - 55))
+    columns = numpy.arange(codes.shape[1])
+    rotate = (columns + 4) % numpy.clip(lengths, 1, len(columns))[:, None]
+    values = numpy.take_along_axis(values, rotate, axis=1)
+    values = numpy.where(valid[:, None], values, 0)
+    inside = columns < lengths[:, None]
+    remainder = numpy.zeros(len(lengths), dtype=numpy.int64)
+    for column in columns:
+        value = values[:, column]
+        scale = numpy.where(value > 9, 100, 10)
+        remainder = numpy.where(inside[:, column],
+                                (remainder * scale + value) % 97, remainder)
+    return valid & (remainder == 1)
+
+
+def parse_account_numbers(account_numbers):
+    """ Parses many account numbers like L{util.parse_account_number}
+
+    Numbers that L{util.parse_account_number} would reject are marked invalid
+    instead of raising.
+
+    @type  account_numbers: list or numpy.ndarray of strings
+    @param account_numbers: Account numbers in IBAN or BBAN format
+    @rtype: tuple(numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    @return: Branches (6 digits), accounts (8 digits) and boolean mask of
+             valid numbers. Branch and account are empty where invalid.
+    """
+    values = _text_array(account_numbers)
+    codes, lengths = _code_matrix(values, 18)
+    count = len(lengths)
+    iban = (codes[:, 0] == ord('F')) & (codes[:, 1] == ord('I'))
+    iban_valid = valid_iban_mask(values)
+    # Drop country code and check number of IBAN numbers
+    codes = numpy.where(iban[:, None], numpy.roll(codes, -4, axis=1), codes)
+    codes[iban, -4:] = 0
+    lengths = numpy.where(iban, lengths - 4, lengths)
+    # Drop the optional '-' after the branch
+    dash = codes[:, 6] == ord('-')
+    codes[dash, 6:-1] = codes[dash, 7:]
+    codes[dash, -1] = 0
+    lengths = numpy.where(dash, lengths - 1, lengths)
+
+    digits = codes - 48
+    columns = numpy.arange(codes.shape[1])
+    inside = columns < lengths[:, None]
+    is_digit = ((digits >= 0) & (digits <= 9)) | ~inside
+    first = digits[:, 0]
+    valid = ((lengths >= 8) & (lengths <= 14) & is_digit.all(axis=1) &
+             (first != 7) & (first != 9) &
+             ((first != 3) | ((digits[:, 1] != 2) & (digits[:, 1] != 5))) &
+             (iban_valid | ~iban))
+
+    # Zero fill the account part to 8 digits. Banks whose branch starts
+    # with 4 or 5 put the zeros after the first digit of the account.
+    account_length = lengths - 6
+    target = numpy.arange(6, 14)
+    split = ((first == 4) | (first == 5))[:, None]
+    source = numpy.where(split & (target == 6), 6,
+                         target - 8 + account_length[:, None])
+    zero = numpy.where(split,
+                       (target >= 7) & (target < 15 - account_length[:, None]),
+                       target < 14 - account_length[:, None])
+    account = numpy.take_along_axis(digits, numpy.clip(source, 0, 13), axis=1)
+    account = numpy.where(zero, 0, account)
+    machine = numpy.concatenate([digits[:, :6], account], axis=1)
+    valid &= _luhn(machine, numpy.full(count, 14))
+
+    text = (machine + 48).astype(numpy.uint32)
+    branches = numpy.ascontiguousarray(text[:, :6]).view('U6').reshape(-1)
+    accounts = numpy.ascontiguousarray(text[:, 6:]).view('U8').reshape(-1)
+    return (numpy.where(valid, branches, ''), numpy.where(valid, accounts, ''),
+            valid)
+
+
+def luhn_modulo10_mask(keys):
+    """ Checks many keys like L{util.check_luhn_modulo10}
+
+    @type  keys: list or numpy.ndarray of strings
+    @param keys: Strings of numbers.
+    @rtype: numpy.ndarray
+    @return: Boolean mask, True where key is in luhn's modulo 10
+    """
+    codes, lengths = _code_matrix(keys, 1)
+    digits = codes - 48
+    inside = numpy.arange(codes.shape[1]) < lengths[:, None]
+    valid = (((digits >= 0) & (digits <= 9)) | ~inside).all(axis=1)
+    return valid & _luhn(numpy.where(inside, digits, 0), lengths)
+
+
+def _text_array(values):
+    """ Converts values to NumPy unicode array. """
+    array = numpy.asarray(values)
+    if array.dtype.kind != 'U':
+        array = array.astype(str)
+    return array
+
+
+def _code_matrix(values, width):
+    """ Gets code points of strings as int64 matrix, one row per string.
+
+    @rtype: tuple(numpy.ndarray, numpy.ndarray)
+    @return: Matrix with at least width columns, zero padded, and lengths
+             of the strings.
+    """
+    array = numpy.ascontiguousarray(_text_array(values).reshape(-1))
+    if len(array) == 0:
+        return (numpy.zeros((0, width), dtype=numpy.int64),
+                numpy.zeros(0, dtype=numpy.int64))
+    codes = array.view(numpy.uint32).reshape(len(array), -1)
+    codes = codes.astype(numpy.int64)
+    if codes.shape[1] < width:
+        codes = numpy.pad(codes, ((0, 0), (0, width - codes.shape[1])))
+    return codes, numpy.char.str_len(array).astype(numpy.int64)
+
+
+_DIGIT, _UPPER, _ALNUM = 1, 2, 3
+_IBAN_TABLE = []
+
+
+def _iban_table():
+    """ Gets IBAN formats as arrays, building them on first use.
+
+    @rtype: tuple(numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    @return: Sorted country keys (code points of the two letters), IBAN
+             lengths and character classes of every position of each
+             country. Positions after the end have class 0.
+    """
+    if not _IBAN_TABLE:
+        countries = sorted(util.IBAN_FORMATS)
+        structures = ['aann' + util.iban_structure(country)
+                      for country in countries]
+        width = max(len(structure) for structure in structures)
+        classes = numpy.zeros((len(countries), width), dtype=numpy.int8)
+        kinds = {'n': _DIGIT, 'a': _UPPER, 'c': _ALNUM}
+        for row, structure in enumerate(structures):
+            classes[row, :len(structure)] = [kinds[kind]
+                                             for kind in structure]
+        keys = numpy.array([ord(country[0]) * 65536 + ord(country[1])
+                            for country in countries], dtype=numpy.int64)
+        lengths = numpy.array([len(structure) for structure in structures],
+                              dtype=numpy.int64)
+        _IBAN_TABLE.append((keys, lengths, classes))
+    return _IBAN_TABLE[0]
+
+
+def _luhn(digits, lengths):
+    """ Gets mask of digit rows that pass Luhn modulo 10.
+
+    Digits are left aligned, lengths tell where each row ends. Every second
+    digit counting from the last one is doubled.
+    """
+    position = lengths[:, None] - 1 - numpy.arange(digits.shape[1])
+    doubled = digits * 2
+    doubled = numpy.where(doubled > 9, doubled - 9, doubled)
+    values = numpy.where(position % 2 == 1, doubled, digits)
+    values = numpy.where(position >= 0, values, 0)
+    return values.sum(axis=1) % 10 == 0
+
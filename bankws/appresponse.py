@@ -10,14 +10,45 @@ import os
 import base64
 import gzip
 import logging
+import threading
 
 from lxml import etree
 
 try:
+    from bankws import instrumentation
+    from bankws import metrics
+    from bankws import payloadlog
     from bankws.signature import validate
 except ImportError:
+    import instrumentation
+    import metrics
+    import payloadlog
     from signature import validate
 
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "resources/ApplicationResponse_20080918.xsd")
+_schema = None
+_schema_lock = threading.Lock()
+
+
+def get_schema():
+    """
+    Gets the ApplicationResponse schema, compiled once per process
+
+    @rtype: L{etree.XMLSchema}
+    @raise IOError: If the schema-file is missing
+    """
+    global _schema
+    with _schema_lock:
+        if _schema is None:
+            metrics.SCHEMA_CACHE.inc(schema='ApplicationResponse',
+                                     result='miss')
+            _schema = etree.XMLSchema(etree.parse(SCHEMA_FILE))
+        else:
+            metrics.SCHEMA_CACHE.inc(schema='ApplicationResponse',
+                                     result='hit')
+        return _schema
+
 
 class ApplicationResponse():
     """ ApplicationResponse class is used to parse certificate responses
@@ -72,68 +103,73 @@ class ApplicationResponse():
 
         self._accepted = True
         # validate using schema
-        if not self._validate_with_schema(message):
+        with instrumentation.stage('schema_validation',
+                                   size_in=len(message)):
+            valid = self._validate_with_schema(message)
+        if not valid:
             # Some errors return invalid xml.
             self.logger.error("Message doesn't follow schema.")
             self._accepted = False
             # raise ValueError('Failed to validate against schema')
 
         # Check signature
-        if not validate(message):
+        with instrumentation.stage('signature_validation',
+                                   size_in=len(message)):
+            valid = validate(message)
+        if not valid:
+            metrics.SIGNATURE_FAILURES.inc(document='ApplicationResponse')
             raise ValueError('Failed to verify signature')
 
+        with instrumentation.stage('parse', size_in=len(message)) as event:
+            self._parse(message)
+            if self._content is not None:
+                event.size_out = len(self._content)
+
+    def _parse(self, message):
+        """ Parses elements of message to attributes.
+
+        @type  message: string
+        @param message: ApplicationResponse xml-message.
+        """
+        payloadlog.log(self.logger, "ApplicationResponse", message)
         descriptors = None
         self._content = None
         tree = etree.fromstring(message)
         # Parse elements from tree to variables.
         for element in tree.iter():
             if element.tag == "{http://bxd.fi/xmldata/}CustomerId":
-                self.logger.debug("{0}: {1}".format(element.tag, element.text))
                 self._customerid = element.text
             if element.tag == "{http://bxd.fi/xmldata/}Timestamp":
-                self.logger.debug("{0}: {1}".format(element.tag, element.text))
                 self._timestamp = element.text
             if element.tag == "{http://bxd.fi/xmldata/}ResponseCode":
-                self.logger.debug("{0}: {1}".format(element.tag, element.text))
                 self._responsecode = element.text
             if element.tag == "{http://bxd.fi/xmldata/}ResponseText":
-                self.logger.debug("{0}: {1}".format(element.tag, element.text))
                 self._responsetext = element.text
             if element.tag == "{http://bxd.fi/xmldata/}ExecutionSerial":
-                self.logger.debug("{0}: {1}".format(element.tag, element.text))
                 self._executionserial = element.text
             if element.tag == "{http://bxd.fi/xmldata/}Encrypted":
-                self.logger.debug("{0}: {1}".format(element.tag, element.text))
                 value = element.text.lower()
                 self._encrypted = True if value == 'true' else False
             if element.tag == "{http://bxd.fi/xmldata/}EncryptionMethod":
-                self.logger.debug("{0}: {1}".format(element.tag, element.text))
                 self._encryptionmethod = element.text
             if element.tag == "{http://bxd.fi/xmldata/}Compressed":
-                self.logger.debug("{0}: {1}".format(element.tag, element.text))
                 value = element.text.lower()
                 if value == '1':
                     value = 'true'
                 self._compressed = True if value == 'true' else False
             if element.tag == "{http://bxd.fi/xmldata/}CompressionMethod":
-                self.logger.debug("{0}: {1}".format(element.tag, element.text))
                 self._compressionmethod = element.text
             if element.tag == "{http://bxd.fi/xmldata/}AmountTotal":
-                self.logger.debug("{0}: {1}".format(element.tag, element.text))
                 self._amounttotal = element.text
             if element.tag == "{http://bxd.fi/xmldata/}TransactionCount":
-                self.logger.debug("{0}: {1}".format(element.tag, element.text))
                 self._transactioncount = element.text
             if element.tag == "{http://bxd.fi/xmldata/}CustomerExtension":
-                self.logger.debug("{0}: {1}".format(element.tag, element.text))
                 self._customerextension = element
             if element.tag == "{http://bxd.fi/xmldata/}FileDescriptors":
                 descriptors = element
             if element.tag == "{http://bxd.fi/xmldata/}FileType":
-                self.logger.debug("{0}: {1}".format(element.tag, element.text))
                 self._filetype = element.text
             if element.tag == "{http://bxd.fi/xmldata/}Content":
-                self.logger.debug("{0}: {1}".format(element.tag, element.text))
                 bytestring = bytes(element.text, 'utf-8')
                 self._content = base64.b64decode(bytestring)
 
@@ -144,42 +180,24 @@ class ApplicationResponse():
                 fd = FileDescriptor()
                 for element in descriptor.iter():
                     if element.tag == "{http://bxd.fi/xmldata/}FileReference":
-                        self.logger.debug("{0}: {1}".format(element.tag,
-                                                            element.text))
                         fd.reference = element.text
                     if element.tag == "{http://bxd.fi/xmldata/}TargetId":
-                        self.logger.debug("{0}: {1}".format(element.tag,
-                                                            element.text))
                         fd.target = element.text
                     if element.tag == "{http://bxd.fi/xmldata/}ServiceId":
-                        self.logger.debug("{0}: {1}".format(element.tag,
-                                                            element.text))
                         fd.serviceid = element.text
                     if element.tag == ("{http://bxd.fi/xmldata/}"
                                        "ServiceIdOwnerName"):
-                        self.logger.debug("{0}: {1}".format(element.tag,
-                                                            element.text))
                         fd.serviceidownername = element.text
                     if element.tag == "{http://bxd.fi/xmldata/}UserFilename":
-                        self.logger.debug("{0}: {1}".format(element.tag,
-                                                            element.text))
                         fd.userfilename = element.text
                     if element.tag == ("{http://bxd.fi/xmldata/}"
                                        "ParentFileReference"):
-                        self.logger.debug("{0}: {1}".format(element.tag,
-                                                            element.text))
                         fd.parentfile = element.text
                     if element.tag == ("{http://bxd.fi/xmldata/}FileType"):
-                        self.logger.debug("{0}: {1}".format(element.tag,
-                                                            element.text))
                         fd.filetype = element.text
                     if element.tag == "{http://bxd.fi/xmldata/}FileTimestamp":
-                        self.logger.debug("{0}: {1}".format(element.tag,
-                                                            element.text))
                         fd.timestamp = element.text
                     if element.tag == "{http://bxd.fi/xmldata/}Status":
-                        self.logger.debug("{0}: {1}".format(element.tag,
-                                                            element.text))
                         fd.status = element.text
                 self._file_descriptors.append(fd)
 
@@ -256,11 +274,7 @@ class ApplicationResponse():
         @rtype: boolean
         @return: Is string valid against schema or not.
         """
-        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
-                            "resources/ApplicationResponse_20080918.xsd"
-                            )
-        schema_doc = etree.parse(path)
-        xml_schema = etree.XMLSchema(schema_doc)
+        xml_schema = get_schema()
         try:
             doc = etree.fromstring(xml_string)
         except etree.XMLSyntaxError:
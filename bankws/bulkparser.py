@@ -0,0 +1,280 @@
+'''Bulkparser module parses archived "Tapahtumaotekysely" statements from
+memory mapped files.
+
+Files are not read or decoded as a whole. parse_columns locates records and
+slices the needed fields straight from the mapped bytes with NumPy;
+parse_responses decodes one record line at a time.
+
+Usage:
+Get columns of all transactions in a file or directory
+    >>> columns = parse_columns('archive/2013')
+Get TransactionListResponse object for every file
+    >>> for response in parse_responses('archive/2013'):
+            print(response.balance_record.balance)
+
+External libraries:
+    - NumPy (parse_columns)
+'''
+import codecs
+import mmap
+import os
+
+try:
+    from bankws.transactionlistresponse import TransactionListResponse
+except ImportError:
+    from transactionlistresponse import TransactionListResponse
+
+DEFAULT_ENCODING = 'latin-1'
+""" Encoding of archived statement files. """
+_SINGLE_BYTE_ENCODINGS = ('latin-1', 'iso8859-1', 'iso8859-15', 'cp1252',
+                          'ascii')
+
+
+def statement_files(path):
+    """ Lists statement files in given path.
+
+    @type  path: string
+    @param path: File or directory name. Directories are walked recursively.
+    @rtype: list<string>
+    @return: Filenames in sorted order.
+    """
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs.sort()
+        for name in sorted(names):
+            files.append(os.path.join(root, name))
+    return files
+
+
+def iter_records(filename):
+    """ Iterates record lines of memory mapped file.
+
+    @type  filename: string
+    @param filename: Statement file.
+    @rtype: generator of bytes
+    @return: Record lines without line endings.
+    """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for line in iter(mapped.readline, b''):
+                line = line.rstrip(b'\r\n')
+                if line:
+                    yield line
+
+
+def map_file(filename, encoding=DEFAULT_ENCODING):
+    """ Slices transaction fields from memory mapped file.
+
+    @type  filename: string
+    @param filename: Statement file.
+    @type  encoding: string
+    @param encoding: Encoding of file.
+    @rtype: dict
+    @return: Field name to bytes array, see L{map_fields}.
+    """
+    import numpy
+
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return map_fields(numpy.zeros(0, dtype=numpy.uint8), encoding)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            buf = numpy.frombuffer(mapped, dtype=numpy.uint8)
+            try:
+                return map_fields(buf, encoding)
+            finally:
+                # View must be released before the map can be closed.
+                del buf
+
+
+def parse_responses(path, encoding=DEFAULT_ENCODING):
+    """ Parses statement files to TransactionListResponse objects.
+
+    @type  path: string
+    @param path: File or directory name.
+    @type  encoding: string
+    @param encoding: Encoding of files.
+    @rtype: generator of L{TransactionListResponse}
+    @return: One response per non-empty file.
+    """
+    for filename in statement_files(path):
+        records = [line.decode(encoding) for line in iter_records(filename)]
+        if records:
+            yield TransactionListResponse(records)
+
+
+# Offsets and widths of fields in transaction record (type 10). Same as in
+# TransactionBasicRecord.
+_TRANSACTION_FIELDS = (('archive_id', 12, 18),
+                       ('registration_date', 30, 6),
+                       ('value_date', 36, 6),
+                       ('payment_date', 42, 6),
+                       ('code', 49, 3),
+                       ('sign', 87, 1),
+                       ('amount', 88, 18),
+                       ('counterparty', 108, 35),
+                       ('reference', 159, 20))
+_TRANSACTION_MIN_LENGTH = 179
+_ACCOUNT_FIELD = (9, 14)
+_BATCH_ROWS = 65536
+
+
+def map_fields(buf, encoding=DEFAULT_ENCODING):
+    """ Slices transaction fields from bytes of one or more statements.
+
+    Lines are located and fields are gathered with NumPy so no Python
+    objects are created per record. Lines that are too short or whose byte
+    length differs from their record length (multibyte characters) are
+    decoded and sliced one by one.
+
+    @type  buf: L{numpy.ndarray}
+    @param buf: uint8 array, e.g. view of memory mapped file. Must start at
+                the beginning of a record.
+    @type  encoding: string
+    @param encoding: Encoding of records.
+    @rtype: dict
+    @return: Field name to bytes array. Contains also 'account' of the
+             statement each transaction belongs to.
+    """
+    return _map_fields(buf, encoding)[0]
+
+
+def _map_fields(buf, encoding):
+    """ Slices transaction fields and reports statement context of buf.
+
+    @rtype: tuple(dict, int, bytes)
+    @return: Fields as in L{map_fields}, number of leading transactions that
+             have no basic record in buf and account of the last basic
+             record in buf (None if there is none).
+    """
+    import numpy
+
+    ends = numpy.flatnonzero(buf == 10)
+    if len(buf) and buf[-1] != 10:
+        ends = numpy.append(ends, len(buf))
+    starts = numpy.concatenate(([0], ends[:-1] + 1)).astype(numpy.int64)
+    lengths = ends - starts
+    carriage = lengths > 0
+    carriage[carriage] = buf[ends[carriage] - 1] == 13
+    lengths -= carriage
+    starts = starts[lengths >= 3]
+    lengths = lengths[lengths >= 3]
+    first = buf[starts + 1]
+    second = buf[starts + 2]
+    is_basic = (first == ord('0')) & (second == ord('0'))
+    is_transaction = (first == ord('1')) & (second == ord('0'))
+
+    transaction_starts = starts[is_transaction]
+    transaction_lengths = lengths[is_transaction]
+    fast = transaction_lengths >= _TRANSACTION_MIN_LENGTH
+    if codecs.lookup(encoding).name not in _SINGLE_BYTE_ENCODINGS:
+        digits = buf[transaction_starts[fast][:, None] + numpy.arange(3, 6)]
+        declared = (digits.astype(numpy.int64) - ord('0')) @ [100, 10, 1]
+        fast[fast] = transaction_lengths[fast] == declared
+    slow = numpy.flatnonzero(~fast)
+
+    fast_starts = transaction_starts[fast]
+    batches = dict((field[0], []) for field in _TRANSACTION_FIELDS)
+    for first_row in range(0, len(fast_starts), _BATCH_ROWS):
+        records = _gather(buf, fast_starts[first_row:first_row + _BATCH_ROWS],
+                          _TRANSACTION_MIN_LENGTH)
+        for name, offset, width in _TRANSACTION_FIELDS:
+            batches[name].append(_column(records, offset, width))
+
+    fields = {}
+    for name, offset, width in _TRANSACTION_FIELDS:
+        if batches[name]:
+            values = numpy.concatenate(batches[name])
+        else:
+            values = numpy.zeros(0, dtype='S%d' % width)
+        if len(slow):
+            values = _merge(values, fast, slow, [
+                            _slice_line(buf, transaction_starts[i],
+                                        transaction_lengths[i], offset, width,
+                                        encoding)
+                            for i in slow])
+        fields[name] = values
+
+    basic_starts = starts[is_basic]
+    basic_lengths = lengths[is_basic]
+    offset, width = _ACCOUNT_FIELD
+    complete = basic_lengths >= offset + width
+    accounts = numpy.zeros(len(basic_starts), dtype='S%d' % width)
+    if complete.any():
+        records = _gather(buf, basic_starts[complete], offset + width)
+        accounts[complete] = _column(records, offset, width)
+    # Transactions belong to the latest basic record before them.
+    owner = numpy.searchsorted(basic_starts, transaction_starts) - 1
+    owned = owner >= 0
+    fields['account'] = numpy.zeros(len(transaction_starts),
+                                    dtype='S%d' % width)
+    fields['account'][owned] = accounts[owner[owned]]
+    orphans = len(owned) - int(numpy.count_nonzero(owned))
+    last_account = accounts[-1] if len(accounts) else None
+    return fields, orphans, last_account
+
+
+def _gather(buf, starts, length):
+    """ Copies first length bytes of every line to rows of 2D array.
+
+    Rows are taken from a sliding window view of the buffer so no index
+    array is built per byte.
+    """
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    return sliding_window_view(buf, length)[starts]
+
+
+def _column(records, offset, width):
+    """ Gets fixed width field from gathered records as bytes array. """
+    import numpy
+
+    field = numpy.ascontiguousarray(records[:, offset:offset + width])
+    return field.view('S%d' % width).reshape(-1)
+
+
+def _slice_line(buf, start, length, offset, width, encoding):
+    """ Slices field from one line by character offset. """
+    line = bytes(buf[start:start + length]).decode(encoding)
+    return line[offset:offset + width].encode(encoding)
+
+
+def _merge(values, fast, slow, slow_values):
+    """ Combines gathered and one by one sliced field values in order. """
+    import numpy
+
+    width = max([values.dtype.itemsize] + [len(v) for v in slow_values])
+    merged = numpy.zeros(len(fast), dtype='S%d' % width)
+    merged[fast] = values
+    merged[slow] = slow_values
+    return merged
+
+
+def parse_columns(path, dictionary_encode=True, encoding=DEFAULT_ENCODING):
+    """ Parses transactions of statement files to columns.
+
+    @type  path: string
+    @param path: File or directory name.
+    @type  dictionary_encode: boolean
+    @param dictionary_encode: Dictionary encode string columns.
+    @type  encoding: string
+    @param encoding: Encoding of files.
+    @rtype: L{TransactionColumns}
+    @return: Transactions of all files in order.
+    """
+    import numpy
+    try:
+        from bankws.transactioncolumns import build_columns
+    except ImportError:
+        from transactioncolumns import build_columns
+
+    parts = [map_file(filename, encoding)
+             for filename in statement_files(path)]
+    raw = {}
+    for name in [field[0] for field in _TRANSACTION_FIELDS] + ['account']:
+        values = [part[name] for part in parts if len(part[name])]
+        raw[name] = numpy.concatenate(values) if values else []
+    return build_columns(raw, dictionary_encode, encoding)
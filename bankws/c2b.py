@@ -1,29 +1,277 @@
 '''
 Module for the C2B content message
+
+Messages can be built in memory with C2B or streamed to a file or socket with
+C2BWriter, which writes one PmtInf-block at a time.
+
+Usage:
+    >>> with open('payments.xml', 'wb') as f:
+            with C2BWriter(f, payer, 'MSG-1') as writer:
+                writer.begin_payment(sepa)
+                for tx in transactions:
+                    writer.add_transaction(tx)
 '''
 
+import logging
 import os
+import shutil
+import tempfile
+import threading
 from io import BytesIO
-from decimal import Decimal
 
 try:
     from bankws import timehelper
     from bankws import c2bhelper
+    from bankws import metrics
 except ImportError:
     import timehelper
     import c2bhelper
+    import metrics
 
 from lxml import etree as ET
 
+log = logging.getLogger("bankws")
 NAMESPACE = 'urn:iso:std:iso:20022:tech:xsd:pain.001.001.02'
 XSI = 'http://www.w3.org/2001/XMLSchema-instance'
 SCHEMA_LOCATION = NAMESPACE + ' pain.001.001.02.xsd'
+DOCUMENT_ATTRIB = {'{' + XSI + '}schemaLocation': SCHEMA_LOCATION}
+DOCUMENT_NSMAP = {None: NAMESPACE, 'xsi': XSI}
+QUALIFIED = '{' + NAMESPACE + '}'
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'resources', 'pain.001.001.02.xsd')
+XSD = 'http://www.w3.org/2001/XMLSchema'
+
+_schemas = {}
+_schema_lock = threading.Lock()
+
+
+def _compile_schema(name):
+    """
+    @type name: string
+    @param name: 'document' for the message schema or 'transaction' for
+        a schema that accepts CdtTrfTxInf as root element
+    """
+    schema_doc = ET.parse(SCHEMA_FILE)
+    if name == 'transaction':
+        ET.SubElement(schema_doc.getroot(), '{' + XSD + '}element',
+                      name='CdtTrfTxInf',
+                      type='CreditTransferTransactionInformation1')
+    return ET.XMLSchema(schema_doc)
+
+
+def _cached_schema(name):
+    with _schema_lock:
+        schema = _schemas.get(name)
+        if schema is None:
+            metrics.SCHEMA_CACHE.inc(schema=name, result='miss')
+            schema = _schemas[name] = _compile_schema(name)
+        else:
+            metrics.SCHEMA_CACHE.inc(schema=name, result='hit')
+        return schema
+
+
+def get_schema():
+    """
+    Gets the pain.001.001.02 schema, compiled once per process
+
+    @rtype: L{ET.XMLSchema}
+    @raise IOError: If the schema-file is missing
+    """
+    return _cached_schema('document')
+
+
+def validate_document(xml_bytes):
+    """
+    Validates a serialized pain.001.001.02 message
+
+    @type xml_bytes: bytes
+    @param xml_bytes: XML-document
+
+    @raise IOError: If the schema-file is missing
+    @raise ValidationError: If the document doesn't comply with the schema
+    """
+    schema = get_schema()
+    if not schema.validate(ET.fromstring(xml_bytes)):
+        raise ValidationError('Document validation failed: {0}'.format(
+                              schema.error_log.last_error))
+
+
+def validate_transaction(tx):
+    """
+    Validates one transaction against the CdtTrfTxInf-type of the schema
+
+    Used to reject bad transactions when they are added instead of when the
+    whole message is validated.
+
+    @type tx: L{CdtTrfTxInf}
+    @param tx: Transaction
+
+    @raise ValidationError: If the transaction doesn't comply with the schema
+    """
+    schema = _cached_schema('transaction')
+    if not schema.validate(_transaction_element(tx, QUALIFIED)):
+        raise ValidationError('Transaction {0} is not valid: {1}'.format(
+                              tx._cdt_end_to_end_id,
+                              schema.error_log.last_error))
+
+
+def _new_document():
+    """
+    Creates an empty Document-element for one message
+
+    @rtype: tuple
+    @return: Document-element and its pain.001.001.02-child
+    """
+    doc = ET.Element('Document', attrib=DOCUMENT_ATTRIB, nsmap=DOCUMENT_NSMAP)
+    return doc, ET.SubElement(doc, 'pain.001.001.02')
+
+
+def _group_header_element(payer, msg_id, nb_of_txs, grpg, ctrl_sum=None,
+                          cre_dt_tm=None):
+    """
+    @type payer: L{Entity}
+    @param payer: Payer's information
+    @type msg_id: string
+    @param msg_id: Message ID, unique for atleast 3 months
+    @type nb_of_txs: int
+    @param nb_of_txs: Number of transactions in message
+    @type grpg: string
+    @param grpg: MIXD, GRPD or SNGL
+    @type ctrl_sum: Decimal
+    @param ctrl_sum: Arithmetic sum of fields InstdAmt
+    @type cre_dt_tm: string
+    @param cre_dt_tm: Creation time, defaults to current time
+    @rtype: L{ET.Element}
+    @return: GrpHdr-element
+    """
+    if cre_dt_tm is None:
+        cre_dt_tm = timehelper.get_timestamp(False)
+    GRPHDR = ET.Element('GrpHdr')
+    ET.SubElement(GRPHDR, 'MsgId').text = msg_id
+    ET.SubElement(GRPHDR, 'CreDtTm').text = cre_dt_tm
+    ET.SubElement(GRPHDR, 'NbOfTxs').text = str(nb_of_txs)
+    if ctrl_sum is not None:
+        GRPHDR_CTRLSUM = ET.SubElement(GRPHDR, 'CtrlSum')
+        GRPHDR_CTRLSUM.text = str(ctrl_sum)
+    ET.SubElement(GRPHDR, 'Grpg').text = grpg
+    GRPHDR_INITGPTY = ET.SubElement(GRPHDR, 'InitgPty')
+    if payer._name is not None:
+        ET.SubElement(GRPHDR_INITGPTY, 'Nm').text = payer._name
+    if len(payer._address_lines) > 0:
+        GRPHDR_PSTLADR = ET.SubElement(GRPHDR_INITGPTY, 'PstlAdr')
+        for x in payer._address_lines:
+            ET.SubElement(GRPHDR_PSTLADR, 'AdrLine').text = x
+        ET.SubElement(GRPHDR_PSTLADR, 'Ctry').text = payer._country
+    return GRPHDR
+
+
+def _payment_info_elements(payer, sepa):
+    """
+    Creates the elements of PmtInf that precede the transactions
+
+    @type payer: L{Entity}
+    @param payer: Payer's information
+    @type sepa: L{SEPA}
+    @param sepa: SEPA payment
+    @rtype: list of L{ET.Element}
+    @return: Children of PmtInf before CdtTrfTxInf-elements
+    """
+    PMTINF = ET.Element('PmtInf')
+    if sepa._payment_information_id is not None:
+        ET.SubElement(PMTINF, 'PmtInfId').text = sepa._payment_information_id
+    ET.SubElement(PMTINF, 'PmtMtd').text = sepa._pmt_mtd
+    PMTTPINF = ET.SubElement(PMTINF, 'PmtTpInf')
+    # InstrPrty-value is retrieved from the transaction so it is not required here
+    SVCLVL = ET.SubElement(PMTTPINF, 'SvcLvl')
+    if sepa._cd is not None:
+        ET.SubElement(SVCLVL, 'Cd').text = sepa._cd
+    ET.SubElement(PMTINF, 'ReqdExctnDt').text = sepa._reqd_exctn_dt
+
+    DBTR = ET.SubElement(PMTINF, 'Dbtr')
+    if payer._name is not None:
+        ET.SubElement(DBTR, 'Nm').text = payer._name
+    if len(payer._address_lines) > 0:
+        DBTR_PSTLADR = ET.SubElement(DBTR, 'PstlAdr')
+        for x in payer._address_lines:
+            ET.SubElement(DBTR_PSTLADR, 'AdrLine').text = x
+        ET.SubElement(DBTR_PSTLADR, 'Ctry').text = payer._country
+    DBTR_ID = ET.SubElement(DBTR, 'Id')
+    DBTR_ORGID = ET.SubElement(DBTR_ID, 'OrgId')
+    ET.SubElement(DBTR_ORGID, 'BkPtyId').text = sepa._material_id
+
+    DBTRACCT = ET.SubElement(PMTINF, 'DbtrAcct')
+    DBTRACCT_ID = ET.SubElement(DBTRACCT, 'Id')
+    ET.SubElement(DBTRACCT_ID, 'IBAN').text = sepa._iban
+    ET.SubElement(DBTRACCT, 'Ccy').text = sepa._ccy
+
+    DBTRAGT = ET.SubElement(PMTINF, 'DbtrAgt')
+    DBTRAGT_FININSTNID = ET.SubElement(DBTRAGT, 'FinInstnId')
+    ET.SubElement(DBTRAGT_FININSTNID, 'BIC').text = sepa._bic
+
+    if sepa._ultmt_dbtr is not None:
+        ULTMT_DBTR = ET.SubElement(PMTINF, 'UltmtDbtr')
+        ET.SubElement(ULTMT_DBTR, 'Nm').text = sepa._ultmt_dbtr
+
+    CHRGBR = ET.SubElement(PMTINF, 'ChrgBr')
+    CHRGBR.text = sepa._chrg_br
+    return list(PMTINF)
+
+
+def _transaction_element(tx, q=''):
+    """
+    @type tx: L{CdtTrfTxInf}
+    @param tx: Transaction
+    @type q: string
+    @param q: Namespace prefix of tags, QUALIFIED when the element is
+        validated on its own
+    @rtype: L{ET.Element}
+    @return: CdtTrfTxInf-element
+    """
+    CDTTRFTXINF = ET.Element(q + 'CdtTrfTxInf')
+    CDT_PMTID = ET.SubElement(CDTTRFTXINF, q + 'PmtId')
+    if tx._cdt_instr_id is not None:
+        ET.SubElement(CDT_PMTID, q + 'InstrId').text = tx._cdt_instr_id
+    ET.SubElement(CDT_PMTID, q + 'EndToEndId').text = tx._cdt_end_to_end_id
+    if tx._cdt_instr_prty is not None:
+        CDT_PMTTPINF = ET.SubElement(CDTTRFTXINF, q + 'PmtTpInf')
+        ET.SubElement(CDT_PMTTPINF, q + 'InstrPrty').text = tx._cdt_instr_prty
+    CDT_AMT = ET.SubElement(CDTTRFTXINF, q + 'Amt')
+    ET.SubElement(CDT_AMT, q + 'InstdAmt', Ccy=tx._cdt_instd_amt_curr).text = c2bhelper.format_cents(tx._cdt_instd_amt_cents)
+    CDT_CDTRAGT = ET.SubElement(CDTTRFTXINF, q + 'CdtrAgt')
+    CDT_FININSTNID = ET.SubElement(CDT_CDTRAGT, q + 'FinInstnId')
+    ET.SubElement(CDT_FININSTNID, q + 'BIC').text = tx._cdt_bic
+
+    CDT_CDTR = ET.SubElement(CDTTRFTXINF, q + 'Cdtr')
+    ET.SubElement(CDT_CDTR, q + 'Nm').text = tx._payment_receiver._name
+
+    if len(tx._payment_receiver._address_lines) > 0:
+
+        CDT_PSTLADR = ET.SubElement(CDT_CDTR, q + 'PstlAdr')
+
+        for x in tx._payment_receiver._address_lines:
+            ET.SubElement(CDT_PSTLADR, q + 'AdrLine').text = x
+
+        CDT_CTRY = ET.SubElement(CDT_PSTLADR, q + 'Ctry')
+        CDT_CTRY.text = tx._payment_receiver._country
+
+    """
+    Specification "OP-POHJOLA-RYHMaN C2B-PALVELUT Maksuliikepalvelut" in
+    page 17 defines, that the IBAN (CDT_IBAN variable) should be located
+    directly as a text in 'CdtrAcct'-element, but this doesn't pass the
+    validation
+    """
+    CDT_CDTRACCT = ET.SubElement(CDTTRFTXINF, q + 'CdtrAcct')
+    CDT_CDTRACCT_ID = ET.SubElement(CDT_CDTRACCT, q + 'Id')
+    ET.SubElement(CDT_CDTRACCT_ID, q + 'IBAN').text = tx._cdt_cdtr_acct
 
-DOC = ET.Element('Document',
-                 attrib={'{' + XSI + '}schemaLocation': SCHEMA_LOCATION},
-                 nsmap={None: NAMESPACE,
-                        'xsi': XSI})
-PAIN = ET.SubElement(DOC, 'pain.001.001.02')
+    if tx._pmt_purp is not None:
+        CDT_PURP = ET.SubElement(CDTTRFTXINF, q + 'Purp')
+        ET.SubElement(CDT_PURP, q + 'Cd').text = tx._pmt_purp
+
+    if tx._cdt_ustrd is not None:
+        CDT_RMTINF = ET.SubElement(CDTTRFTXINF, q + 'RmtInf')
+        ET.SubElement(CDT_RMTINF, q + 'Ustrd').text = tx._cdt_ustrd
+    return CDTTRFTXINF
 
 
 class C2B():
@@ -38,13 +286,25 @@ class C2B():
     @ivar _payments: List of payments in this material
     @type _number_of_payments: int
     @ivar _number_of_payments: Number of payments in a message
+    @type _prevalidate: bool
+    @ivar _prevalidate: Validate transactions when payments are added
 
     """
 
-    def __init__(self, payer):
+    def __init__(self, payer, prevalidate=False):
+        """
+        @type payer: L{Entity}
+        @param payer: Payer's information
+        @type prevalidate: bool
+        @param prevalidate: Validate every transaction against the schema
+            when its payment is added, see L{validate_transaction}
+        """
         self._payer = payer
         self._payments = []
         self._number_of_payments = 0
+        self._prevalidate = prevalidate
+        self._doc = None
+        self._pain = None
 
     def group_header(self, msg_id, grpg):
         """
@@ -64,29 +324,15 @@ class C2B():
         @param msg_id: Message ID, unique for atleast 3 months
         @type nb_of_txs: int
         @param nb_of_txs: Number of transactions in message
-        @type ctrl_sum: float
+        @type ctrl_sum: Decimal
         @param ctrl_sum: Arithmetic sum of fields InstdAmt
         @type grpg: string
         @param grpg: MIXD if message has one or more PmtInf-elements.
             Other possible values are: GRPD and SNGL
         """
 
-        GRPHDR = ET.SubElement(PAIN, 'GrpHdr')
-        ET.SubElement(GRPHDR, 'MsgId').text = msg_id
-        ET.SubElement(GRPHDR, 'CreDtTm').text = timehelper.get_timestamp(False)
-        ET.SubElement(GRPHDR, 'NbOfTxs').text = str(nb_of_txs)
-        if ctrl_sum is not None:
-            GRPHDR_CTRLSUM = ET.SubElement(GRPHDR, 'CtrlSum')
-            GRPHDR_CTRLSUM.text = str(ctrl_sum)
-        ET.SubElement(GRPHDR, 'Grpg').text = grpg
-        GRPHDR_INITGPTY = ET.SubElement(GRPHDR, 'InitgPty')
-        if self._payer._name is not None:
-            ET.SubElement(GRPHDR_INITGPTY, 'Nm').text = self._payer._name
-        if len(self._payer._address_lines) > 0:
-            GRPHDR_PSTLADR = ET.SubElement(GRPHDR_INITGPTY, 'PstlAdr')
-            for x in self._payer._address_lines:
-                ET.SubElement(GRPHDR_PSTLADR, 'AdrLine').text = x
-            ET.SubElement(GRPHDR_PSTLADR, 'Ctry').text = self._payer._country
+        self._pain.append(_group_header_element(self._payer, msg_id,
+                                                nb_of_txs, grpg, ctrl_sum))
 
     def add_SEPA_payment(self, sepa):
         """
@@ -94,8 +340,13 @@ class C2B():
         @param sepa: SEPA payment to be added to the message
 
         @raise ValueError: If the parameter is not an instance of class SEPA
+        @raise ValidationError: If prevalidation is on and a transaction
+            doesn't comply with the schema
         """
         if isinstance(sepa, c2bhelper.SEPA):
+            if self._prevalidate:
+                for tx in sepa._transactions:
+                    validate_transaction(tx)
             self._payments.append(sepa)
             self._number_of_payments += 1
         else:
@@ -103,115 +354,69 @@ class C2B():
 
     def _add_SEPA_payment_to_xml(self, sepa):
 
-        PMTINF = ET.SubElement(PAIN, 'PmtInf')
-        if sepa._payment_information_id is not None:
-            ET.SubElement(PMTINF, 'PmtInfId').text = sepa._payment_information_id
-        ET.SubElement(PMTINF, 'PmtMtd').text = sepa._pmt_mtd
-        PMTTPINF = ET.SubElement(PMTINF, 'PmtTpInf')
-        # InstrPrty-value is retrieved from the transaction so it is not required here
-        SVCLVL = ET.SubElement(PMTTPINF, 'SvcLvl')
-        if sepa._cd is not None:
-            ET.SubElement(SVCLVL, 'Cd').text = sepa._cd
-        ET.SubElement(PMTINF, 'ReqdExctnDt').text = sepa._reqd_exctn_dt
-
-        DBTR = ET.SubElement(PMTINF, 'Dbtr')
-        if self._payer._name is not None:
-            ET.SubElement(DBTR, 'Nm').text = self._payer._name
-        if len(self._payer._address_lines) > 0:
-            DBTR_PSTLADR = ET.SubElement(DBTR, 'PstlAdr')
-            for x in self._payer._address_lines:
-                ET.SubElement(DBTR_PSTLADR, 'AdrLine').text = x
-            ET.SubElement(DBTR_PSTLADR, 'Ctry').text = self._payer._country
-        DBTR_ID = ET.SubElement(DBTR, 'Id')
-        DBTR_ORGID = ET.SubElement(DBTR_ID, 'OrgId')
-        ET.SubElement(DBTR_ORGID, 'BkPtyId').text = sepa._material_id
-
-        DBTRACCT = ET.SubElement(PMTINF, 'DbtrAcct')
-        DBTRACCT_ID = ET.SubElement(DBTRACCT, 'Id')
-        ET.SubElement(DBTRACCT_ID, 'IBAN').text = sepa._iban
-        ET.SubElement(DBTRACCT, 'Ccy').text = sepa._ccy
-
-        DBTRAGT = ET.SubElement(PMTINF, 'DbtrAgt')
-        DBTRAGT_FININSTNID = ET.SubElement(DBTRAGT, 'FinInstnId')
-        ET.SubElement(DBTRAGT_FININSTNID, 'BIC').text = sepa._bic
-
-        if sepa._ultmt_dbtr is not None:
-            ULTMT_DBTR = ET.SubElement(PMTINF, 'UltmtDbtr')
-            ET.SubElement(ULTMT_DBTR, 'Nm').text = sepa._ultmt_dbtr
-
-        CHRGBR = ET.SubElement(PMTINF, 'ChrgBr')
-        CHRGBR.text = sepa._chrg_br
+        PMTINF = ET.SubElement(self._pain, 'PmtInf')
+        PMTINF.extend(_payment_info_elements(self._payer, sepa))
 
         """
         After this line starts the actual per transaction information
         """
 
         for tx in sepa._transactions:
-            CDTTRFTXINF = ET.SubElement(PMTINF, 'CdtTrfTxInf')
-            CDT_PMTID = ET.SubElement(CDTTRFTXINF, 'PmtId')
-            if tx._cdt_instr_id is not None:
-                ET.SubElement(CDT_PMTID, 'InstrId').text = tx._cdt_instr_id
-            ET.SubElement(CDT_PMTID, 'EndToEndId').text = tx._cdt_end_to_end_id
-            if tx._cdt_instr_prty is not None:
-                CDT_PMTTPINF = ET.SubElement(CDTTRFTXINF, 'PmtTpInf')
-                ET.SubElement(CDT_PMTTPINF, 'InstrPrty').text = tx._cdt_instr_prty
-            CDT_AMT = ET.SubElement(CDTTRFTXINF, 'Amt')
-            ET.SubElement(CDT_AMT, 'InstdAmt', Ccy=tx._cdt_instd_amt_curr).text = str(tx._cdt_instd_amt)
-            CDT_CDTRAGT = ET.SubElement(CDTTRFTXINF, 'CdtrAgt')
-            CDT_FININSTNID = ET.SubElement(CDT_CDTRAGT, 'FinInstnId')
-            ET.SubElement(CDT_FININSTNID, 'BIC').text = tx._cdt_bic
-
-            CDT_CDTR = ET.SubElement(CDTTRFTXINF, 'Cdtr')
-            ET.SubElement(CDT_CDTR, 'Nm').text = tx._payment_receiver._name
-
-            if len(tx._payment_receiver._address_lines) > 0:
-
-                CDT_PSTLADR = ET.SubElement(CDT_CDTR, 'PstlAdr')
-
-                for x in tx._payment_receiver._address_lines:
-                    ET.SubElement(CDT_PSTLADR, 'AdrLine').text = x
-
-                CDT_CTRY = ET.SubElement(CDT_PSTLADR, 'Ctry')
-                CDT_CTRY.text = tx._payment_receiver._country
-
-            """
-            Specification "OP-POHJOLA-RYHMaN C2B-PALVELUT Maksuliikepalvelut" in
-            page 17 defines, that the IBAN (CDT_IBAN variable) should be located
-            directly as a text in 'CdtrAcct'-element, but this doesn't pass the
-            validation
-            """
-            CDT_CDTRACCT = ET.SubElement(CDTTRFTXINF, 'CdtrAcct')
-            CDT_CDTRACCT_ID = ET.SubElement(CDT_CDTRACCT, 'Id')
-            ET.SubElement(CDT_CDTRACCT_ID, 'IBAN').text = tx._cdt_cdtr_acct
-
-            if tx._pmt_purp is not None:
-                CDT_PURP = ET.SubElement(CDTTRFTXINF, 'Purp')
-                ET.SubElement(CDT_PURP, 'Cd').text = tx._pmt_purp
-
-            if tx._cdt_ustrd is not None:
-                CDT_RMTINF = ET.SubElement(CDTTRFTXINF, 'RmtInf')
-                ET.SubElement(CDT_RMTINF, 'Ustrd').text = tx._cdt_ustrd
+            PMTINF.append(_transaction_element(tx))
 
     def _construct_xml(self):
         """
         Stiches together the given information to form the XML
+
+        Every call builds a new document, so the same message can be
+        serialized again and other C2B-objects do not share its elements.
         """
-        # Calculate the total amount of payments
-        sum_of_transactions = Decimal('0.0')
+        self._doc, self._pain = _new_document()
+
+        # Totals are accumulated as transactions are added to payments
         nb_of_txs = 0
+        sum_of_transactions = 0
         for payment in self._payments:
-            for transaction in payment._transactions:
-                sum_of_transactions += Decimal(str(transaction._cdt_instd_amt))
-                nb_of_txs += 1
+            nb_of_txs += len(payment._transactions)
+            sum_of_transactions += payment._ctrl_sum_cents
 
         # Construct the group header to XML-format
-        self._group_header_to_xml(self._msg_id, nb_of_txs, self._grpg,
-                                  sum_of_transactions)
+        self._group_header_to_xml(
+                    self._msg_id, nb_of_txs, self._grpg,
+                    c2bhelper.cents_to_decimal(sum_of_transactions))
 
         # Add all payments from the list to XML
         for payment in self._payments:
             self._add_SEPA_payment_to_xml(payment)
 
+    def to_bytes(self):
+        """
+        Builds the message and validates it with the cached schema
+
+        The serialized bytes are validated and returned as they are, so the
+        document is serialized only once.
+
+        @rtype: C{bytes}
+        @return: Validated UTF-8 encoded XML-document
+
+        @raise IOError: If the schema-file is missing
+        @raise ValidationError: If the document doesn't comply with the schema
+        """
+        self._construct_xml()
+        xml_bytes = ET.tostring(self._doc,
+                                xml_declaration=True,
+                                #pretty_print=True,
+                                encoding='UTF-8')
+        validate_document(xml_bytes)
+        return xml_bytes
+
+    def validate(self):
+        """
+        @raise IOError: If the schema-file is missing
+        @raise ValidationError: If the document doesn't comply with the schema
+        """
+        self.to_bytes()
+
     def __str__(self):
         """
         Returns string representation of the C2B-message
@@ -222,32 +427,405 @@ class C2B():
         @raise IOError: If the schema-file is missing
         @raise ValidationError: If the document doesn't comply with the schema
         """
+        return str(self.to_bytes(), 'UTF-8')
+
+
+class _ValidatingOutput():
+    """
+    File object that validates written XML with the cached schema
+
+    Written data is fed to a validating pull parser and elements are
+    released after each CdtTrfTxInf, so memory use stays flat. Data is
+    passed to the output only after the parser has accepted it.
+    """
 
+    def __init__(self, output):
+        self._output = output
+        self._parser = ET.XMLPullParser(events=('end',),
+                                        tag=QUALIFIED + 'CdtTrfTxInf',
+                                        schema=get_schema())
+
+    def write(self, data):
         try:
-            path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
-                                "resources/pain.001.001.02.xsd"
-                                )
-            with open(path, 'rb') as f:
-                schema = f.read()
-        except IOError as e:
-            print(e)
-            return False
+            self._parser.feed(data)
+        except ET.XMLSyntaxError as e:
+            raise ValidationError('Document validation failed: {0}'.format(e))
+        self._output.write(data)
+        for action, element in self._parser.read_events():
+            _release(element)
+        return len(data)
+
+    def flush(self):
+        if hasattr(self._output, 'flush'):
+            self._output.flush()
+
+    def close(self):
+        """
+        Ends validation, the output itself is not closed
 
-        self._construct_xml()
+        @raise ValidationError: If the document is not valid or incomplete
+        """
+        try:
+            self._parser.close()
+        except ET.XMLSyntaxError as e:
+            raise ValidationError('Document validation failed: {0}'.format(e))
+
+
+class C2BWriter():
+    """
+    C2BWriter streams a C2B-message to a file or socket
+
+    PmtInf- and CdtTrfTxInf-blocks are serialized as soon as they are added
+    and are not kept in memory. Number of transactions and control sum are
+    counted while writing.
+
+    If nb_of_txs and ctrl_sum are known beforehand, the group header is
+    written first and the message goes straight to output. Otherwise the
+    payments are spooled to a temporary file and copied to output after the
+    group header when the writer is closed.
+
+    @type _count: int
+    @ivar _count: Number of transactions written
+    @type _ctrl_sum_cents: int
+    @ivar _ctrl_sum_cents: Sum of InstdAmt-fields written in cents
+    """
+
+    def __init__(self, output, payer, msg_id, grpg='MIXD', nb_of_txs=None,
+                 ctrl_sum=None, index=None, validate=False,
+                 prevalidate=False):
+        """
+        @type output: file
+        @param output: Binary file object, e.g. socket.makefile('wb')
+        @type payer: L{Entity}
+        @param payer: Payer's information
+        @type msg_id: string
+        @param msg_id: Message ID, unique for atleast 3 months
+        @type grpg: string
+        @param grpg: MIXD, GRPD or SNGL
+        @type nb_of_txs: int
+        @param nb_of_txs: Number of transactions, if known beforehand
+        @type ctrl_sum: Decimal or string
+        @param ctrl_sum: Control sum, if known beforehand
+        @type index: L{ReconciliationIndex}
+        @param index: Index where written transactions are registered
+            (optional)
+        @type validate: bool
+        @param validate: Validate the output against the schema while it is
+            written. An element is checked when it ends, so in direct mode
+            part of an invalid message may be in output when
+            ValidationError is raised: seekable output is truncated back to
+            where the message started, other output must be thrown away.
+        @type prevalidate: bool
+        @param prevalidate: Validate every transaction before it is written,
+            see L{validate_transaction}
+
+        @raise NotEnoughParametersError: If only one of nb_of_txs and
+            ctrl_sum is given
+        """
+        if (nb_of_txs is None) != (ctrl_sum is None):
+            raise NotEnoughParametersError("Both nb_of_txs and ctrl_sum "
+                                           "are needed")
+        self._raw_output = output
+        self._start = None
+        try:
+            if output.seekable():
+                self._start = output.tell()
+        except (AttributeError, OSError, ValueError):
+            pass
+        if validate:
+            output = _ValidatingOutput(output)
+        self._output = output
+        self._validating = validate
+        self._prevalidate = prevalidate
+        self._payer = payer
+        self._msg_id = msg_id
+        self._grpg = grpg
+        self._cre_dt_tm = timehelper.get_timestamp(False)
+        self._expected = None
+        self._count = 0
+        self._ctrl_sum_cents = 0
+        self._spool = None
+        self._xmlfile = None
+        self._payment = None
+        self._sepa = None
+        self._index = index
+        self._closed = False
+        if nb_of_txs is None:
+            self._spool = tempfile.TemporaryFile()
+        else:
+            self._expected = (int(nb_of_txs),
+                              c2bhelper.amount_to_cents(ctrl_sum))
+            self._xmlfile, self._xf = self._open_document(
+                nb_of_txs, c2bhelper.cents_to_decimal(self._expected[1]))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._abort()
+
+    def _get_count(self):
+        return self._count
+
+    def _get_ctrl_sum(self):
+        return c2bhelper.cents_to_decimal(self._ctrl_sum_cents)
+
+    def _get_index(self):
+        return self._index
+
+    def _get_prevalidate(self):
+        return self._prevalidate
+
+    count = property(_get_count)
+    ctrl_sum = property(_get_ctrl_sum)
+    index = property(_get_index)
+    prevalidate = property(_get_prevalidate)
+
+    def _open_document(self, nb_of_txs, ctrl_sum):
+        """
+        Writes XML declaration, Document- and pain-starts and the group header
+        to output.
+
+        @rtype: tuple
+        @return: Open xmlfile-context and its writer
+        """
+        xmlfile = ET.xmlfile(self._output, encoding='UTF-8')
+        xf = xmlfile.__enter__()
+        xf.write_declaration()
+        self._contexts = [xf.element('Document', attrib=DOCUMENT_ATTRIB,
+                                     nsmap=DOCUMENT_NSMAP),
+                          xf.element('pain.001.001.02')]
+        for context in self._contexts:
+            context.__enter__()
+        xf.write(_group_header_element(self._payer, self._msg_id, nb_of_txs,
+                                       self._grpg, ctrl_sum, self._cre_dt_tm))
+        return xmlfile, xf
+
+    def _close_document(self):
+        for context in reversed(self._contexts):
+            context.__exit__(None, None, None)
+        self._xmlfile.__exit__(None, None, None)
+        self._xmlfile = None
+
+    def begin_payment(self, sepa):
+        """
+        Starts a new PmtInf-block, ending the previous one
+
+        Transactions already added to sepa are written too.
 
-        xml_string = str(ET.tostring(DOC,
-                                 xml_declaration=True,
-                                 #pretty_print=True,
-                                 encoding='UTF-8'),
-                         'UTF-8')
+        @type sepa: L{SEPA}
+        @param sepa: SEPA payment whose header information is written
 
-        xml_schema = ET.XMLSchema(ET.XML(schema))
-        #print(xml_string)
-        if xml_schema.validate(ET.XML(xml_string)):
-            return str(xml_string)
+        @raise ValueError: If the parameter is not an instance of class SEPA
+        @raise RuntimeError: If the writer is closed
+        """
+        if not isinstance(sepa, c2bhelper.SEPA):
+            raise ValueError("Input object was not of type SEPA")
+        if self._closed:
+            raise RuntimeError("Writer is closed")
+        self.end_payment()
+        if self._spool is not None:
+            # Every PmtInf is a separate root element in the spool file.
+            xmlfile = ET.xmlfile(self._spool, encoding='UTF-8')
+            xf = xmlfile.__enter__()
         else:
-            print(xml_schema.error_log.last_error)
-            raise ValidationError('Document validation failed')
+            xmlfile = None
+            xf = self._xf
+        element = xf.element('PmtInf')
+        element.__enter__()
+        for child in _payment_info_elements(self._payer, sepa):
+            xf.write(child)
+        self._payment = (xmlfile, xf, element)
+        self._sepa = sepa
+        for tx in sepa._transactions:
+            self.add_transaction(tx)
+
+    def add_transaction(self, tx):
+        """
+        Writes transaction to the current PmtInf-block
+
+        @type tx: L{CdtTrfTxInf}
+        @param tx: Transaction
+
+        @raise RuntimeError: If no payment has been started
+        @raise ValidationError: If the transaction doesn't comply with the
+            schema
+        """
+        if self._payment is None:
+            raise RuntimeError("begin_payment must be called before "
+                               "add_transaction")
+        if self._prevalidate:
+            validate_transaction(tx)
+        self._payment[1].write(_transaction_element(tx))
+        self._count += 1
+        self._ctrl_sum_cents += tx._cdt_instd_amt_cents
+        if self._index is not None:
+            self._index.register_transaction(self._msg_id, self._sepa, tx)
+
+    def add_serialized_transactions(self, data, count, ctrl_sum_cents):
+        """
+        Writes already serialized CdtTrfTxInf-elements to the current
+        PmtInf-block
+
+        Used by bulk import, which formats the elements straight from
+        checked columns. The transactions are not prevalidated and not
+        registered to the index.
+
+        @type data: bytes
+        @param data: UTF-8 encoded CdtTrfTxInf-elements
+        @type count: int
+        @param count: Number of transactions in data
+        @type ctrl_sum_cents: int
+        @param ctrl_sum_cents: Sum of their InstdAmt-fields in cents
+
+        @raise RuntimeError: If no payment has been started
+        """
+        if self._payment is None:
+            raise RuntimeError("begin_payment must be called before "
+                               "add_serialized_transactions")
+        xmlfile, xf, element = self._payment
+        # Everything xmlfile has buffered must be written before data
+        xf.flush()
+        if xmlfile is not None:
+            self._spool.write(data)
+        else:
+            self._output.write(data)
+        self._count += count
+        self._ctrl_sum_cents += ctrl_sum_cents
+
+    def write_payment(self, sepa):
+        """
+        Writes a complete SEPA payment with its transactions
+
+        @type sepa: L{SEPA}
+        @param sepa: SEPA payment
+        """
+        self.begin_payment(sepa)
+        self.end_payment()
+
+    def end_payment(self):
+        """
+        Ends the current PmtInf-block, if any
+        """
+        if self._payment is None:
+            return
+        xmlfile, xf, element = self._payment
+        self._payment = None
+        element.__exit__(None, None, None)
+        if xmlfile is not None:
+            xmlfile.__exit__(None, None, None)
+
+    def close(self):
+        """
+        Ends the message
+
+        In spooling mode the group header with counted values and the spooled
+        payments are written to output here.
+
+        @raise ValidationError: If nb_of_txs or ctrl_sum given in constructor
+            do not match the written transactions or validated output
+            doesn't comply with the schema
+        """
+        if self._closed:
+            return
+        try:
+            self.end_payment()
+            self._closed = True
+            if self._spool is not None:
+                self._xmlfile, xf = self._open_document(self._count,
+                                                        self.ctrl_sum)
+                xf.flush()
+                self._spool.seek(0)
+                shutil.copyfileobj(self._spool, self._output)
+                self._spool.close()
+                self._spool = None
+            self._close_document()
+            if self._validating:
+                self._output.close()
+        except ValidationError:
+            self._abort()
+            raise
+        if self._index is not None:
+            self._index.commit()
+        if (self._expected is not None and
+                self._expected != (self._count, self._ctrl_sum_cents)):
+            raise ValidationError('Group header does not match transactions: '
+                                  '{0} != {1}'.format(
+                                      self._expected,
+                                      (self._count, self._ctrl_sum_cents)))
+
+    def _abort(self):
+        """
+        Releases the spool file without finishing the message and truncates
+        seekable output back to where the message started
+        """
+        self._closed = True
+        self._payment = None
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+        if self._start is not None:
+            try:
+                self._raw_output.seek(self._start)
+                self._raw_output.truncate()
+            except (OSError, ValueError) as e:
+                log.warning("Unable to truncate aborted C2B message: "
+                            "{0}".format(e))
+
+
+PAIN_002 = 'urn:iso:std:iso:20022:tech:xsd:pain.002.001.02'
+CAMT_054 = 'urn:iso:std:iso:20022:tech:xsd:camt.054.001.02'
+
+
+def _source(app_response):
+    """
+    @param app_response: XML response as bytes or binary file object
+    @return: File object for the parser
+    """
+    if isinstance(app_response, bytes):
+        return BytesIO(app_response)
+    return app_response
+
+
+def _document_namespace(app_response):
+    """
+    Finds the namespace of the first Document-element
+
+    Only the beginning of the response is parsed. File objects are rewound
+    to where they were.
+
+    @param app_response: XML response as bytes or binary file object
+    @rtype: string
+    @return: Namespace or None if there is no Document-element
+    """
+    source = _source(app_response)
+    position = source.tell() if hasattr(source, 'tell') else None
+    namespace = None
+    try:
+        for action, element in ET.iterparse(source, events=('start',)):
+            qname = ET.QName(element)
+            if qname.localname == 'Document':
+                namespace = qname.namespace
+                break
+    finally:
+        if position is not None:
+            source.seek(position)
+    return namespace
+
+
+def _release(element):
+    """
+    Clears a processed element and removes its processed siblings so that
+    the tree built by iterparse doesn't grow
+    """
+    element.clear()
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
 
 
 class C2BResponse():
@@ -263,7 +841,7 @@ class C2BResponse():
         Initializes the parser and parses the response
 
         @param app_response: XML response from the bank
-        @type app_response: string
+        @type app_response: bytes or binary file object
         """
 
         self._pain = None
@@ -277,22 +855,13 @@ class C2BResponse():
         with a list of transactions of type L{PmntInfAndStatus}.
 
         @param app_response: XML response from the bank
-        @type app_response: string
-        """
-        ns_pain = '{urn:iso:std:iso:20022:tech:xsd:pain.002.001.02}'
-        pain_doc = ns_pain + 'Document'
-        pain_xpath = "//*[local-name() = 'Document' and namespace-uri() = '" + ns_pain[1:][:-1] + "']"
-        ns_camt = '{urn:iso:std:iso:20022:tech:xsd:camt.054.001.02}'
-        camt_doc = ns_camt + 'Document'
-        camt_xpath = "//*[local-name() = 'Document' and namespace-uri() = '" + ns_camt[1:][:-1] + "']"
-        tree = ET.parse(BytesIO(app_response), ET.XMLParser(ns_clean=True))
-
-        if len(tree.xpath((pain_xpath))) != 0:
-            if tree.xpath((pain_xpath))[0].tag == pain_doc:
-                self._pain = C2BResponsePain(app_response)
-        elif len(tree.xpath((camt_xpath))) != 0:
-            if tree.xpath((camt_xpath))[0].tag == camt_doc:
-                self._camt = C2BResponseCamt(app_response)
+        @type app_response: bytes or binary file object
+        """
+        namespace = _document_namespace(app_response)
+        if namespace == PAIN_002:
+            self._pain = C2BResponsePain(app_response)
+        elif namespace == CAMT_054:
+            self._camt = C2BResponseCamt(app_response)
 
     def get_response(self):
         if self._pain is not None:
@@ -307,6 +876,85 @@ class C2BResponse():
             return str(self._camt)
 
 
+def _pain_tag(name):
+    return ET.QName(PAIN_002, name).text
+
+
+# Fields of PmntInfAndStatus by tag inside TxInfAndSts
+_PAIN_TX_TAGS = dict((_pain_tag(tag), name) for tag, name in (
+    ('OrgnlInstrId', '_orgnl_instr_id'),
+    ('OrgnlEndToEndId', '_orgnl_end_to_end_id'),
+    ('OrgnlTxId', '_orgnl_tx_id'),
+    ('TxSts', '_tx_sts'),
+    ('AddtlStsRsnInf', '_sts_addtl_sts_rns_inf'),
+    ('ReqdExctnDt', '_reqd_exctn_dt'),
+))
+# Fields by parent and tag, account fields are prefixed by _dbtr or _cdtr
+_PAIN_TX_PARENT_TAGS = dict(((_pain_tag(parent), _pain_tag(tag)), name)
+                            for parent, tag, name in (
+    ('StsRsn', 'Cd', '_sts_cd'),
+    ('Id', 'IBAN', '_iban'),
+    ('Id', 'BBAN', '_bban'),
+    ('PrtryAcct', 'Id', '_prtry_acct_id'),
+))
+_PAIN_ACCOUNTS = {_pain_tag('DbtrAcct'): '_dbtr', _pain_tag('CdtrAcct'): '_cdtr'}
+_PAIN_INSTD_AMT = _pain_tag('InstdAmt')
+_PAIN_HDR_FIELDS = (
+    ('_hdr_msg_id', 'p:MsgId'),
+    ('_hdr_cre_dt_tm', 'p:CreDtTm'),
+)
+_PAIN_GRP_FIELDS = (
+    ('_orgnl_msg_id', 'p:OrgnlMsgId'),
+    ('_orgnl_msg_nm_id', 'p:OrgnlMsgNmId'),
+    ('_orgnl_cre_dt_tm', 'p:OrgnlCreDtTm'),
+    ('_orgnl_nb_of_txs', 'p:OrgnlNbOfTxs'),
+    ('_grp_sts', 'p:GrpSts'),
+    ('_sts_cd', 'p:StsRsnInf/p:StsRsn/p:Cd'),
+    ('_addtl_sts_rsn_inf', 'p:StsRsnInf/p:AddtlStsRsnInf'),
+)
+_PAIN_NS = {'p': PAIN_002}
+
+
+def _read_payment(element):
+    """
+    Reads feedback of one payment with a single walk of TxInfAndSts
+
+    @rtype: L{PmntInfAndStatus}
+    """
+    tx = c2bhelper.PmntInfAndStatus()
+    for el in element.iter():
+        name = _PAIN_TX_TAGS.get(el.tag)
+        if name is not None:
+            setattr(tx, name, el.text)
+            continue
+        if el.tag == _PAIN_INSTD_AMT:
+            tx._instd_amt = el.text
+            tx._instd_amt_curr = el.get('Ccy')
+            continue
+        parent = el.getparent()
+        name = _PAIN_TX_PARENT_TAGS.get((parent.tag, el.tag))
+        if name is None:
+            continue
+        if name == '_sts_cd':
+            tx._sts_cd = el.text
+            continue
+        while parent is not element and parent.tag not in _PAIN_ACCOUNTS:
+            parent = parent.getparent()
+        if parent is not element:
+            setattr(tx, _PAIN_ACCOUNTS[parent.tag] + name, el.text)
+    return tx
+
+
+def _read_fields(obj, element, fields):
+    """
+    Sets attributes of obj from texts found with paths in fields
+    """
+    for name, path in fields:
+        child = element.find(path, _PAIN_NS)
+        if child is not None:
+            setattr(obj, name, child.text)
+
+
 class C2BResponsePain():
     """
     Class for the pain-based C2B-response
@@ -335,9 +983,13 @@ class C2BResponsePain():
     @ivar _payment_inf: List of PmntInfAndStatus objects holding payment information
     """
 
-    def __init__(self, app_response):
+    def __init__(self, app_response=None):
         """
         Initializes the values for the pain-based response
+
+        @param app_response: XML response from the bank. If not given, the
+            response can be streamed with L{iter_payments}.
+        @type app_response: bytes or binary file object
         """
         self._response_type = 'pain'
         self._hdr_msg_id = None
@@ -351,100 +1003,43 @@ class C2BResponsePain():
         self._addtl_sts_rsn_inf = None
         self._payment_inf = []
 
-        self._parse_response(app_response)
+        if app_response is not None:
+            self._parse_response(app_response)
 
     def _parse_response(self, app_response):
-        ns_pain_002 = '{urn:iso:std:iso:20022:tech:xsd:pain.002.001.02}'
-        tree = ET.parse(BytesIO(app_response), ET.XMLParser(ns_clean=True))
-
-        for element in tree.iter():
-            # Group Header
-            if element.tag == ns_pain_002 + 'MsgId':
-                self._hdr_msg_id = element.text
-            if element.tag == ns_pain_002 + 'CreDtTm':
-                self._hdr_cre_dt_tm = element.text
-
-            # Original message information
-            if element.tag == ns_pain_002 + 'OrgnlMsgId':
-                self._orgnl_msg_id = element.text
-            if element.tag == ns_pain_002 + 'OrgnlMsgNmId':
-                self._orgnl_msg_nm_id = element.text
-            if element.tag == ns_pain_002 + 'OrgnlCreDtTm':
-                self._orgnl_cre_dt_tm = element.text
-            if element.tag == ns_pain_002 + 'OrgnlNbOfTxs':
-                self._orgnl_nb_of_txs = element.text
-            if element.tag == ns_pain_002 + 'GrpSts':
-                self._grp_sts = element.text
-
-        status_code = tree.xpath(('/ns:Document' +
-                                 '/ns:pain.002.001.02' +
-                                 '/ns:OrgnlGrpInfAndSts' +
-                                 '/ns:StsRsnInf' +
-                                 '/ns:StsRsn' +
-                                 '/ns:Cd'),
-                                namespaces={'ns': ns_pain_002[1:][:-1]})
-
-        status_reason = tree.xpath(('/ns:Document' +
-                                    '/ns:pain.002.001.02' +
-                                    '/ns:OrgnlGrpInfAndSts' +
-                                    '/ns:StsRsnInf' +
-                                    '/ns:AddtlStsRsnInf'),
-                                   namespaces={'ns': ns_pain_002[1:][:-1]})
-
-        # This is to be used inside the transaction where?
-        orgn_pmnt_inf_id = tree.xpath(('/ns:Document' +
-                                       '/ns:pain.002.001.02' +
-                                       '/ns:TxInfAndSts' +
-                                       '/ns:OrgnlEndToEndId'),
-                                      namespaces={'ns': ns_pain_002[1:][:-1]})
-
-        if len(status_code) == 1:
-            self._sts_cd = status_code[0].text
-
-            if len(status_reason) == 1:
-                self._addtl_sts_rsn_inf = status_reason[0].text
-
-        context = ET.iterparse(BytesIO(app_response), events=("start", "end"))
+        for tx in self.iter_payments(app_response):
+            self._payment_inf.append(tx)
+
+    def iter_payments(self, app_response):
+        """
+        Parses the response in one streaming pass
+
+        Group information is stored to this object as it is met and payment
+        feedback is yielded one at a time. Processed elements are released,
+        so memory use doesn't grow with the number of payments. Payments are
+        not added to L{get_payments}.
+
+        @param app_response: XML response from the bank
+        @type app_response: bytes or binary file object
+        @rtype: generator of L{PmntInfAndStatus}
+        @return: Feedback of individual payments
+        """
+        grp_hdr = _pain_tag('GrpHdr')
+        orgnl_grp = _pain_tag('OrgnlGrpInfAndSts')
+        tx_inf = _pain_tag('TxInfAndSts')
+        context = ET.iterparse(_source(app_response), events=('end',),
+                               tag=(grp_hdr, orgnl_grp, tx_inf))
         for action, element in context:
-            if (element.tag == ns_pain_002 + 'TxInfAndSts'):
-                tx = c2bhelper.PmntInfAndStatus()
-                for el in element.iter():
-                    if action == 'start':
-                        if el.tag == ns_pain_002 + 'OrgnlEndToEndId':
-                            tx._orgnl_end_to_end_id = el.text
-                        if el.tag == ns_pain_002 + 'OrgnlTxId':
-                            tx._orgnl_tx_id = el.text
-                        if el.tag == ns_pain_002 + 'TxSts':
-                            tx._tx_sts = el.text
-                        if el.tag == ns_pain_002 + 'Cd':
-                            tx._sts_cd = el.text
-                        if el.tag == ns_pain_002 + 'AddtlStsRsnInf':
-                            tx._sts_addtl_sts_rns_inf = el.text
-                        if el.tag == ns_pain_002 + 'InstdAmt':
-                            tx._instd_amt = el.text
-                            tx._instd_amt_curr = el.get('Ccy')
-                        if el.tag == ns_pain_002 + 'ReqdExctnDt':
-                            tx._reqd_exctn_dt = el.text
-                        if el.tag == ns_pain_002 + 'DbtrAcct':
-                            for e in el.iter():
-                                if e.tag == ns_pain_002 + 'IBAN':
-                                    tx._dbtr_iban = e.text
-                                if e.tag == ns_pain_002 + 'BBAN':
-                                    tx._dbtr_bban = e.text
-                                if e.tag == ns_pain_002 + 'PrtryAcct':
-                                    if e[0].tag == ns_pain_002 + 'Id':
-                                        tx._dbtr_prtry_acct_id = e[0].text
-                        if el.tag == ns_pain_002 + 'CdtrAcct':
-                            for e in el.iter():
-                                if e.tag == ns_pain_002 + 'IBAN':
-                                    tx._cdtr_iban = e.text
-                                if e.tag == ns_pain_002 + 'BBAN':
-                                    tx._dbtr_bban = e.text
-                                if e.tag == ns_pain_002 + 'PrtryAcct':
-                                    if e[0].tag == ns_pain_002 + 'Id':
-                                        tx._cdtr_prtry_acct_id = e[0].text
-
-                self._payment_inf.append(tx)
+            if element.tag == tx_inf:
+                tx = _read_payment(element)
+                _release(element)
+                yield tx
+            else:
+                if element.tag == grp_hdr:
+                    _read_fields(self, element, _PAIN_HDR_FIELDS)
+                else:
+                    _read_fields(self, element, _PAIN_GRP_FIELDS)
+                _release(element)
 
     def get_group_status(self):
         """
@@ -470,6 +1065,99 @@ class C2BResponsePain():
         return(return_string)
 
 
+# Kinds of camt-fields: text, text appended to list, amount with currency
+# and structured remittance information appended to list
+_TEXT, _LIST, _AMOUNT, _OBJECT = range(4)
+# Elements whose paths are looked up relative to them
+_CAMT_ANCHORS = frozenset(('GrpHdr', 'Ntfctn', 'Ntry', 'TxDtls'))
+_CAMT_STRD = ['TxDtls', 'RmtInf', 'Strd']
+_CAMT_FIELDS = dict((tuple(path.split('/')), (target, name, kind))
+                    for path, target, name, kind in (
+    ('GrpHdr/MsgId', 'self', '_hdr_msg_id', _TEXT),
+    ('GrpHdr/CreDtTm', 'self', '_hdr_cre_dt_tm', _TEXT),
+    ('GrpHdr/MsgRcpt/Id/OrgId/Othr/Id', 'self', '_hdr_id', _TEXT),
+    ('GrpHdr/MsgRcpt/Id/OrgId/Othr/SchmeNm/Cd', 'self', '_hdr_cd', _TEXT),
+    ('GrpHdr/AddtlInf', 'self', '_hdr_addtl_inf', _TEXT),
+    ('Ntfctn/Id', 'self', '_ntfctn_id', _TEXT),
+    ('Ntfctn/CreDtTm', 'self', '_ntfctn_cre_dt_tm', _TEXT),
+    ('Ntfctn/Acct/Id/IBAN', 'self', '_acct_iban', _TEXT),
+    ('Ntry/Amt', 'self', '_ntry_amt', _AMOUNT),
+    ('Ntry/CdtDbtInd', 'self', '_ntry_cdt_dbt_ind', _TEXT),
+    ('Ntry/Sts', 'self', '_ntry_sts', _TEXT),
+    ('Ntry/BookgDt/Dt', 'self', '_ntry_bookg_dt', _TEXT),
+    ('Ntry/AcctSvcrRef', 'self', '_ntry_acct_svcr_ref', _TEXT),
+    ('Ntry/BkTxCd/Prtry/Cd', 'self', '_ntry_bk_tx_cd_prtry_cd', _TEXT),
+    ('Ntry/NtryDtls/Btch/PmtInfId', 'self', '_ntry_dtls_btch_pmt_inf_id',
+     _TEXT),
+    ('Ntry/NtryDtls/Btch/NbOfTxs', 'self', '_ntry_dtls_btch_nb_of_txs',
+     _TEXT),
+    ('TxDtls/Refs/AcctSvcrRef', 'tx', '_acct_svcr_ref', _TEXT),
+    ('TxDtls/Refs/InstrId', 'tx', '_instr_id', _TEXT),
+    ('TxDtls/Refs/EndToEndId', 'tx', '_end_to_end_id', _TEXT),
+    ('TxDtls/AmtDtls/InstdAmt/Amt', 'tx', '_instd_amt', _AMOUNT),
+    ('TxDtls/AmtDtls/InstdAmt/CcyXchg/TrgtCcy', 'tx',
+     '_instd_ccy_xchg_target_ccy', _TEXT),
+    ('TxDtls/AmtDtls/InstdAmt/CcyXchg/UnitCcy', 'tx',
+     '_instd_ccy_xchg_unit_ccy', _TEXT),
+    ('TxDtls/AmtDtls/InstdAmt/CcyXchg/XchgRate', 'tx',
+     '_instd_ccy_xchg_rate', _TEXT),
+    ('TxDtls/AmtDtls/InstdAmt/CcyXchg/CtrctId', 'tx',
+     '_instd_ccy_xchg_ctrct_id', _TEXT),
+    ('TxDtls/AmtDtls/InstdAmt/CcyXchg/QtnDt', 'tx',
+     '_instd_ccy_xchg_qtn_dt', _TEXT),
+    ('TxDtls/AmtDtls/CntrValAmt/Amt', 'tx', '_cntr_val_amt', _TEXT),
+    ('TxDtls/Chrgs/Br', 'tx', '_tx_chargers_bearer', _LIST),
+    ('TxDtls/RltdPties/Dbtr/Nm', 'tx', '_dbtr_nm', _TEXT),
+    ('TxDtls/RltdPties/Dbtr/Id/OrgId/Othr/Id', 'tx', '_dbtr_id', _LIST),
+    ('TxDtls/RltdPties/UltmtDbtr/Nm', 'tx', '_ultmt_dbtr_nm', _TEXT),
+    ('TxDtls/RltdPties/Cdtr/Nm', 'tx', '_cdtr_nm', _TEXT),
+    ('TxDtls/RltdPties/Cdtr/PstlAdr/AdrLine', 'tx', '_cdtr_adr_lines',
+     _LIST),
+    ('TxDtls/RltdPties/Cdtr/Id/OrgId/BICOrBEI', 'tx', '_cdtr_id_bic_or_bei',
+     _TEXT),
+    ('TxDtls/RltdPties/Cdtr/Id/OrgId/Othr/Id', 'tx', '_cdtr_id_org_othr_id',
+     _TEXT),
+    ('TxDtls/RltdPties/Cdtr/Id/PrvtId/Othr/Id', 'tx',
+     '_cdtr_id_prvt_othr_id', _TEXT),
+    ('TxDtls/RltdPties/CdtrAcct/Id/IBAN', 'tx', '_cdtr_acct_id_iban', _TEXT),
+    ('TxDtls/RltdPties/CdtrAcct/Id/Othr/Id', 'tx', '_cdtr_acct_id_othr_id',
+     _TEXT),
+    ('TxDtls/RltdPties/UltmtCdtr/Nm', 'tx', '_ultmt_cdtr_nm', _TEXT),
+    ('TxDtls/RltdAgts/CdtrAgt/FinInstnId/BIC', 'tx',
+     '_rltd_agts_cdtr_agt_bic', _TEXT),
+    ('TxDtls/RltdAgts/CdtrAgt/FinInstnId/ClrSysMmbId/ClrSysId/Cd', 'tx',
+     '_rltd_agts_cdtr_agt_clr_sys_id', _TEXT),
+    ('TxDtls/RltdAgts/CdtrAgt/FinInstnId/Nm', 'tx',
+     '_rltd_agts_cdtr_agt_nm', _TEXT),
+    ('TxDtls/RltdAgts/CdtrAgt/FinInstnId/PstlAdr/AdrLine', 'tx',
+     '_rltd_agts_cdtr_agt_adr_lines', _LIST),
+    ('TxDtls/RltdAgts/IntrmyAgt1/FinInstnId/BIC', 'tx', '_intrmy_agt1_bic',
+     _TEXT),
+    ('TxDtls/RltdAgts/IntrmyAgt1/FinInstnId/ClrSysMmbId/ClrSysId/Cd', 'tx',
+     '_intrmy_agt1_clr_sys_id', _TEXT),
+    ('TxDtls/RltdAgts/IntrmyAgt1/FinInstnId/PstlAdr/AdrLine', 'tx',
+     '_intrmy_agt1_adr_lines', _LIST),
+    ('TxDtls/Purp/Cd', 'tx', '_purpose', _TEXT),
+    ('TxDtls/RmtInf/Ustrd', 'tx', '_rmt_inf_ustrd', _TEXT),
+    ('TxDtls/RmtInf/Strd', 'tx', '_rmt_inf_strd_list', _OBJECT),
+    ('TxDtls/RmtInf/Strd/RfrdDocInf/Tp/CdOrPrtry/Cd', 'rmt',
+     '_rfrd_doc_inf_cd_or_prtry', _TEXT),
+    ('TxDtls/RmtInf/Strd/RfrdDocAmt/CdtNoteAmt', 'rmt',
+     '_rfrd_doc_amt_cdt_note_amt', _TEXT),
+    ('TxDtls/RmtInf/Strd/RfrdDocAmt/RmtdAmt', 'rmt',
+     '_rfrd_doc_amt_rmtd_amt', _TEXT),
+    ('TxDtls/RmtInf/Strd/CdtrRefInf/Tp/CdOrPrtry/Cd', 'rmt',
+     '_cdtr_ref_inf_cd_or_prtry_cd', _TEXT),
+    ('TxDtls/RmtInf/Strd/CdtrRefInf/Tp/Issr', 'rmt',
+     '_cdtr_ref_inf_tp_issr', _TEXT),
+    ('TxDtls/RmtInf/Strd/CdtrRefInf/Ref', 'rmt', '_cdtr_ref_inf_ref', _TEXT),
+    ('TxDtls/RmtInf/Strd/AddtlRmtInf', 'rmt', '_addtl_rnt_inf', _TEXT),
+    ('TxDtls/RltdDts/AccptncDtTm', 'tx', '_rltd_dts_accptnc_dt_tm', _TEXT),
+    ('TxDtls/RltdDts/IntrBkSttlmDt', 'tx', '_rltd_dts_intr_bk_sttlm_dt',
+     _TEXT),
+))
+
+
 class C2BResponseCamt():
     """
     Class for the camt-based response
@@ -486,6 +1174,8 @@ class C2BResponseCamt():
     @ivar _hdr_id: Response receiver's identification
     @type _hdr_cd: string
     @ivar _hdr_cd: Bank's identification
+    @type _hdr_addtl_inf: string
+    @ivar _hdr_addtl_inf: Additional information of the response
     @type _ntfctn_id: string
     @ivar _ntfctn_id: Notification ID
     @type _ntfctn_cre_dt_tm: string
@@ -508,17 +1198,29 @@ class C2BResponseCamt():
     @ivar _ntry_bk_tx_cd_prtry_cd: Bank transactin code
     @type _ntry_dtls_btch_pmt_inf_id: string
     @ivar _ntry_dtls_btch_pmt_inf_id: Payment information identification from the original pain message
+    @type _ntry_dtls_btch_nb_of_txs: string
+    @ivar _ntry_dtls_btch_nb_of_txs: Number of transactions in the batch
+    @type _transactin_details: L{TxDtls}
+    @ivar _transactin_details: List of TxDtls objects holding transaction details
 
     @note: Testing has not been done, because the test environment doesn't provide these reports.
     """
 
-    def __init__(self, app_response):
+    def __init__(self, app_response=None):
+        """
+        Initializes the values for the camt-based response
+
+        @param app_response: XML response from the bank. If not given, the
+            response can be streamed with L{iter_transactions}.
+        @type app_response: bytes or binary file object
+        """
 
         self._response_type = 'camt'
         self._hdr_msg_id = None
         self._hdr_cre_dt_tm = None
         self._hdr_id = None
         self._hdr_cd = None
+        self._hdr_addtl_inf = None
         self._ntfctn_id = None
         self._ntfctn_cre_dt_tm = None
         self._acct_iban = None
@@ -530,257 +1232,79 @@ class C2BResponseCamt():
         self._ntry_acct_svcr_ref = None
         self._ntry_bk_tx_cd_prtry_cd = None
         self._ntry_dtls_btch_pmt_inf_id = None
+        self._ntry_dtls_btch_nb_of_txs = None
 
         self._transactin_details = []
-        self._parse_response(app_response)
+        if app_response is not None:
+            self._parse_response(app_response)
 
-    """
     def _parse_response(self, app_response):
-        namespace = '{urn:iso:std:iso:20022:tech:xsd:camt.054.001.02}'
-        #tree = ET.parse(BytesIO(app_response), ET.XMLParser(ns_clean=True))
+        for tx in self.iter_transactions(app_response):
+            self._transactin_details.append(tx)
+
+    def iter_transactions(self, app_response):
+        """
+        Parses the response in one streaming pass
+
+        Every element is visited once and its path below the closest
+        GrpHdr, Ntfctn, Ntry or TxDtls element is looked up from a table.
+        Header and entry information is stored to this object as it is met
+        and transaction details are yielded one at a time. Processed
+        elements are released, so memory use doesn't grow with the number
+        of transactions. Transactions are not added to
+        L{get_transactions}.
 
-        context = ET.iterparse(BytesIO(app_response), events=("start", "end"))
+        @param app_response: XML response from the bank
+        @type app_response: bytes or binary file object
+        @rtype: generator of L{TxDtls}
+        @return: Details of individual transactions
+        """
+        targets = {'self': self}
+        path = []
+        anchors = []
+        context = ET.iterparse(_source(app_response),
+                               events=('start', 'end'))
         for action, element in context:
-            #print('%s: %s' % (action, element))
-            if (action, element.tag) == ('start', namespace + 'GrpHdr'):
-                #print('%s: %s' % (action, element))
-                for el in element.iter():
-                    if el.tag == namespace + 'MsgId':
-                        self._hdr_msg_if = el.text
-                    if el.tag == namespace + 'CreDtTm':
-                        self._hdr_cre_dt_tm = el.text
-                    if el.tag == namespace + 'Id':
-                        self._hdr_id = el.text
-                    if el.tag == namespace + 'Cd':
-                        self._hdr_cd = el.text
-                    if el.tag == namespace + 'AddtlInf':
-                        self._hdr_addtl_inf = el.text
-
-            if (action, element.tag) == ('start', namespace + 'Ntfctn'):
-                self._ntfctn_id = element.xpath('/ns:Document' +
-                                                '/ns:BkToCstmrDbtCdtNtfctn' +
-                                                '/ns:Ntfctn' +
-                                                '/ns:Id',
-                                                namespaces={'ns': namespace[1:][:-1]})[0].text
-                self._ntfctn_cre_dt_tm = element.xpath('/ns:Document' +
-                                                       '/ns:BkToCstmrDbtCdtNtfctn' +
-                                                       '/ns:Ntfctn' +
-                                                       '/ns:CreDtTm',
-                                                       namespaces={'ns': namespace[1:][:-1]})[0].text
-
-            if element.tag == namespace + 'Acct':
-                for el in element.iter():
-                    if el.tag == namespace + 'IBAN':
-                        self._acct_iban = el.text
-
-            if  element.tag == namespace + 'Ntry':
-                for el in element.iter():
-                    if action == 'start':
-                        if el.tag == namespace + 'Amt':
-                            self._ntry_amt = el.text
-                            self._ntry_amt_curr = el.get('Ccy')
-                        if el.tag == namespace + 'CdtDbtInd':
-                            self._ntry_cdt_dbt_ind = el.text
-                        if el.tag == namespace + 'Sts':
-                            self._ntry_sts = el.text
-                        if el.tag == namespace + 'BookgDt':
-                            for e in el.iter():
-                                if e.tag == namespace + 'Dt':
-                                    self._ntry_bookg_dt = e.text
-                        if el.tag == namespace + 'AcctSvcrRef':
-                            self._ntry_acct_svcr_ref = el.text
-                        if el.tag == namespace + 'BkTxCd':
-                            for e in el.iter():
-                                if e.tag == namespace + 'Prtry':
-                                    for ee in e.iter():
-                                        if ee.tag == namespace + 'Cd':
-                                            self._ntry_bk_tx_cd_prtry_cd = ee.text
-                        if el.tag == namespace + 'NtryDtls':
-                            for e in el.iter():
-                                if e.tag == namespace + 'Btch':
-                                    for ee in e.iter():
-                                        if ee.tag == namespace + 'PmtInfId':
-                                            self._ntry_dtls_btch_pmt_inf_id = ee.text
-                                        if ee.tag == namespace + 'NbOfTxs':
-                                            self._ntry_dtls_btch_nb_of_txs = ee.text
-                                if e.tag == namespace + 'TxDtls':
-                                    tx = c2bhelper.TxDtls()
-                                    for ee in e.iter():
-                                        if ee.tag == namespace + 'AcctSvcrRef':
-                                            tx._acct_svcr_ref = ee.text
-                                        if ee.tag == namespace + 'InstrId':
-                                            tx._instr_id = ee.text
-                                        if ee.tag == namespace + 'EndToEndId':
-                                            tx._end_to_end_id = ee.text
-                                        if ee.tag == namespace + 'AmtDtls':
-                                            for eee in ee.iter():
-                                                if eee.tag == namespace + 'InstdAmt':
-                                                    for eeee in eee.iter():
-                                                        if eeee.tag == namespace + 'Amt':
-                                                            tx._instd_amt = eeee.text
-                                                            tx._instd_amt_curr = eeee.get('Ccy')
-                                                        if eeee.tag == namespace + 'CcyXchg':
-                                                            for eeeee in eee.iter():
-                                                                if eeeee.tag == namespace + 'TrgtCcy':
-                                                                    tx._instd_ccy_xchg_target_ccy = eeeee.text
-                                                                if eeeee.tag == namespace + 'UnitCcy':
-                                                                    tx._instd_ccy_xchg_unit_ccy = eeeee.text
-                                                                if eeeee.tag == namespace + 'XchgRate':
-                                                                    tx._instd_ccy_xchg_rate = eeeee.text
-                                                                if eeeee.tag == namespace + 'CtrctId':
-                                                                    tx._instd_ccy_xchg_ctrct_id = eeeee.text
-                                                                if eeeee.tag == namespace + 'QtnDt':
-                                                                    tx._instd_ccy_xchg_qtn_dt = eeeee.text
-                                                if eee.tag == namespace + 'CntrValAmt':
-                                                    for eeee in eee.iter():
-                                                        if eeee.tag == namespace + 'Amt':
-                                                            tx._cntr_val_amt = eeee.text
-                                        if ee.tag == namespace + 'Chrgs':
-                                            for eee in ee.iter():
-                                                if eee.tag == namespace + 'Br':
-                                                    tx._tx_chargers_bearer.append(eee.text)
-                                        if ee.tag == namespace + 'RltdPties':
-                                            #print("%s, %s" % (action, ee))
-                                            for eee in ee.iter():
-                                                if eee.tag == namespace + 'Dbtr':
-                                                    for eeee in eee.iter():
-                                                        if eeee.tag == namespace + 'Nm':
-                                                            tx._dbtr_nm = eeee.text
-                                                        if eeee.tag == namespace + 'Id':
-                                                            for eeeee in eeee.iter():
-                                                                if eeeee.tag == namespace + 'OrgId':
-                                                                    for eeeeee in eeeee.iter():
-                                                                        if eeeeee.tag == namespace + 'Othr':
-                                                                            for eeeeeee in eeeeee.iter():
-                                                                                if eeeeeee.tag == namespace + 'Id':
-                                                                                    tx._dbtr_id.append(eeeeeee.text)
-                                                if eee.tag == namespace + 'UltmtDbtr':
-                                                    for eeee in eee.iter():
-                                                        if eeee.tag == namespace + 'Nm':
-                                                            tx._ultmt_dbtr_nm = eeee.text
-                                                if eee.tag == namespace + 'Cdtr':
-                                                    for eeee in eee.iter():
-                                                        if eeee.tag == namespace + 'Nm':
-                                                            tx._cdtr_nm = eeee.text
-                                                        if eeee.tag == namespace + 'PstlAdr':
-                                                            for eeeee in eeee.iter():
-                                                                if eeeee.tag == namespace + 'AdrLine':
-                                                                    tx._cdtr_adr_lines.append(eeeee.text)
-                                                        if eeee.tag == namespace + 'Id':
-                                                            for eeeee in eeee.iter():
-                                                                if eeeee.tag == namespace + 'OrgId':
-                                                                    for eeeeee in eeeee.iter():
-                                                                        if eeeeee.tag == namespace + 'BICOrBEI':
-                                                                            tx._cdtr_id_bic_or_bei = eeeeee.text
-                                                                        if eeeeee.tag == namespace + 'Othr':
-                                                                            for eeeeeee in eeeeee.iter():
-                                                                                if eeeeeee.tag == namespace + 'Id':
-                                                                                    tx._cdtr_id_org_othr_id = eeeeeee.text
-                                                                if eeeee.tag == namespace + 'PrvtId':
-                                                                    for eeeeee in eeeee.iter():
-                                                                        if eeeeee.tag == namespace + 'Othr':
-                                                                            for eeeeeee in eeeeee.iter():
-                                                                                if eeeeeee.tag == namespace + 'Id':
-                                                                                    tx._cdtr_id_prvt_othr_id = eeeeeee.text
-                                                if eee.tag == namespace + 'CdtrAcct':
-                                                    for eeee in eee.iter():
-                                                        if eeee.tag == namespace + 'Id':
-                                                            for eeeee in eeee.iter():
-                                                                if eeeee.tag == namespace + 'IBAN':
-                                                                    tx._cdtr_acct_id_iban = eeeee.text
-                                                                if eeeee.tag == namespace + 'Othr':
-                                                                    for eeeeee in eeeee.iter():
-                                                                        if eeeeee.tag == namespace + 'Id':
-                                                                            tx._cdtr_acct_id_othr_id = eeeeee.text
-                                                if eee.tag == namespace + 'UltmtCdtr':
-                                                    for eeee in eee.iter():
-                                                        if eeee.tag == namespace + 'Nm':
-                                                            tx._ultmt_cdtr_nm = eeee.text
-                                            if ee.tag == namespace + 'RltdAgts':
-                                                for eee in ee.iter():
-                                                    if eee.tag == namespace + 'CdtrAgt':
-                                                        for eeee in eee.iter():
-                                                            if eeee.tag == namespace + 'FinInstnId':
-                                                                for eeeee in eeee.iter():
-                                                                    if eeeee.tag == namespace + 'BIC':
-                                                                        tx._rltd_agts_cdtr_agt_bic = eeeee.text
-                                                                    if eeeee.tag == namespace + 'ClrSysMmbId':
-                                                                        for eeeeee in eeeeee.iter():
-                                                                            if eeeeee.tag == namespace + 'ClrSysId':
-                                                                                for eeeeeee in eeeeee.iter():
-                                                                                    if eeeeeee.tag == namespace + 'Cd':
-                                                                                        tx._rltd_agts_cdtr_agt_clr_sys_id = eeeeeee.text
-                                                                    if eeeee.tag == namespace + 'Nm':
-                                                                        tx._rltd_agts_cdtr_agt_nm = eeeee.text
-                                                                    if eeeee.tag == namespace + 'PstlAdr':
-                                                                        for eeeeee in eeeee.iter():
-                                                                            if eeeeee.tag == namespace + 'AdrLine':
-                                                                                tx._rltd_agts_cdtr_agt_adr_lines.append(eeeeee.text)
-                                                    if eee.tag == namespace + 'IntrmyAgt1':
-                                                        for eeee in eee.iter():
-                                                            if eeee.tag == namespace + 'FinInstnId':
-                                                                for eeeee in eeee.iter():
-                                                                    if eeeee.tag == namespace + 'BIC':
-                                                                        tx._intrmy_agt1_bic = eeeee.text
-                                                                    if eeeee.tag == namespace + 'ClrSysMmbId':
-                                                                        for eeeeee in eeeeee.iter():
-                                                                            if eeeeee.tag == namespace + 'ClrSysId':
-                                                                                for eeeeeee in eeeeee.iter():
-                                                                                    if eeeeeee.tag == namespace + 'Cd':
-                                                                                        tx._intrmy_agt1_clr_sys_id = eeeeeee.text
-                                                                    if eeeee.tag == namespace + 'Nm':
-                                                                        tx._rltd_agts_cdtr_agt_nm = eeeee.text
-                                                                    if eeeee.tag == namespace + 'PstlAdr':
-                                                                        for eeeeee in eeeee.iter():
-                                                                            if eeeeee.tag == namespace + 'AdrLine':
-                                                                                tx._intrmy_agt1_adr_lines.append(eeeeee.text)
-                                            if ee.tag == namespace + 'Purp':
-                                                for eee in ee.iter():
-                                                    if eee.tag == namespace + 'Cd':
-                                                        tx._purpose = eee.text
-                                            if ee.tag == namespace + 'RmtInf':
-                                                for eee in ee.iter():
-                                                    if eee.tag == namespace + 'Ustrd':
-                                                        tx._rmt_inf_ustrd = eee.text
-                                                    if eee.tag == namespace + 'Strd':
-                                                        rmt = c2bhelper.RmtInfStrd()
-                                                        for eeee in eee.iter():
-                                                            if eeee.tag == namespace + 'RfrdDocInf':
-                                                                for eeeee in eeee.iter():
-                                                                    if eeeee.tag == namespace + 'Tp':
-                                                                        for eeeeee in eeeee.iter():
-                                                                            if eeeeee.tag == namespace + 'CdOrPrtry':
-                                                                                for eeeeeee in eeeeee.iter():
-                                                                                    if eeeeeee.tag == namespace + 'Cd':
-                                                                                        rmt._rfrd_doc_inf_cd_or_prtry = eeeeeee.text
-                                                            if eeee.tag == namespace + 'RfrdDocAmt':
-                                                                for eeeee in eeee.iter():
-                                                                    if eeeee.tag == namespace + 'CdtNoteAmt':
-                                                                        rmt._rfrd_doc_amt_cdt_note_amt = eeeee.text
-                                                                    if eeeee.tag == namespace + 'RmtdAmt':
-                                                                        rmt._rfrd_doc_amt_rmtd_amt = eeeee.text
-                                                            if eeee.tag == namespace + 'CdtrRefInf':
-                                                                for eeeee in eeee.iter():
-                                                                    if eeeee.tag == namespace + 'Tp':
-                                                                        for eeeeee in eeeee.iter():
-                                                                            if eeeeee.tag == namespace + 'CdOrPrtry':
-                                                                                for eeeeeee in eeeeee.iter():
-                                                                                    if eeeeeee.tag == namespace + 'Cd':
-                                                                                        rmt._cdtr_ref_inf_cd_or_prtry_cd = eeeeeee.text
-                                                                            if eeeeee.tag == namespace + 'Issr':
-                                                                                rmt._cdtr_ref_inf_tp_issr = eeeeee.text
-                                                                    if eeeee.tag == namespace + 'Ref':
-                                                                        rmt._cdtr_ref_inf_ref = eeeee.text
-                                                            if eeee.tag == namespace + 'AddtlRntInf':
-                                                                rmt._addtl_rnt_inf = eeee.text
-                                                        tx._rmt_inf_strd_list.append(rmt)
-                                            if ee.tag == namespace + 'RltdDts':
-                                                for eee in ee.iter():
-                                                    if eee.tag == namespace + 'AccptncDtTm':
-                                                        tx._rltd_dts_accptnc_dt_tm = eee.text
-                                                    if eee.tag == namespace + 'IntrBkSttlmDt':
-                                                        tx._rltd_dts_intr_bk_sttlm_dt = eee.text
-    """
+            if action == 'start':
+                tag = element.tag
+                path.append(tag[tag.find('}') + 1:])
+                if path[-1] in _CAMT_ANCHORS:
+                    anchors.append(len(path) - 1)
+                    if path[-1] == 'TxDtls':
+                        targets['tx'] = c2bhelper.TxDtls()
+                elif path[-3:] == _CAMT_STRD:
+                    targets['rmt'] = c2bhelper.RmtInfStrd()
+                continue
+
+            if anchors:
+                field = _CAMT_FIELDS.get(tuple(path[anchors[-1]:]))
+                if field is not None:
+                    target, name, kind = field
+                    obj = targets[target]
+                    if kind is _TEXT:
+                        setattr(obj, name, element.text)
+                    elif kind is _LIST:
+                        getattr(obj, name).append(element.text)
+                    elif kind is _AMOUNT:
+                        setattr(obj, name, element.text)
+                        setattr(obj, name + '_curr', element.get('Ccy'))
+                    else:
+                        getattr(obj, name).append(targets.pop('rmt'))
+                if anchors[-1] == len(path) - 1:
+                    anchors.pop()
+                    _release(element)
+                    if path[-1] == 'TxDtls':
+                        path.pop()
+                        yield targets.pop('tx')
+                        continue
+            path.pop()
+
+    def get_transactions(self):
+        """
+        @return: List of transaction details in a message
+        @rtype: list of L{TxDtls}
+        """
+        return(self._transactin_details)
 
 
 class NotEnoughParametersError(Exception):
@@ -0,0 +1,229 @@
+'''Module for splitting SEPA payments to size bounded C2B messages and
+uploading them concurrently.
+
+Bank limits the number of transactions and the size of one pain.001 file.
+plan_messages divides payments to as many C2B messages as needed. Payments
+that do not fit to one message are split to several PmtInf-blocks with the
+same header information. Every message gets its own group header and a
+numbered MsgId.
+
+Usage:
+    >>> messages = plan_messages(payer, payments, 'SALARY-0513',
+                                 max_transactions=1000)
+    >>> result = upload_messages(webservice, messages)
+    >>> if not result.ok:
+            print(result.errors)
+'''
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from lxml import etree as ET
+
+try:
+    from bankws import c2b
+    from bankws import c2bhelper
+except ImportError:
+    import c2b
+    import c2bhelper
+
+MAX_TRANSACTIONS = 10000
+""" Default maximum number of transactions in one message. """
+MAX_MSG_ID_LENGTH = 35
+""" Maximum length of MsgId (Max35Text). """
+UPLOAD_WORKERS = 4
+""" Default number of concurrent uploads. """
+
+
+def plan_messages(payer, payments, msg_id, max_transactions=MAX_TRANSACTIONS,
+                  max_bytes=None, grpg='MIXD'):
+    """ Divides SEPA payments to C2B messages.
+
+    Transactions keep their order. When there is more than one message,
+    MsgIds are msg_id followed by -1, -2, ... padded to equal length.
+
+    @type  payer: L{Entity}
+    @param payer: Payer's information.
+    @type  payments: iterable of L{SEPA}
+    @param payments: Payments to be sent.
+    @type  msg_id: string
+    @param msg_id: Message ID of the batch.
+    @type  max_transactions: int
+    @param max_transactions: Maximum number of transactions in one message.
+    @type  max_bytes: int
+    @param max_bytes: Maximum size of one message in bytes (optional). Size
+                      is estimated from serialized elements.
+    @type  grpg: string
+    @param grpg: MIXD, GRPD or SNGL
+    @rtype: list<L{C2B}>
+    @return: Messages with group headers set.
+    @raise ValueError: If a payment has no transactions, a transaction
+                       doesn't fit to an empty message or MsgId is too long.
+    """
+    if max_transactions < 1:
+        raise ValueError("max_transactions must be positive")
+    overhead = 0
+    if max_bytes is not None:
+        overhead = _message_overhead(payer, grpg)
+
+    parts = [[]]
+    count = 0
+    size = overhead
+    for sepa in payments:
+        if not isinstance(sepa, c2bhelper.SEPA):
+            raise ValueError("Input object was not of type SEPA")
+        if not sepa._transactions:
+            raise ValueError("Payment {0} has no transactions".format(
+                                                sepa._payment_information_id))
+        header_size = 0
+        if max_bytes is not None:
+            header_size = _payment_size(payer, sepa)
+        current = None
+        for tx in sepa._transactions:
+            tx_size = 0
+            if max_bytes is not None:
+                tx_size = len(ET.tostring(c2b._transaction_element(tx)))
+                if overhead + header_size + tx_size > max_bytes:
+                    raise ValueError("Transaction {0} doesn't fit to "
+                                     "{1} bytes".format(tx._cdt_end_to_end_id,
+                                                        max_bytes))
+            added = tx_size + (header_size if current is None else 0)
+            if count and (count >= max_transactions or
+                          (max_bytes is not None and
+                           size + added > max_bytes)):
+                parts.append([])
+                count = 0
+                size = overhead
+                current = None
+                added = tx_size + header_size
+            if current is None:
+                current = sepa.empty_copy()
+                parts[-1].append(current)
+            current.add_transaction(tx)
+            count += 1
+            size += added
+
+    if not parts[0]:
+        return []
+    messages = []
+    for number, msg_id_ in enumerate(_message_ids(msg_id, len(parts))):
+        message = c2b.C2B(payer)
+        message.group_header(msg_id_, grpg)
+        for sepa in parts[number]:
+            message.add_SEPA_payment(sepa)
+        messages.append(message)
+    return messages
+
+
+def _message_ids(msg_id, count):
+    """ Gets MsgIds for count messages. """
+    if count == 1:
+        ids = [msg_id]
+    else:
+        width = len(str(count))
+        ids = ["{0}-{1:0{2}}".format(msg_id, number, width)
+               for number in range(1, count + 1)]
+    if len(ids[-1]) > MAX_MSG_ID_LENGTH:
+        raise ValueError("MsgId {0} is longer than {1} characters".format(
+                                                ids[-1], MAX_MSG_ID_LENGTH))
+    return ids
+
+
+def _message_overhead(payer, grpg):
+    """ Estimates bytes of message without PmtInf-blocks.
+
+    MsgId, NbOfTxs and CtrlSum are sized for their maximum lengths.
+    """
+    doc, pain = c2b._new_document()
+    pain.append(c2b._group_header_element(payer, 'X' * MAX_MSG_ID_LENGTH,
+                                          '9' * 15, grpg,
+                                          Decimal('9' * 16 + '.99')))
+    return len(ET.tostring(doc, xml_declaration=True, encoding='UTF-8'))
+
+
+def _payment_size(payer, sepa):
+    """ Estimates bytes of PmtInf-block without transactions. """
+    payment = ET.Element('PmtInf')
+    payment.extend(c2b._payment_info_elements(payer, sepa))
+    return len(ET.tostring(payment))
+
+
+class BatchResult():
+    """ BatchResult holds results of uploading messages.
+
+    Results are in the same order as the uploaded messages.
+
+    @type msg_ids: list<string>
+    @ivar msg_ids: MsgIds of uploaded messages.
+    @type responses: list<L{ApplicationResponse}>
+    @ivar responses: Response for every message or None if upload failed.
+    @type errors: dict
+    @ivar errors: MsgId to exception for failed uploads.
+    """
+    def __init__(self, msg_ids):
+        self.msg_ids = msg_ids
+        self.responses = [None] * len(msg_ids)
+        self.errors = {}
+
+    def _get_ok(self):
+        return not self.errors
+
+    def _get_succeeded(self):
+        return [msg_id for msg_id, response
+                in zip(self.msg_ids, self.responses) if response is not None]
+
+    def _get_failed(self):
+        return [msg_id for msg_id in self.msg_ids if msg_id in self.errors]
+
+    ok = property(_get_ok)
+    succeeded = property(_get_succeeded)
+    failed = property(_get_failed)
+
+    def __str__(self):
+        lines = ["{0}/{1} messages uploaded".format(len(self.succeeded),
+                                                    len(self.msg_ids))]
+        for msg_id in self.failed:
+            lines.append("{0}: {1}".format(msg_id, self.errors[msg_id]))
+        return '\n'.join(lines)
+
+
+def upload_messages(webservice, messages, workers=UPLOAD_WORKERS,
+                    filetype='pain.001.001.02', folder='target'):
+    """ Uploads C2B messages concurrently.
+
+    Every worker thread uses its own clone of webservice. A failed upload
+    doesn't stop the others; failures are collected to the result.
+
+    @type  webservice: L{WebService}
+    @param webservice: Configured web service.
+    @type  messages: list<L{C2B}>
+    @param messages: Messages from L{plan_messages}.
+    @type  workers: int
+    @param workers: Maximum number of concurrent uploads.
+    @type  filetype: string
+    @param filetype: Type of uploaded files.
+    @type  folder: string
+    @param folder: Folder in bank.
+    @rtype: L{BatchResult}
+    @return: Responses and errors of all messages.
+    """
+    result = BatchResult([message._msg_id for message in messages])
+    local = threading.local()
+
+    def upload(index):
+        message = messages[index]
+        try:
+            if not hasattr(local, 'webservice'):
+                local.webservice = webservice.clone()
+            result.responses[index] = local.webservice.upload_file(
+                                        str(message), filetype_=filetype,
+                                        folder_=folder,
+                                        filename_=message._msg_id + '.xml')
+        except Exception as e:
+            # Any failure, also of the clone or transport, belongs to this
+            # message only.
+            result.errors[message._msg_id] = e
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(upload, range(len(messages))))
+    return result
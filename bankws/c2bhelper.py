@@ -1,3 +1,58 @@
+import copy
+from decimal import Decimal, InvalidOperation
+
+MAX_AMOUNT_CENTS = 99999999999
+""" Largest amount of a SEPA credit transfer (999999999.99) in cents. """
+
+
+def amount_to_cents(amount):
+    """
+    Converts amount to integer cents without going through float arithmetic
+
+    @type amount: string, int, float or Decimal
+    @param amount: Amount in euros, e.g. '10.50'
+    @rtype: int
+    @return: Amount in cents
+
+    @raise ValueError: If amount is not a number, is negative or has more
+        than two decimals
+    """
+    try:
+        value = Decimal(str(amount).strip())
+    except InvalidOperation:
+        raise ValueError('Amount {0} is not a number'.format(amount))
+    if not value.is_finite() or value < 0:
+        raise ValueError('Amount {0} is not accepted'.format(amount))
+    cents = value.scaleb(2)
+    if cents != cents.to_integral_value():
+        raise ValueError('Amount {0} has more than two decimals'.format(amount))
+    return int(cents)
+
+
+def format_cents(cents):
+    """
+    Formats integer cents as amount with two decimals
+
+    @type cents: int
+    @param cents: Amount in cents
+    @rtype: string
+    @return: Amount, e.g. '10.50'
+    """
+    sign = '-' if cents < 0 else ''
+    units, cents = divmod(abs(cents), 100)
+    return '{0}{1}.{2:02}'.format(sign, units, cents)
+
+
+def cents_to_decimal(cents):
+    """
+    @type cents: int
+    @param cents: Amount in cents
+    @rtype: Decimal
+    @return: Amount with two decimals
+    """
+    return Decimal(cents).scaleb(-2)
+
+
 class SEPA():
     """
     SEPA class is used to construct the individual payment to the material
@@ -30,6 +85,8 @@ class SEPA():
 
     @ivar _transactions: List of transactions in the payment
     @type _transactions: L{CdtTrfTxInf}
+    @ivar _ctrl_sum_cents: Sum of transaction amounts in cents
+    @type _ctrl_sum_cents: int
 
     @note: Required attributes are indicated with REQ.
     @note: Only SEPA payment and salary inside Finland are available
@@ -70,6 +127,7 @@ class SEPA():
         self._ultmt_dbtr = ultmt_dbtr
 
         self._transactions = []
+        self._ctrl_sum_cents = 0
 
     def add_transaction(self, tr):
         """
@@ -79,6 +137,17 @@ class SEPA():
         @type tr: L{CdtTrfTxInf}
         """
         self._transactions.append(tr)
+        self._ctrl_sum_cents += tr._cdt_instd_amt_cents
+
+    def empty_copy(self):
+        """
+        @rtype: L{SEPA}
+        @return: Payment with the same header information and no transactions
+        """
+        other = copy.copy(self)
+        other._transactions = []
+        other._ctrl_sum_cents = 0
+        return other
 
 
 class CdtTrfTxInf():
@@ -93,7 +162,9 @@ class CdtTrfTxInf():
     @ivar _cdt_end_to_end_id: Unique ID for the transaction
     @type _cdt_end_to_end_if: string
     @ivar _cdt_instd_amt: Amount of the payment
-    @type _cdt_instd_amd: float
+    @type _cdt_instd_amt: Decimal
+    @ivar _cdt_instd_amt_cents: Amount of the payment in cents
+    @type _cdt_instd_amt_cents: int
     @ivar _cdt_instd_amt_curr: Currency of the payment
     @type _cdt_instd_amt_curr: string
     @ivar _cdt_bic: BIC for the payment receiver's bank
@@ -127,8 +198,8 @@ class CdtTrfTxInf():
         @type end_to_end_id: string
         @param end_to_end_id: REQ Required ID provided by the payment initiator,
             which uniquely identifies the transaction
-        @type instd_amt: string
-        @param instd_amt: REQ Amount of the transaction
+        @type instd_amt: string, int or Decimal
+        @param instd_amt: REQ Amount of the transaction, at most two decimals
         @type instd_amt_curr: string
         @param instd_amt_cyrr: REQ Transaction currency [EUR, USD, etc]
         @type cdtr_bic: string
@@ -159,7 +230,11 @@ class CdtTrfTxInf():
         self._payment_receiver = receiver
         self._pmt_purp = pmt_purp
         self._cdt_end_to_end_id = end_to_end_id
-        self._cdt_instd_amt = instd_amt
+        self._cdt_instd_amt_cents = amount_to_cents(instd_amt)
+        if not 0 < self._cdt_instd_amt_cents <= MAX_AMOUNT_CENTS:
+            raise ValueError('instd_amt must be between 0.01 and '
+                             '999999999.99')
+        self._cdt_instd_amt = cents_to_decimal(self._cdt_instd_amt_cents)
         self._cdt_instd_amt_curr = instd_amt_curr
         self._cdt_bic = cdtr_bic
         self._cdt_cdtr_acct = cdtr_acct
@@ -274,8 +349,12 @@ class TxDtls():
     @ivar _cntr_val_amt: Counter value on EUR
     @type _tx_chargers_bearer: string
     @ivar _tx_chargers_bearer: List of transaction bearers
+    @type _dbtr_nm: string
+    @ivar _dbtr_nm: Debtor name
     @type _dbtr_id: string
     @ivar _dbtr_id: List of debtor's organization identifications
+    @type _cdtr_nm: string
+    @ivar _cdtr_nm: Creditor name
     @type _ultmt_dbtr_nm: string
     @ivar _ultmt_dbtr_nm: Ultimate debtor name
     @type _cdtr_adr_lines: string
@@ -329,7 +408,9 @@ class TxDtls():
         self._instd_ccy_xchg_ctrct_id = None
         self._instd_ccy_xchg_qtn_dt = None
         self._cntr_val_amt = None
+        self._dbtr_nm = None
         self._ultmt_dbtr_nm = None
+        self._cdtr_nm = None
         self._cdtr_id_bic_or_bei = None
         self._cdtr_id_org_othr_id = None
         self._cdtr_id_prvt_othr_id = None
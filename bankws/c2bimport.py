@@ -0,0 +1,471 @@
+'''C2bimport module reads payment rows from CSV or Arrow input and streams
+them to a C2B-message.
+
+Rows are kept as columns. IBAN, BIC, amount, currency and purpose code of
+all rows are checked with NumPy at once and only the valid rows are turned
+to L{CdtTrfTxInf} objects and written with L{C2BWriter}. Rows that fail a
+check are collected to a report instead of stopping the import.
+
+Usage:
+    >>> columns = read_csv('payroll.csv', delimiter=';')
+    >>> with open('payroll.xml', 'wb') as f:
+            with C2BWriter(f, payer, 'SALARY-0513') as writer:
+                report = import_payments(writer, sepa, columns)
+    >>> print(report)
+
+Columns::
+    - end_to_end_id: EndToEndId of the transaction (required)
+    - name: Creditor's name (required)
+    - iban: Creditor's IBAN, spaces are removed (required)
+    - bic: BIC of creditor's bank (required)
+    - amount: Amount in euros, '.' or ',' as decimal separator (required)
+    - currency: Currency code, defaults to EUR
+    - purpose: Payment purpose code, e.g. SALA
+    - message: Free-text message for the creditor
+    - instr_id: InstrId of the transaction
+    - country: Creditor's country code, required with address
+    - address: Creditor's address line
+
+External libraries:
+    - NumPy
+    - PyArrow (optional, needed only by read_arrow)
+'''
+import csv
+
+import numpy
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    from bankws import accountbatch
+    from bankws import c2bhelper
+    from bankws.entity import Entity
+except ImportError:
+    import accountbatch
+    import c2bhelper
+    from entity import Entity
+
+REQUIRED_COLUMNS = ('end_to_end_id', 'name', 'iban', 'bic', 'amount')
+""" Columns that must be present in input. """
+OPTIONAL_COLUMNS = ('currency', 'purpose', 'message', 'instr_id', 'country',
+                    'address')
+""" Columns that are read if they are present. """
+PURPOSE_CODES = ('STDY', 'BECH', 'PENS', 'BENE', 'SSBE', 'AGRT', 'SALA',
+                 'TAXS')
+""" Accepted payment purpose codes. """
+DEFAULT_CURRENCY = 'EUR'
+
+CHUNK_ROWS = 1000
+""" Number of rows formatted and written at once. """
+
+_MAX_LENGTHS = (('end_to_end_id', 35), ('name', 70), ('instr_id', 35),
+                ('message', 140), ('address', 70))
+# Formatted with % which is several times faster than str.format here
+_TRANSACTION_XML = (
+    '<CdtTrfTxInf><PmtId>%s<EndToEndId>%s</EndToEndId></PmtId>'
+    '<Amt><InstdAmt Ccy="%s">%s</InstdAmt></Amt>'
+    '<CdtrAgt><FinInstnId><BIC>%s</BIC></FinInstnId></CdtrAgt>'
+    '<Cdtr><Nm>%s</Nm>%s</Cdtr>'
+    '<CdtrAcct><Id><IBAN>%s</IBAN></Id></CdtrAcct>%s%s</CdtTrfTxInf>')
+_ADDRESS_XML = '<PstlAdr><AdrLine>%s</AdrLine><Ctry>%s</Ctry></PstlAdr>'
+_MAX_AMOUNT_DIGITS = 15
+
+
+class ImportReport():
+    """ ImportReport holds outcome of importing payment rows.
+
+    @type rows: int
+    @ivar rows: Number of input rows.
+    @type imported: int
+    @ivar imported: Number of transactions written.
+    @type ctrl_sum_cents: int
+    @ivar ctrl_sum_cents: Sum of written amounts in cents.
+    @type rejected: list
+    @ivar rejected: (row, column, reason) for every row that was not
+                    written. Row is the index of the data row starting
+                    from 0.
+    """
+    def __init__(self, rows, rejected):
+        self.rows = rows
+        self.imported = 0
+        self.ctrl_sum_cents = 0
+        self.rejected = rejected
+
+    def _get_ok(self):
+        return not self.rejected
+
+    ok = property(_get_ok)
+
+    def __str__(self):
+        lines = ["{0}/{1} rows imported, {2} EUR".format(
+                 self.imported, self.rows,
+                 c2bhelper.format_cents(self.ctrl_sum_cents))]
+        for row, column, reason in self.rejected:
+            lines.append("row {0}: {1} {2}".format(row, column, reason))
+        return '\n'.join(lines)
+
+
+def read_csv(source, delimiter=',', encoding='utf-8', names=None):
+    """ Reads payment columns from CSV with a header row.
+
+    @type  source: string or file
+    @param source: Filename or text file object.
+    @type  delimiter: string
+    @param delimiter: Field delimiter.
+    @type  encoding: string
+    @param encoding: Encoding of the file when filename is given.
+    @type  names: dict
+    @param names: Column name to header in the file, for headers that
+                  differ from column names (optional).
+    @rtype: dict
+    @return: Column name to NumPy string array.
+    @raise ValueError: If the file is empty or required columns are missing.
+    """
+    if isinstance(source, str):
+        with open(source, newline='', encoding=encoding) as f:
+            return read_csv(f, delimiter, names=names)
+    reader = csv.reader(source, delimiter=delimiter)
+    header = next(reader, None)
+    if header is None:
+        raise ValueError("CSV input is empty")
+    header = [field.strip() for field in header]
+    rows = list(reader)
+    columns = {}
+    for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS:
+        field = _field(name, names)
+        if field in header:
+            i = header.index(field)
+            columns[name] = _as_text([row[i] if i < len(row) else ''
+                                      for row in rows])
+    _check_columns(columns)
+    return columns
+
+
+def read_arrow(source, names=None):
+    """ Reads payment columns from Arrow table or Parquet file.
+
+    Numeric amount columns are kept numeric, other columns are converted
+    to strings and nulls become empty strings.
+
+    @type  source: L{pyarrow.Table} or string
+    @param source: Table or Parquet filename.
+    @type  names: dict
+    @param names: Column name to name in the table (optional).
+    @rtype: dict
+    @return: Column name to NumPy array.
+    @raise RuntimeError: If PyArrow is not installed.
+    @raise ValueError: If required columns are missing.
+    """
+    if pyarrow is None:
+        raise RuntimeError("PyArrow is needed for Arrow import.")
+    if not isinstance(source, pyarrow.Table):
+        source = pyarrow.parquet.read_table(source)
+    columns = {}
+    for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS:
+        field = _field(name, names)
+        if field not in source.column_names:
+            continue
+        column = source.column(field)
+        if name == 'amount' and (pyarrow.types.is_integer(column.type) or
+                                 pyarrow.types.is_floating(column.type)):
+            columns[name] = column.to_numpy()
+        else:
+            column = column.cast(pyarrow.string()).fill_null('')
+            columns[name] = _as_text(column.to_numpy(zero_copy_only=False))
+    _check_columns(columns)
+    return columns
+
+
+def check_payments(columns):
+    """ Normalizes and checks all payment rows.
+
+    IBANs lose their spaces, codes are uppercased and empty currencies get
+    L{DEFAULT_CURRENCY}. Every row is rejected on its first failing check.
+    EndToEndIds must be unique, so repeated ones are rejected after the
+    first row.
+
+    @type  columns: dict
+    @param columns: Column name to NumPy array, see L{read_csv}.
+    @rtype: tuple(dict, L{numpy.ndarray}, L{numpy.ndarray}, list)
+    @return: Normalized columns, mask of valid rows, amounts in cents and
+             (row, column, reason) of rejected rows.
+    @raise ValueError: If required columns are missing.
+    """
+    _check_columns(columns)
+    count = len(columns['end_to_end_id'])
+    cents, amount_valid = _amounts_to_cents(columns['amount'])
+    columns = dict((name, _as_text(columns[name]))
+                   for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+                   if name in columns and name != 'amount')
+    for name in OPTIONAL_COLUMNS:
+        columns.setdefault(name, numpy.zeros(count, dtype='U1'))
+    columns['iban'] = numpy.char.upper(
+                        numpy.char.replace(columns['iban'], ' ', ''))
+    for name in ('bic', 'currency', 'purpose', 'country'):
+        columns[name] = numpy.char.upper(columns[name])
+    columns['currency'] = numpy.where(columns['currency'] == '',
+                                      DEFAULT_CURRENCY, columns['currency'])
+
+    checks = []
+    for name, length in _MAX_LENGTHS:
+        lengths = numpy.char.str_len(columns[name])
+        valid = lengths <= length
+        if name in REQUIRED_COLUMNS:
+            valid &= lengths > 0
+            reason = "is missing or longer than {0} characters"
+        else:
+            reason = "is longer than {0} characters"
+        checks.append((name, reason.format(length), valid))
+    for name, length in _MAX_LENGTHS:
+        checks.append((name, "contains characters not allowed in XML",
+                       _xml_text_mask(columns[name])))
+    checks.append(('iban', "is not a valid IBAN",
+                   accountbatch.valid_iban_mask(columns['iban'])))
+    checks.append(('bic', "is not a valid BIC", _bic_mask(columns['bic'])))
+    checks.append(('amount', "is not between 0.01 and 999999999.99 with at "
+                   "most two decimals", amount_valid))
+    checks.append(('currency', "is not a currency code",
+                   _letters_mask(columns['currency'], 3)))
+    checks.append(('purpose', "is not one of " + ', '.join(PURPOSE_CODES),
+                   numpy.isin(columns['purpose'], PURPOSE_CODES + ('',))))
+    checks.append(('country', "is not a country code",
+                   _letters_mask(columns['country'], 2) |
+                   ((columns['country'] == '') & (columns['address'] == ''))))
+    checks.append(('end_to_end_id', "is repeated",
+                   _first_occurrences(columns['end_to_end_id'])))
+
+    # Index of the first failing check or -1 for valid rows
+    failed = numpy.full(count, -1, dtype=numpy.int32)
+    for number, (name, reason, valid) in enumerate(checks):
+        failed[(failed < 0) & ~valid] = number
+    rejected = [(int(row), checks[failed[row]][0], checks[failed[row]][1])
+                for row in numpy.flatnonzero(failed >= 0)]
+    return columns, failed < 0, cents, rejected
+
+
+def import_payments(writer, sepa, columns):
+    """ Writes valid payment rows as transactions of one PmtInf-block.
+
+    Rows are formatted to XML in chunks of L{CHUNK_ROWS} straight from the
+    columns. If the writer prevalidates transactions or registers them to
+    an index, L{CdtTrfTxInf} objects are built and added one at a time
+    instead.
+
+    @type  writer: L{C2BWriter}
+    @param writer: Open writer of the message.
+    @type  sepa: L{SEPA}
+    @param sepa: Payment whose header information is used. Nothing is
+                 written if no row is valid.
+    @type  columns: dict
+    @param columns: Column name to NumPy array, see L{read_csv} and
+                    L{read_arrow}.
+    @rtype: L{ImportReport}
+    @return: Counts and rejected rows.
+    @raise ValueError: If required columns are missing.
+    """
+    columns, valid, cents, rejected = check_payments(columns)
+    report = ImportReport(len(valid), rejected)
+    rows = numpy.flatnonzero(valid)
+    if not len(rows):
+        # PmtInf-block must contain at least one transaction
+        return report
+    writer.begin_payment(sepa)
+    if writer.index is None and not writer.prevalidate:
+        write = _write_serialized
+    else:
+        write = _write_objects
+    for start in range(0, len(rows), CHUNK_ROWS):
+        chunk = rows[start:start + CHUNK_ROWS]
+        amounts = cents[chunk].tolist()
+        write(writer, columns, chunk, amounts)
+        report.imported += len(amounts)
+        report.ctrl_sum_cents += sum(amounts)
+    writer.end_payment()
+    return report
+
+
+def _write_objects(writer, columns, rows, amounts):
+    """ Adds rows to writer as L{CdtTrfTxInf} objects. """
+    values = dict((name, columns[name][rows].tolist()) for name in columns)
+    for i, amount in enumerate(amounts):
+        address = values['address'][i]
+        receiver = Entity(values['name'][i], values['country'][i] or None,
+                          *([address] if address else []))
+        tx = c2bhelper.CdtTrfTxInf(receiver, values['purpose'][i] or None,
+                                   values['end_to_end_id'][i],
+                                   c2bhelper.format_cents(amount),
+                                   values['currency'][i], values['bic'][i],
+                                   values['iban'][i],
+                                   instr_id=values['instr_id'][i] or None,
+                                   ustrd=values['message'][i] or None)
+        writer.add_transaction(tx)
+
+
+def _write_serialized(writer, columns, rows, amounts):
+    """ Formats rows to CdtTrfTxInf-elements and writes them at once.
+
+    Elements have the same structure as the ones c2b._transaction_element
+    builds. Free text columns are escaped, codes are already checked.
+    """
+    codes = [columns[name][rows].tolist()
+             for name in ('iban', 'bic', 'currency', 'purpose', 'country')]
+    texts = [_escape(columns[name][rows]).tolist()
+             for name in ('end_to_end_id', 'name', 'instr_id', 'message',
+                          'address')]
+    parts = []
+    for (amount, iban, bic, currency, purpose, country, end_to_end_id, name,
+         instr_id, message, address) in zip(amounts, *(codes + texts)):
+        parts.append(_TRANSACTION_XML % (
+            instr_id and '<InstrId>' + instr_id + '</InstrId>',
+            end_to_end_id, currency, c2bhelper.format_cents(amount), bic,
+            name, address and _ADDRESS_XML % (address, country), iban,
+            purpose and '<Purp><Cd>' + purpose + '</Cd></Purp>',
+            message and '<RmtInf><Ustrd>' + message + '</Ustrd></RmtInf>'))
+    writer.add_serialized_transactions(''.join(parts).encode('utf-8'),
+                                       len(amounts), sum(amounts))
+
+
+def _field(name, names):
+    """ Gets name of column in input. """
+    if names is not None and name in names:
+        return names[name]
+    return name
+
+
+def _check_columns(columns):
+    """ Checks that required columns exist and all have the same length. """
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise ValueError("Missing columns: {0}".format(', '.join(missing)))
+    if len(set(len(values) for values in columns.values())) > 1:
+        raise ValueError("Columns have different lengths")
+
+
+def _as_text(values):
+    """ Converts values to stripped NumPy unicode array. """
+    if len(values) == 0:
+        return numpy.zeros(0, dtype='U1')
+    array = numpy.asarray(values)
+    if array.dtype.kind != 'U':
+        array = array.astype(str)
+    return numpy.char.strip(array)
+
+
+def _codes(array):
+    """ Gets code points of unicode array as int64 matrix, one row per value.
+
+    Values shorter than the array itemsize are padded with zeros.
+    """
+    array = numpy.ascontiguousarray(array)
+    codes = array.view(numpy.uint32).reshape(len(array), -1)
+    return codes.astype(numpy.int64)
+
+
+def _widen(codes, width):
+    """ Pads code matrix with zero columns to given width. """
+    if codes.shape[1] >= width:
+        return codes
+    return numpy.pad(codes, ((0, 0), (0, width - codes.shape[1])))
+
+
+def _letters_mask(array, length):
+    """ Gets mask of values that are length uppercase ASCII letters. """
+    codes = _widen(_codes(array), length)[:, :length]
+    return ((numpy.char.str_len(array) == length) &
+            ((codes >= 65) & (codes <= 90)).all(axis=1))
+
+
+def _bic_mask(bics):
+    """ Gets mask of BICs that match schema type BICIdentifier. """
+    codes = _widen(_codes(bics), 11)
+    lengths = numpy.char.str_len(bics)
+    digit = (codes >= 48) & (codes <= 57)
+    upper = (codes >= 65) & (codes <= 90)
+    location = codes[:, 7]
+    return (((lengths == 8) | (lengths == 11)) & upper[:, :6].all(axis=1) &
+            (upper[:, 6] | ((codes[:, 6] >= 50) & (codes[:, 6] <= 57))) &
+            ((upper[:, 7] & (location != 79)) | digit[:, 7]) &
+            ((lengths == 8) | (upper | digit)[:, 8:11].all(axis=1)))
+
+
+def _amounts_to_cents(values):
+    """ Converts amounts in euros to integer cents.
+
+    Strings are parsed digit by digit for all values at once. Spaces are
+    allowed as thousands separators.
+
+    @rtype: tuple(L{numpy.ndarray}, L{numpy.ndarray})
+    @return: int64 cents and mask of valid amounts.
+    """
+    values = numpy.asarray(values)
+    if values.dtype.kind in 'iu':
+        valid = (values >= 0) & (values <= c2bhelper.MAX_AMOUNT_CENTS // 100)
+        cents = numpy.where(valid, values, 0).astype(numpy.int64) * 100
+    elif values.dtype.kind == 'f':
+        scaled = values * 100
+        rounded = numpy.rint(scaled)
+        valid = (numpy.isfinite(scaled) & (numpy.abs(scaled - rounded) < 1e-3)
+                 & (rounded <= c2bhelper.MAX_AMOUNT_CENTS))
+        cents = numpy.where(valid, rounded, 0).astype(numpy.int64)
+    else:
+        text = numpy.char.replace(numpy.char.replace(_as_text(values),
+                                                     ' ', ''), ',', '.')
+        codes = _codes(text)
+        lengths = numpy.char.str_len(text)
+        count, width = codes.shape
+        inside = numpy.arange(width) < lengths[:, None]
+        digit = (codes >= 48) & (codes <= 57) & inside
+        dot = codes == 46
+        dots = dot.sum(axis=1)
+        decimals = numpy.where(dots > 0, lengths - dot.argmax(axis=1) - 1, 0)
+        digits = digit.sum(axis=1)
+        valid = ((digits > 0) & (digits <= _MAX_AMOUNT_DIGITS) & (dots <= 1) &
+                 (digit | dot | ~inside).all(axis=1))
+        number = numpy.zeros(count, dtype=numpy.int64)
+        for column in range(width):
+            use = digit[:, column] & valid
+            number = numpy.where(use, number * 10 + codes[:, column] - 48,
+                                 number)
+        # Decimals after the second one must be zeros, e.g. '1.500'
+        powers = 10 ** numpy.arange(_MAX_AMOUNT_DIGITS + 1, dtype=numpy.int64)
+        extra = powers[numpy.where(valid, numpy.maximum(decimals - 2, 0), 0)]
+        valid &= number % extra == 0
+        cents = numpy.where(decimals <= 2,
+                            number * powers[numpy.clip(2 - decimals, 0, 2)],
+                            number // extra)
+    valid &= (cents > 0) & (cents <= c2bhelper.MAX_AMOUNT_CENTS)
+    return numpy.where(valid, cents, 0), valid
+
+
+def _first_occurrences(values):
+    """ Gets mask that is False for values already seen on earlier rows. """
+    first = numpy.zeros(len(values), dtype=bool)
+    if len(values):
+        first[numpy.unique(values, return_index=True)[1]] = True
+    return first
+
+
+def _escape(array):
+    """ Escapes &, < and > of unicode array for XML text. """
+    if not len(array):
+        return array
+    # numpy.char.replace keeps the fixed width of the array, so make room
+    # for values made of nothing but '&'.
+    width = array.dtype.itemsize // numpy.dtype('U1').itemsize
+    array = array.astype('U{0}'.format(5 * max(1, width)))
+    for character, entity in (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;')):
+        array = numpy.char.replace(array, character, entity)
+    return array
+
+
+def _xml_text_mask(array):
+    """ Gets mask of values without control characters that XML forbids. """
+    codes = _codes(array)
+    inside = numpy.arange(codes.shape[1]) < numpy.char.str_len(array)[:, None]
+    control = ((codes < 32) & (codes != 9) & (codes != 10) & (codes != 13) &
+               inside)
+    return ~control.any(axis=1)
@@ -23,8 +23,10 @@ import errno
 from lxml import etree
 
 try:
+    from bankws import metrics
     from bankws.signature import validate
 except ImportError:
+    import metrics
     from signature import validate
 
 
@@ -76,6 +78,7 @@ class CertificateResponse():
         # Check signature
         if not validate(message):
             self.logger.error("Invalid signature")
+            metrics.SIGNATURE_FAILURES.inc(document='CertApplicationResponse')
             raise ValueError('Failed to verify signature')
 
         tree = etree.fromstring(message)
@@ -13,12 +13,19 @@ external libraries::
 import datetime
 import os
 import logging
-import urllib
-from urllib import request
+import threading
+import urllib.error
 
-from OpenSSL import crypto
+try:
+    from bankws import metrics
+except ImportError:
+    import metrics
 
 log = logging.getLogger("bankws")
+CRL_FILE = os.path.join('resources', 'OP-Pohjola-ws.crl')
+""" Revocation list, relative to the working directory. """
+_crl_cache = {}
+_crl_lock = threading.Lock()
 
 
 def check_revocation_status(certificate):
@@ -30,11 +37,35 @@ def check_revocation_status(certificate):
     @rtype: boolean
     @return: Have asked certificate been revocated.
     """
+    from OpenSSL import crypto
+
+    revoked = revoked_serials()
+    if revoked is None:
+        # Unable to test against anything
+        return False
+    try:
+        certificate = crypto.load_certificate(crypto.FILETYPE_ASN1,
+                                              certificate)
+    except crypto.Error:
+        raise ValueError("Unable to load certificate")
+
+    return certificate.get_serial_number() in revoked
+
+
+def revoked_serials():
+    """
+    Gets serial numbers of revoked certificates. The revocation list is
+    downloaded when it is missing or older than a day and parsed again only
+    when the file changes.
+
+    @rtype: frozenset<int>
+    @return: Revoked serial numbers or None if there is no revocation list.
+    """
     # Check if crl file exists
     renew = False
 
-    if os.path.isfile('resources/OP-Pohjola-ws.crl'):
-        modified = os.path.getmtime('resources/OP-Pohjola-ws.crl')
+    if os.path.isfile(CRL_FILE) and os.path.getsize(CRL_FILE) > 0:
+        modified = os.path.getmtime(CRL_FILE)
         modify_time = datetime.datetime.fromtimestamp(modified)
         difference = datetime.datetime.today() - modify_time
         if difference.days > 0:
@@ -45,54 +76,84 @@ def check_revocation_status(certificate):
     if renew:
         url = "http://wsk.op.fi/crl/ws/OP-Pohjola-ws.crl"
         try:
-            with open('resources/OP-Pohjola-ws.crl', 'wb') as f:
-                r = request.urlopen(url).read()
-                f.write(r)
+            _download_crl(url)
+            metrics.CRL_REFRESHES.inc(result='ok')
         except urllib.error.URLError as e:
+            metrics.CRL_REFRESHES.inc(result='failed')
             log.error(e)
             print("Unable to update/download new certificate revocation list.")
-            if not os.path.exists('resources/OP-Pohjola-ws.crl'):
-                # Unable to test against anything
-                return False
-
+            if not os.path.exists(CRL_FILE):
+                return None
         except EnvironmentError as e:
-            if not os.path.exists("resources"):
-                try:
-                    os.mkdir("resources")
-                except OSError as e:
-                    log.error(e)
-                    log.error("Unable to create directory for revocation"
-                              " list.")
-                    log.error("This means that certificate bank is using"
-                              "won't be checked.")
-                    return False
-                else:
-                    try:
-                        with open('resources/OP-Pohjola-ws.crl', 'wb') as f:
-                            r = request.urlopen(url).read()
-                            f.write(r)
-                    except EnvironmentError as e:
-                        log.error(e)
-                        log.error("Unable to crl to disk.")
-                        log.error("This means that certificate that bank is"
-                                  " using won't be checked.")
-                        return False
-
-    with open('resources/OP-Pohjola-ws.crl', 'rb') as f:
-        crl = f.read()
-    op_crl = crypto.load_crl(crypto.FILETYPE_ASN1, crl)
-    revoked = op_crl.get_revoked()
+            metrics.CRL_REFRESHES.inc(result='failed')
+            log.error(e)
+            log.error("Unable to store new certificate revocation list.")
+            log.error("This means that certificate that bank is"
+                      " using won't be checked.")
+            if not os.path.exists(CRL_FILE):
+                return None
+
+    return _crl_index(os.path.abspath(CRL_FILE))
+
+
+def _download_crl(url):
+    """ Downloads CRL to a temporary file and moves it over CRL_FILE only
+    when the download is complete and parses, so a failure leaves the
+    previous list in place.
+
+    @raise EnvironmentError: If downloading or writing fails or the
+                             download is not a revocation list.
+    """
+    import tempfile
+    from urllib import request
+    from OpenSSL import crypto
+
+    directory = os.path.dirname(CRL_FILE) or os.curdir
+    if not os.path.isdir(directory):
+        os.mkdir(directory)
+    data = request.urlopen(url).read()
     try:
-        certificate = crypto.load_certificate(crypto.FILETYPE_ASN1,
-                                              certificate)
-    except crypto.Error:
-        raise ValueError("Unable to load certificate")
+        crypto.load_crl(crypto.FILETYPE_ASN1, data)
+    except crypto.Error as e:
+        raise IOError("Invalid certificate revocation list: {0}".format(e))
+    fd, temporary = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, CRL_FILE)
+    except BaseException:
+        os.remove(temporary)
+        raise
 
-    sn = certificate.get_serial_number()
-    for cert in revoked:
-        if cert.get_serial() == sn:
-            return True
-    return False
+
+def _crl_index(path):
+    """ Gets revoked serial numbers of CRL file, cached by modification. """
+    from OpenSSL import crypto
+
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        log.error(e)
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _crl_lock:
+        cached = _crl_cache.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        try:
+            with open(path, 'rb') as f:
+                crl = f.read()
+            op_crl = crypto.load_crl(crypto.FILETYPE_ASN1, crl)
+        except (EnvironmentError, crypto.Error) as e:
+            log.error("Unable to read certificate revocation list {0}: "
+                      "{1}".format(path, e))
+            return None
+        # get_revoked() gives None for an empty list and get_serial()
+        # hexadecimal bytes.
+        revoked = frozenset(int(cert.get_serial(), 16)
+                            for cert in op_crl.get_revoked() or ())
+        _crl_cache[path] = (version, revoked)
+        return revoked
 
 
 def check_renewable_status(certificate):
@@ -106,6 +167,8 @@ def check_renewable_status(certificate):
     @raise EnvironmentError: if file is not found.
     @raise RuntimeError: If certificate is expired.
     """
+    from OpenSSL import crypto
+
     cert = ""
     try:
         with open(certificate, 'rb') as f:
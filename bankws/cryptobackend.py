@@ -0,0 +1,261 @@
+'''Cryptobackend module makes the RSA signatures of XML signatures.
+
+Two backends are available:
+    - cryptography: OpenSSL through the cryptography library. Digests are
+      calculated with hashlib and signed and verified prehashed.
+    - pycrypto: PyCrypto (or PyCryptodome) for signing and PyOpenSSL for
+      verifying, as bankws has always done.
+The default is cryptography when it is installed, pycrypto otherwise.
+
+Algorithms are named like in hashlib, 'sha1' and 'sha256'. XML signature
+algorithm URIs map to them with SIGNATURE_METHODS and DIGEST_METHODS.
+
+Usage:
+    >>> set_backend('pycrypto')
+    >>> backend = get_backend()
+    >>> key = backend.load_private_key(pem)
+    >>> signature = backend.sign(key, data, 'sha256')
+    >>> backend.verify(der_certificate, signature, data, 'sha256')
+    True
+'''
+import hashlib
+import threading
+
+RSA_SHA1 = 'http://www.w3.org/2000/09/xmldsig#rsa-sha1'
+RSA_SHA256 = 'http://www.w3.org/2001/04/xmldsig-more#rsa-sha256'
+SHA1 = 'http://www.w3.org/2000/09/xmldsig#sha1'
+SHA256 = 'http://www.w3.org/2001/04/xmlenc#sha256'
+
+SIGNATURE_METHODS = {RSA_SHA1: 'sha1', RSA_SHA256: 'sha256'}
+""" SignatureMethod URIs by algorithm. """
+DIGEST_METHODS = {SHA1: 'sha1', SHA256: 'sha256'}
+""" DigestMethod URIs by algorithm. """
+SIGNATURE_URIS = dict((name, uri) for uri, name in SIGNATURE_METHODS.items())
+DIGEST_URIS = dict((name, uri) for uri, name in DIGEST_METHODS.items())
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _check_algorithm(algorithm):
+    if algorithm not in DIGEST_URIS:
+        raise ValueError("Unsupported algorithm {0}".format(algorithm))
+
+
+class Backend():
+    """ Backend signs and verifies PKCS#1 v1.5 RSA signatures.
+
+    @type name: string
+    @ivar name: Name of the backend for L{set_backend}.
+    """
+    name = None
+
+    def load_private_key(self, data):
+        """ Imports RSA private key.
+
+        @type  data: bytes
+        @param data: PEM or DER key.
+        @raise ValueError: If the key is not a supported RSA key.
+        """
+        raise NotImplementedError
+
+    def sign(self, key, data, algorithm='sha1'):
+        """ Signs data.
+
+        @type  key: object
+        @param key: Key from L{load_private_key}.
+        @type  data: bytes
+        @param data: Signed data, e.g. canonicalized SignedInfo.
+        @type  algorithm: string
+        @param algorithm: sha1 or sha256
+        @rtype: bytes
+        @raise ValueError: If algorithm is not supported.
+        """
+        raise NotImplementedError
+
+    def verify(self, certificate, signature, data, algorithm='sha1'):
+        """ Verifies signature of data.
+
+        @type  certificate: bytes
+        @param certificate: DER certificate of the signer.
+        @type  signature: bytes
+        @param signature: Signature value.
+        @type  data: bytes
+        @param data: Signed data.
+        @type  algorithm: string
+        @param algorithm: sha1 or sha256
+        @rtype: boolean
+        @return: Is the signature valid.
+        @raise ValueError: If algorithm is not supported or certificate can't
+                           be loaded.
+        """
+        raise NotImplementedError
+
+
+class CryptographyBackend(Backend):
+    """ Backend on the cryptography library. """
+    name = 'cryptography'
+
+    def __init__(self):
+        from cryptography import x509
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import padding, rsa
+        from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+
+        self._x509 = x509
+        self._invalid = InvalidSignature
+        self._serialization = serialization
+        self._rsa = rsa
+        self._padding = padding.PKCS1v15()
+        self._prehashed = {'sha1': Prehashed(hashes.SHA1()),
+                           'sha256': Prehashed(hashes.SHA256())}
+        self._public_keys = {}
+        self._lock = threading.Lock()
+
+    def load_private_key(self, data):
+        try:
+            if data.lstrip().startswith(b'-----'):
+                key = self._serialization.load_pem_private_key(data, None)
+            else:
+                key = self._serialization.load_der_private_key(data, None)
+        except (TypeError, ValueError) as e:
+            raise ValueError("Unable to import key: {0}".format(e))
+        if not isinstance(key, self._rsa.RSAPrivateKey):
+            raise ValueError("Key is not an RSA key")
+        return key
+
+    def sign(self, key, data, algorithm='sha1'):
+        _check_algorithm(algorithm)
+        return self.sign_digest(key, hashlib.new(algorithm, data).digest(),
+                                algorithm)
+
+    def sign_digest(self, key, digest, algorithm='sha1'):
+        """ Signs digest calculated by the caller.
+
+        @type  digest: bytes
+        @param digest: Digest of the signed data.
+        @rtype: bytes
+        """
+        _check_algorithm(algorithm)
+        return key.sign(digest, self._padding, self._prehashed[algorithm])
+
+    def _public_key(self, certificate):
+        """ Gets public key of DER certificate, cached for the few
+        certificates banks use. """
+        with self._lock:
+            key = self._public_keys.get(certificate)
+        if key is None:
+            try:
+                key = self._x509.load_der_x509_certificate(
+                                    certificate).public_key()
+            except ValueError as e:
+                raise ValueError("Unable to load certificate: {0}".format(e))
+            with self._lock:
+                if len(self._public_keys) >= 32:
+                    self._public_keys.clear()
+                self._public_keys[certificate] = key
+        return key
+
+    def verify(self, certificate, signature, data, algorithm='sha1'):
+        _check_algorithm(algorithm)
+        return self.verify_digest(certificate, signature,
+                                  hashlib.new(algorithm, data).digest(),
+                                  algorithm)
+
+    def verify_digest(self, certificate, signature, digest, algorithm='sha1'):
+        """ Verifies signature of digest calculated by the caller.
+
+        @type  digest: bytes
+        @param digest: Digest of the signed data.
+        @rtype: boolean
+        """
+        _check_algorithm(algorithm)
+        key = self._public_key(certificate)
+        if not isinstance(key, self._rsa.RSAPublicKey):
+            raise ValueError("Certificate doesn't have an RSA key")
+        try:
+            key.verify(signature, digest, self._padding,
+                       self._prehashed[algorithm])
+        except self._invalid:
+            return False
+        return True
+
+
+class PyCryptoBackend(Backend):
+    """ Backend signing with PyCrypto and verifying with PyOpenSSL. """
+    name = 'pycrypto'
+
+    def __init__(self):
+        import Crypto.PublicKey.RSA as RSA
+        import Crypto.Hash.SHA as SHA
+        import Crypto.Hash.SHA256 as SHA256
+        from Crypto.Signature import PKCS1_v1_5
+        from OpenSSL import crypto
+
+        self._rsa = RSA
+        self._hashes = {'sha1': SHA, 'sha256': SHA256}
+        self._pkcs1 = PKCS1_v1_5
+        self._crypto = crypto
+
+    def load_private_key(self, data):
+        return self._rsa.importKey(data)
+
+    def sign(self, key, data, algorithm='sha1'):
+        _check_algorithm(algorithm)
+        return self._pkcs1.new(key).sign(self._hashes[algorithm].new(data))
+
+    def verify(self, certificate, signature, data, algorithm='sha1'):
+        _check_algorithm(algorithm)
+        crypto = self._crypto
+        try:
+            certificate = crypto.load_certificate(crypto.FILETYPE_ASN1,
+                                                  certificate)
+        except crypto.Error as e:
+            raise ValueError("Unable to load certificate: {0}".format(e))
+        try:
+            crypto.verify(certificate, signature, data, algorithm)
+        except crypto.Error:
+            return False
+        return True
+
+
+BACKENDS = {CryptographyBackend.name: CryptographyBackend,
+            PyCryptoBackend.name: PyCryptoBackend}
+""" Backend classes by name. """
+
+
+def get_backend():
+    """ Gets backend in use, made on first use.
+
+    @rtype: L{Backend}
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            try:
+                _backend = CryptographyBackend()
+            except ImportError:
+                _backend = PyCryptoBackend()
+        return _backend
+
+
+def set_backend(backend):
+    """ Sets backend used by bankws.
+
+    @type  backend: string or L{Backend}
+    @param backend: Name in L{BACKENDS} or backend object.
+    @rtype: L{Backend}
+    @return: The backend.
+    @raise ValueError: If there is no backend of the name.
+    @raise ImportError: If the library of the backend is not installed.
+    """
+    global _backend
+    if not isinstance(backend, Backend):
+        try:
+            backend = BACKENDS[backend]()
+        except KeyError:
+            raise ValueError("Unknown crypto backend {0}".format(backend))
+    with _backend_lock:
+        _backend = backend
+    return backend
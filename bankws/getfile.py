@@ -17,11 +17,11 @@ from lxml import etree
 try:
     from bankws.request import Request
     from bankws import timehelper
-    from bankws import signature
+    from bankws import instrumentation
 except ImportError:
     from request import Request
     import timehelper
-    import signature
+    import instrumentation
 
 
 E = ElementMaker(namespace="http://bxd.fi/xmldata/",
@@ -95,24 +95,25 @@ class GetFile(Request):
         """
         # Generate document.
         # Startdate should be optional but OP example used it.
-        if start_date is None:
-            startdate = str(date.today())
-        else:
-            startdate = str(start_date)
-
-        get_file = \
-            DOC(
-                CUSTOMERID(self._id),
-                COMMAND("DownloadFile"),  # Mandatory for NORDEA
-                TIMESTAMP(timehelper.get_timestamp()),
-                STARTDATE(startdate),
-                ENVIRONMENT(self._environment),
-                FILEREFERENCES(
-                    FILEREFERENCE(reference)
-                ),
-                COMPRESSION(self.compression),
-                SOFTWAREID(self.software),
-                )
-        # Sign document
-        message = str(etree.tostring(get_file), 'utf-8')
-        self.text = signature.sign(message, self.key, self.certificate)
+        with instrumentation.stage('build_request') as event:
+            if start_date is None:
+                startdate = str(date.today())
+            else:
+                startdate = str(start_date)
+
+            get_file = \
+                DOC(
+                    CUSTOMERID(self._id),
+                    COMMAND("DownloadFile"),  # Mandatory for NORDEA
+                    TIMESTAMP(timehelper.get_timestamp()),
+                    STARTDATE(startdate),
+                    ENVIRONMENT(self._environment),
+                    FILEREFERENCES(
+                        FILEREFERENCE(reference)
+                    ),
+                    COMPRESSION(self.compression),
+                    SOFTWAREID(self.software),
+                    )
+            message = str(etree.tostring(get_file), 'utf-8')
+            event.size_out = len(message)
+        self._sign(message)
@@ -15,11 +15,11 @@ from lxml import etree
 try:
     from bankws.request import Request
     from bankws import timehelper
-    from bankws import signature
+    from bankws import instrumentation
 except ImportError:
     from request import Request
     import timehelper
-    import signature
+    import instrumentation
 
 
 E = ElementMaker(namespace="http://bxd.fi/xmldata/",
@@ -103,29 +103,30 @@ class GetFileList(Request):
         @raise ValueError: If key is in unsupported format.
         """
         # Generate document.
-        get_file_list = \
-            DOC(
-                CUSTOMERID(self._id),
-                COMMAND("DownloadFileList"),  # Mandatory for NORDEA
-                TIMESTAMP(timehelper.get_timestamp()),
-                )
+        with instrumentation.stage('build_request') as event:
+            get_file_list = \
+                DOC(
+                    CUSTOMERID(self._id),
+                    COMMAND("DownloadFileList"),  # Mandatory for NORDEA
+                    TIMESTAMP(timehelper.get_timestamp()),
+                    )
 
-        if start_date is not None:
-            get_file_list.append(STARTDATE(str(start_date)))
-        if end_date is not None:
-            get_file_list.append(ENDDATE(str(end_date)))
+            if start_date is not None:
+                get_file_list.append(STARTDATE(str(start_date)))
+            if end_date is not None:
+                get_file_list.append(ENDDATE(str(end_date)))
 
-        get_file_list.append(STATUS(status))
-        get_file_list.append(ENVIRONMENT(self._environment))
+            get_file_list.append(STATUS(status))
+            get_file_list.append(ENVIRONMENT(self._environment))
 
-        if self.targetid is not None:
-            get_file_list.append(TARGET(self.targetid))
+            if self.targetid is not None:
+                get_file_list.append(TARGET(self.targetid))
 
-        get_file_list.append(SOFTWAREID(self.software))
+            get_file_list.append(SOFTWAREID(self.software))
 
-        if self.filetype is not None:
-            get_file_list.append(FILETYPE(self.filetype))
+            if self.filetype is not None:
+                get_file_list.append(FILETYPE(self.filetype))
 
-        # Sign document
-        message = str(etree.tostring(get_file_list), 'utf-8')
-        self.text = signature.sign(message, self.key, self.certificate)
+            message = str(etree.tostring(get_file_list), 'utf-8')
+            event.size_out = len(message)
+        self._sign(message)
@@ -8,12 +8,28 @@ To get new request id:
     >>> obj.next_value()
 Before quitting save object back to file:
     >> idhandler.save_object()
+Or do both at once (safe to call from several threads):
+    >>> idhandler.next_request_id()
 '''
 import pickle
 import os
 import logging
+import threading
 from datetime import date
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+
+try:
+    from bankws import metrics
+except ImportError:
+    import metrics
+
 log = logging.getLogger("bankws")
+_lock = threading.Lock()
 
 
 class __RequestId:
@@ -51,6 +67,47 @@ def get_object():
     return obj
 
 
+def next_request_id():
+    """ Gets next request id and saves the object back to file.
+
+    Loading, incrementing and saving are done under a lock so concurrent
+    requests of one process get unique ids. Where fcntl is available the
+    file is also locked, so forked worker processes sharing the file don't
+    read it half written.
+
+    @rtype: string
+    @return: Request id
+    """
+    with _lock:
+        lockfile = _lock_file()
+        try:
+            obj = get_object()
+            value = obj.next_value()
+            save_object(obj)
+        finally:
+            if lockfile is not None:
+                lockfile.close()
+    metrics.REQUEST_ID_SEQUENCE.set(int(value[8:]))
+    return value
+
+
+def _lock_file():
+    """ Locks request id file against other processes.
+
+    @rtype: file
+    @return: Open lock file, closing it releases the lock, or None if
+             the file can't be locked.
+    """
+    if fcntl is None:
+        return None
+    try:
+        lockfile = open('resources/requestid.lock', 'a')
+    except EnvironmentError:
+        return None
+    fcntl.flock(lockfile, fcntl.LOCK_EX)
+    return lockfile
+
+
 def save_object(obj):
     """ Saves object back to file
 
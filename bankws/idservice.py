@@ -40,7 +40,7 @@ except ImportError:
 
 class OPCertificateRequest():
 
-    def __init__(self, sender_id, mode='TEST'):
+    def __init__(self, sender_id, mode='TEST', url=None):
         """
         @type  sender_id: integer
         @param sender_id: ID given by Osuuspankki.
@@ -48,6 +48,9 @@ class OPCertificateRequest():
         @param certificate_request: Name of Certificate request file.
         @type  mode: string
         @param mode: TEST or PRODUCTION
+        @type  url: string
+        @param url: WSDL url of the service, overrides the url of mode
+                    (e.g. L{MockBank}).
         @raises ValueError: If mode is not TEST or PRODUCTION
         """
         self.log = logging.getLogger('bankws')
@@ -57,10 +60,12 @@ class OPCertificateRequest():
             error = "Unsupported environment value."
             raise ValueError(error)
 
-        if env == 'TEST':
-            url = 'https://wsk.asiakastesti.op.fi/wsdl/MaksuliikeCertService.xml'
-        else:
-            url = 'https://wsk.op.fi/wsdl/MaksuliikeCertService.xml'
+        if url is None:
+            if env == 'TEST':
+                url = ('https://wsk.asiakastesti.op.fi/wsdl/'
+                       'MaksuliikeCertService.xml')
+            else:
+                url = 'https://wsk.op.fi/wsdl/MaksuliikeCertService.xml'
 
         # Create new soap client using validating secure transport layer
         self.client = client.Client(url,
@@ -0,0 +1,244 @@
+'''Instrumentation module times the stages of web service operations.
+
+Every L{WebService} operation is split to stages: building and signing the
+ApplicationRequest, generating the request header, signing the SOAP
+envelope, HTTP, verifying the envelope, base64 decoding, schema and
+signature validation and parsing of the response. Instruments given to
+WebService get a start and an end event of every operation and stage, with
+durations and sizes in bytes.
+
+Stages are reported with the module level L{stage} function by the code
+that does the work. It does nothing unless an operation is active in the
+current thread, so the same code runs uninstrumented outside WebService.
+
+Usage:
+    >>> recorder = Recorder()
+    >>> ws = WebService(sender_id, key, certificate, bank,
+                        instruments=[recorder])
+    >>> ws.download_file(reference)
+    >>> for (operation, stage), seconds in recorder.totals().items():
+            print(operation, stage, seconds)
+
+Own instruments override L{Instrument.start} and L{Instrument.end}.
+'''
+import functools
+import threading
+import time
+
+STAGES = ('build_request', 'sign_request', 'request_header', 'sign_envelope',
+          'http', 'verify_envelope', 'decode', 'schema_validation',
+          'signature_validation', 'parse', 'parse_statement')
+""" Stages reported by bankws, in the order they happen. parse_statement is
+only in transaction_query. """
+
+_active = threading.local()
+
+
+class StageEvent():
+    """ StageEvent describes one operation or stage.
+
+    The same object is passed to L{Instrument.start} and L{Instrument.end}.
+
+    @type operation: string
+    @ivar operation: Name of WebService operation, e.g. upload_file.
+    @type stage: string
+    @ivar stage: Name of the stage, None for the whole operation.
+    @type start: float
+    @ivar start: time.perf_counter() at start.
+    @type duration: float
+    @ivar duration: Seconds, None until the end.
+    @type size_in: int
+    @ivar size_in: Bytes given to the stage, None if not known.
+    @type size_out: int
+    @ivar size_out: Bytes produced by the stage, None if not known.
+    @type error: string
+    @ivar error: Name of the exception that ended the stage or None.
+    """
+    def __init__(self, operation, stage, size_in=None, size_out=None):
+        self.operation = operation
+        self.stage = stage
+        self.size_in = size_in
+        self.size_out = size_out
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+    def __str__(self):
+        return "{0} {1}: {2:.6f} s, {3} -> {4} bytes{5}".format(
+                    self.operation, self.stage or '(total)',
+                    self.duration or 0.0, self.size_in, self.size_out,
+                    ', ' + self.error if self.error else '')
+
+
+class Instrument():
+    """ Instrument is the base class of instruments. Methods do nothing.
+
+    Methods are called in the thread that runs the operation, so an
+    instrument shared by threads has to be thread safe.
+    """
+    def start(self, event):
+        """ Called when an operation or stage starts.
+
+        @type  event: L{StageEvent}
+        @param event: Event, duration is None.
+        """
+
+    def end(self, event):
+        """ Called when an operation or stage ends.
+
+        @type  event: L{StageEvent}
+        @param event: Event with duration and sizes.
+        """
+
+
+class Recorder(Instrument):
+    """ Recorder keeps ended events.
+
+    @type events: list<L{StageEvent}>
+    @ivar events: Ended events in order.
+    """
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def end(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def totals(self):
+        """ Sums durations.
+
+        @rtype: dict
+        @return: (operation, stage) to seconds. Stage is None for the
+                 whole operations.
+        """
+        totals = {}
+        with self._lock:
+            for event in self.events:
+                key = (event.operation, event.stage)
+                totals[key] = totals.get(key, 0.0) + event.duration
+        return totals
+
+
+class _NullEvent():
+    """ Event of stages run outside operations, attributes are ignored. """
+    size_in = None
+    size_out = None
+
+    def __setattr__(self, name, value):
+        pass
+
+
+class _NullStage():
+    _event = _NullEvent()
+
+    def __enter__(self):
+        return self._event
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage():
+    """ Context manager that reports a stage or operation. """
+    def __init__(self, instruments, event):
+        self._instruments = instruments
+        self._event = event
+
+    def __enter__(self):
+        for instrument in self._instruments:
+            instrument.start(self._event)
+        return self._event
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        event = self._event
+        event.duration = time.perf_counter() - event.start
+        if exc_type is not None:
+            event.error = exc_type.__name__
+        for instrument in self._instruments:
+            instrument.end(event)
+        return False
+
+
+class _Operation(_Stage):
+    """ Context manager that makes an operation active in this thread. """
+    def __enter__(self):
+        _active.operation = self
+        return _Stage.__enter__(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _active.operation = None
+        return _Stage.__exit__(self, exc_type, exc_value, traceback)
+
+
+def operation(instruments, name):
+    """ Gets context manager for a WebService operation.
+
+    Inside an already active operation the stages are reported to the
+    outer one, e.g. upload_file inside transaction_query.
+
+    @type  instruments: list<L{Instrument}>
+    @param instruments: Receivers of the events.
+    @type  name: string
+    @param name: Name of the operation.
+    @rtype: context manager
+    @return: Context manager giving the L{StageEvent} of the operation.
+    """
+    if not instruments or getattr(_active, 'operation', None) is not None:
+        return _NULL_STAGE
+    return _Operation(list(instruments), StageEvent(name, None))
+
+
+def stage(name, size_in=None, size_out=None):
+    """ Gets context manager for a stage of the active operation.
+
+    Set size_out (or size_in) of the given event inside the block when it
+    is known only after the work.
+
+    @type  name: string
+    @param name: Name of the stage, see L{STAGES}.
+    @type  size_in: int
+    @param size_in: Bytes given to the stage.
+    @type  size_out: int
+    @param size_out: Bytes produced by the stage.
+    @rtype: context manager
+    @return: Context manager giving a L{StageEvent}. Outside operations it
+             does nothing.
+    """
+    current = getattr(_active, 'operation', None)
+    if current is None:
+        return _NULL_STAGE
+    return _Stage(current._instruments,
+                  StageEvent(current._event.operation, name, size_in,
+                             size_out))
+
+
+def report(events):
+    """ Reports stages that ended earlier, outside the active operation,
+    e.g. of a request built ahead, as stages of the active operation.
+
+    @type  events: list<L{StageEvent}>
+    @param events: Ended stage events, e.g. from a L{Recorder}.
+    """
+    current = getattr(_active, 'operation', None)
+    if current is None:
+        return
+    for event in events:
+        event.operation = current._event.operation
+        for instrument in current._instruments:
+            instrument.start(event)
+            instrument.end(event)
+
+
+def instrumented(name):
+    """ Decorates method of an object with instruments attribute to run as
+    an operation. """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with operation(self.instruments, name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
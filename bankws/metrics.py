@@ -0,0 +1,319 @@
+'''Metrics module keeps process wide counters, gauges and histograms of
+bankws and exports them in the Prometheus text format.
+
+Counters are updated by the modules doing the work whether or not anybody
+reads them: ResponseCodes of response headers, bytes sent and received,
+signature failures, CRL refreshes, schema cache hits, HTTP requests in
+flight and the last request id sequence number. Operations are counted and
+durations of operations and stages observed only by L{MetricsInstrument}
+given to WebService.
+
+Usage:
+    >>> ws = WebService(sender_id, key, certificate, bank,
+                        instruments=[MetricsInstrument()])
+Pull endpoint at http://host:9464/metrics:
+    >>> server = start_http_server(9464)
+Or for the textfile collector of node exporter, e.g. after every batch:
+    >>> write_textfile('/var/lib/node_exporter/bankws.prom')
+'''
+import math
+import os
+import threading
+
+try:
+    from bankws import instrumentation
+except ImportError:
+    import instrumentation
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1.0, 2.5, 5.0, 10.0, 30.0)
+""" Upper bounds of duration histograms in seconds. """
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"'))
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = ['{0}="{1}"'.format(name, _escape(value))
+             for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append('{0}="{1}"'.format(*extra))
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric():
+    """ Base class of metrics, values are kept per label values.
+
+    @type name: string
+    @ivar name: Metric name, e.g. bankws_operations_total.
+    @type documentation: string
+    @ivar documentation: HELP text.
+    @type labelnames: tuple<string>
+    @ivar labelnames: Names of labels.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), register=True):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if register:
+            with _registry_lock:
+                _registry.append(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError("{0} has labels {1}".format(
+                             self.name, ', '.join(self.labelnames)))
+        try:
+            return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError as e:
+            raise ValueError("{0} has no label {1}".format(self.name, e))
+
+    def get(self, **labels):
+        """ Gets current value of labels, 0 if it hasn't been set. """
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def clear(self):
+        """ Removes all values. """
+        with self._lock:
+            self._values.clear()
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name + _format_labels(self.labelnames, key), value
+
+    def expose(self):
+        """ Gets metric in Prometheus text format.
+
+        @rtype: string
+        """
+        lines = ['# HELP {0} {1}'.format(self.name,
+                                         self.documentation.replace('\n',
+                                                                    ' ')),
+                 '# TYPE {0} {1}'.format(self.name, self.kind)]
+        for sample, value in self._samples():
+            lines.append('{0} {1}'.format(sample, _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(_Metric):
+    """ Counter only increases. """
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """ Adds amount to the value of labels.
+
+        @raise ValueError: If amount is negative or labels are wrong.
+        """
+        if amount < 0:
+            raise ValueError("Counter can't decrease")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """ Gauge is a value that goes up and down. """
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """ Histogram counts observations to buckets.
+
+    @type buckets: tuple<float>
+    @ivar buckets: Upper bounds of buckets, +Inf is added.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DURATION_BUCKETS, register=True):
+        _Metric.__init__(self, name, documentation, labelnames, register)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Counts per bucket, sum
+                state = self._values[key] = [[0] * len(self.buckets), 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+
+    def get(self, **labels):
+        """ Gets (count, sum) of labels. """
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if state is None:
+                return (0, 0.0)
+            return (sum(state[0]), state[1])
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1]))
+                           for key, state in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield (self.name + '_bucket' + _format_labels(
+                           self.labelnames, key,
+                           ('le', _format_value(float(bound)))),
+                       cumulative)
+            labels = _format_labels(self.labelnames, key)
+            yield self.name + '_count' + labels, cumulative
+            yield self.name + '_sum' + labels, total
+
+
+OPERATIONS = Counter('bankws_operations_total',
+                     "WebService operations by result.",
+                     ('operation', 'result'))
+OPERATION_DURATION = Histogram('bankws_operation_duration_seconds',
+                               "Duration of WebService operations.",
+                               ('operation',))
+STAGE_DURATION = Histogram('bankws_stage_duration_seconds',
+                           "Duration of stages of WebService operations.",
+                           ('operation', 'stage'))
+RESPONSE_CODES = Counter('bankws_response_codes_total',
+                         "ResponseCodes of web service response headers.",
+                         ('code',))
+BYTES_SENT = Counter('bankws_http_sent_bytes_total',
+                     "Bytes of SOAP requests sent.")
+BYTES_RECEIVED = Counter('bankws_http_received_bytes_total',
+                         "Bytes of SOAP responses received.")
+HTTP_IN_FLIGHT = Gauge('bankws_http_requests_in_flight',
+                       "HTTP requests waiting for a response. bankws opens "
+                       "a connection per request, so this is the number of "
+                       "open connections.")
+SIGNATURE_FAILURES = Counter('bankws_signature_failures_total',
+                             "Signatures that failed to verify.",
+                             ('document',))
+CRL_REFRESHES = Counter('bankws_crl_refreshes_total',
+                        "Downloads of the certificate revocation list.",
+                        ('result',))
+SCHEMA_CACHE = Counter('bankws_schema_cache_total',
+                       "Lookups of compiled XML schemas.",
+                       ('schema', 'result'))
+REQUEST_ID_SEQUENCE = Gauge('bankws_request_id_sequence',
+                            "Sequence number of the last request id of the "
+                            "day.")
+
+
+class MetricsInstrument(instrumentation.Instrument):
+    """ MetricsInstrument counts operations and observes durations of
+    operations and stages. """
+    def end(self, event):
+        if event.stage is None:
+            OPERATIONS.inc(operation=event.operation,
+                           result='error' if event.error else 'ok')
+            OPERATION_DURATION.observe(event.duration,
+                                       operation=event.operation)
+        else:
+            STAGE_DURATION.observe(event.duration, operation=event.operation,
+                                   stage=event.stage)
+
+
+def generate_latest():
+    """ Gets all registered metrics in Prometheus text format.
+
+    @rtype: bytes
+    """
+    with _registry_lock:
+        metrics = list(_registry)
+    return ''.join(metric.expose() for metric in metrics).encode('utf-8')
+
+
+def write_textfile(path):
+    """ Writes metrics to file for the textfile collector of node exporter.
+
+    File is written under temporary name and renamed, so the collector never
+    reads a partial file.
+
+    @type  path: string
+    @param path: Filename, should end with .prom.
+    """
+    temporary = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(temporary, 'wb') as f:
+        f.write(generate_latest())
+    os.replace(temporary, path)
+
+
+def _do_get(handler):
+    """ Answers GET of the metrics endpoint. """
+    if handler.path.split('?')[0] not in ('/', '/metrics'):
+        handler.send_error(404)
+        return
+    body = generate_latest()
+    handler.send_response(200)
+    handler.send_header('Content-Type', CONTENT_TYPE)
+    handler.send_header('Content-Length', str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def start_http_server(port, address=''):
+    """ Serves metrics at /metrics in a daemon thread.
+
+    http.server is imported here, most processes never serve metrics.
+
+    @type  port: int
+    @param port: Port, 0 picks a free one.
+    @type  address: string
+    @param address: Address to listen, all by default.
+    @rtype: L{HTTPServer}
+    @return: Server, server_address tells the port and shutdown() stops it.
+    """
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+    class Handler(BaseHTTPRequestHandler):
+        do_GET = _do_get
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = Server((address, port), Handler)
+    thread = threading.Thread(target=server.serve_forever,
+                              name='bankws-metrics')
+    thread.daemon = True
+    thread.start()
+    return server
@@ -0,0 +1,906 @@
+'''Mockbank module is a local stand-in for the bank's web service channel.
+
+MockBank serves the uploadFile, downloadFile, downloadFileList and
+getCertificate SOAP operations and their WSDLs over HTTP, so L{WebService}
+and L{OPCertificateRequest} can be run without the bank's test environment,
+e.g. in CI or in load tests. Responses are signed with keys of a generated
+test PKI. Files and TITO statements are kept in memory, and latency and
+faults can be injected.
+
+Usage:
+    >>> pki = TestPKI('/tmp/mockbank')
+    >>> with MockBank(pki, latency=0.05, fault_rate=0.01) as server:
+            server.add_statement(tito_text)
+            reference = server.add_file(camt_xml, 'camt.054.001.02')
+            ws = WebService('1234567890', pki.client_key,
+                            pki.client_certificate, server.bank)
+            response = ws.transaction_query('57200020004440')
+
+Signatures of the responses are validated against the revocation list
+resources/OP-Pohjola-ws.crl in the working directory. Write an empty list of
+the test CA there, so that nothing is downloaded:
+    >>> pki.write_crl('resources/OP-Pohjola-ws.crl')
+
+From the command line:
+    python -m bankws.mockbank --port 8080 --directory /tmp/mockbank
+
+External libraries:
+    - Lxml
+    - PyOpenSSL
+    - PyCrypto
+'''
+import argparse
+import base64
+import gzip
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from uuid import uuid4
+
+from lxml import etree
+from OpenSSL import crypto
+
+try:
+    from bankws import plugin
+    from bankws import signature
+    from bankws import timehelper
+    from bankws.bank import Bank
+except ImportError:
+    import plugin
+    import signature
+    import timehelper
+    from bank import Bank
+
+log = logging.getLogger("bankws")
+
+SOAP_ENV = 'http://schemas.xmlsoap.org/soap/envelope/'
+WSSE = ("http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-"
+        "wssecurity-secext-1.0.xsd")
+WSU = ("http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-"
+       "wssecurity-utility-1.0.xsd")
+DSIG = 'http://www.w3.org/2000/09/xmldsig#'
+FILE_SERVICE = 'http://model.bxd.fi'
+""" Namespace of file service messages. """
+CERT_SERVICE = 'http://mlp.op.fi/OPCertificateService'
+""" Namespace of certificate service messages. """
+XMLDATA = 'http://bxd.fi/xmldata/'
+CERT_XMLDATA = 'http://op.fi/mlp/xmldata/'
+
+FILE_SERVICE_PATH = '/wsdl/MaksuliikeWS.xml'
+CERT_SERVICE_PATH = '/wsdl/MaksuliikeCertService.xml'
+
+RESPONSE_TEXTS = {'00': 'OK.',
+                  '12': 'Schema validation failed.',
+                  '24': 'No data available.',
+                  '26': 'Technical error.'}
+""" Response codes used by the mock and their texts. """
+FAULTS = ('http', 'code', 'signature', 'drop')
+""" Injectable faults: HTTP 503, response code 26, broken SOAP signature and
+connection closed without a response. """
+STATEMENT_FILETYPE = 'TP1 3ST'
+""" Filetype of uploaded transaction queries. """
+
+_FILE_OPERATIONS = ('uploadFile', 'downloadFile', 'downloadFileList')
+_CERT_OPERATIONS = ('getCertificate', 'getServiceCertificates')
+_HEADER_FIELDS = {
+    'RequestHeader': (('SenderId', 'string', 1), ('RequestId', 'string', 1),
+                      ('Timestamp', 'dateTime', 1), ('Language', 'string', 0),
+                      ('UserAgent', 'string', 1), ('ReceiverId', 'string', 1)),
+    'ResponseHeader': (('SenderId', 'string', 1), ('RequestId', 'string', 1),
+                       ('Timestamp', 'dateTime', 1),
+                       ('ResponseCode', 'string', 1),
+                       ('ResponseText', 'string', 1),
+                       ('ReceiverId', 'string', 0)),
+    'CertificateRequestHeader': (('SenderId', 'string', 1),
+                                 ('RequestId', 'string', 1),
+                                 ('Timestamp', 'dateTime', 1)),
+    'CertificateResponseHeader': (('SenderId', 'string', 1),
+                                  ('RequestId', 'string', 1),
+                                  ('Timestamp', 'dateTime', 1),
+                                  ('ResponseCode', 'string', 1),
+                                  ('ResponseText', 'string', 1)),
+}
+
+_WSDL = '''<?xml version="1.0" encoding="UTF-8"?>
+<wsdl:definitions xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:xs="http://www.w3.org/2001/XMLSchema"
+    xmlns:tns="%(namespace)s" targetNamespace="%(namespace)s">
+  <wsdl:types>
+    <xs:schema targetNamespace="%(namespace)s"
+        elementFormDefault="qualified">
+%(types)s
+    </xs:schema>
+  </wsdl:types>
+%(messages)s
+  <wsdl:portType name="%(service)sPortType">
+%(port_operations)s
+  </wsdl:portType>
+  <wsdl:binding name="%(service)sBinding" type="tns:%(service)sPortType">
+    <soap:binding style="document"
+        transport="http://schemas.xmlsoap.org/soap/http"/>
+%(binding_operations)s
+  </wsdl:binding>
+  <wsdl:service name="%(service)s">
+    <wsdl:port name="%(service)sPort" binding="tns:%(service)sBinding">
+      <soap:address location="%(location)s"/>
+    </wsdl:port>
+  </wsdl:service>
+</wsdl:definitions>
+'''
+_WSDL_HEADER = '''      <xs:complexType name="%s">
+        <xs:sequence>
+%s
+        </xs:sequence>
+      </xs:complexType>'''
+_WSDL_FIELD = ('          <xs:element name="%s" type="xs:%s"'
+               ' minOccurs="%d"/>')
+_WSDL_ELEMENT = '''      <xs:element name="%(name)s">
+        <xs:complexType>
+          <xs:sequence>
+            <xs:element name="%(header)s" type="tns:%(header_type)s"/>
+            <xs:element name="%(data)s" type="xs:base64Binary"/>
+          </xs:sequence>
+        </xs:complexType>
+      </xs:element>'''
+_WSDL_MESSAGE = '''  <wsdl:message name="%(name)s">
+    <wsdl:part name="parameters" element="tns:%(name)s"/>
+  </wsdl:message>'''
+_WSDL_PORT_OPERATION = '''    <wsdl:operation name="%(name)s">
+      <wsdl:input message="tns:%(name)sin"/>
+      <wsdl:output message="tns:%(name)sout"/>
+    </wsdl:operation>'''
+_WSDL_BINDING_OPERATION = '''    <wsdl:operation name="%(name)s">
+      <soap:operation soapAction="%(namespace)s/%(name)s"/>
+      <wsdl:input><soap:body use="literal"/></wsdl:input>
+      <wsdl:output><soap:body use="literal"/></wsdl:output>
+    </wsdl:operation>'''
+
+_FAULT = ('<SOAP-ENV:Envelope xmlns:SOAP-ENV="%s"><SOAP-ENV:Body>'
+          '<SOAP-ENV:Fault><faultcode>SOAP-ENV:Server</faultcode>'
+          '<faultstring>%s</faultstring></SOAP-ENV:Fault></SOAP-ENV:Body>'
+          '</SOAP-ENV:Envelope>')
+
+
+def _wsdl(namespace, service, operations, request_header, response_header,
+          location):
+    """ Generates document/literal WSDL of a service.
+
+    Every operation takes a header and ApplicationRequest in element
+    <operation>in and returns a header and ApplicationResponse in
+    <operation>out.
+    """
+    types = []
+    for header in (request_header, response_header):
+        fields = '\n'.join(_WSDL_FIELD % field
+                           for field in _HEADER_FIELDS[header])
+        types.append(_WSDL_HEADER % (header, fields))
+    messages = []
+    for name in operations:
+        types.append(_WSDL_ELEMENT % {'name': name + 'in',
+                                      'header': 'RequestHeader',
+                                      'header_type': request_header,
+                                      'data': 'ApplicationRequest'})
+        types.append(_WSDL_ELEMENT % {'name': name + 'out',
+                                      'header': 'ResponseHeader',
+                                      'header_type': response_header,
+                                      'data': 'ApplicationResponse'})
+        messages.append(_WSDL_MESSAGE % {'name': name + 'in'})
+        messages.append(_WSDL_MESSAGE % {'name': name + 'out'})
+    return _WSDL % {
+        'namespace': namespace, 'service': service, 'location': location,
+        'types': '\n'.join(types), 'messages': '\n'.join(messages),
+        'port_operations': '\n'.join(_WSDL_PORT_OPERATION % {'name': name}
+                                     for name in operations),
+        'binding_operations': '\n'.join(
+                _WSDL_BINDING_OPERATION % {'name': name,
+                                           'namespace': namespace}
+                for name in operations)}
+
+
+class TestPKI():
+    """ TestPKI holds keys and certificates of the mock bank and a customer.
+
+    Files are generated to directory on first use and reused later, since
+    generating RSA keys is slow. Keys are PEM and certificates DER files,
+    like the ones the bank gives.
+
+    @type directory: string
+    @ivar directory: Directory of the files.
+    @type ca_certificate: string
+    @ivar ca_certificate: Filename of CA certificate.
+    @type bank_key: string
+    @ivar bank_key: Filename of bank's private key, used to sign responses.
+    @type bank_certificate: string
+    @ivar bank_certificate: Filename of bank's certificate.
+    @type client_key: string
+    @ivar client_key: Filename of customer's private key.
+    @type client_certificate: string
+    @ivar client_certificate: Filename of customer's certificate.
+    """
+    def __init__(self, directory, customer_id='1234567890', bits=2048):
+        """ Loads or generates test PKI.
+
+        @type  directory: string
+        @param directory: Directory of the files, created if missing.
+        @type  customer_id: string
+        @param customer_id: Common name of customer's certificate.
+        @type  bits: int
+        @param bits: Length of generated RSA keys.
+        """
+        self.directory = directory
+        self.ca_certificate = os.path.join(directory, 'ca.crt')
+        self.bank_key = os.path.join(directory, 'bank.key')
+        self.bank_certificate = os.path.join(directory, 'bank.crt')
+        self.client_key = os.path.join(directory, 'client.key')
+        self.client_certificate = os.path.join(directory, 'client.crt')
+        self._ca_key = os.path.join(directory, 'ca.key')
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        if not os.path.isfile(self.client_certificate):
+            self._generate(customer_id, bits)
+
+    def _generate(self, customer_id, bits):
+        ca_key = _new_key(bits)
+        ca = _new_certificate('Mock Bank CA', ca_key, None, ca_key)
+        ca.add_extensions([crypto.X509Extension(b'basicConstraints', True,
+                                                b'CA:TRUE')])
+        ca.sign(ca_key, 'sha256')
+        bank_key = _new_key(bits)
+        bank = _new_certificate('Mock Bank', bank_key, ca, ca_key)
+        client_key = _new_key(bits)
+        client = _new_certificate(customer_id, client_key, ca, ca_key)
+        for filename, key in ((self._ca_key, ca_key),
+                              (self.bank_key, bank_key),
+                              (self.client_key, client_key)):
+            _write(filename, crypto.dump_privatekey(crypto.FILETYPE_PEM, key))
+        # Client certificate is written last, it marks a complete PKI.
+        for filename, certificate in ((self.ca_certificate, ca),
+                                      (self.bank_certificate, bank),
+                                      (self.client_certificate, client)):
+            _write(filename, crypto.dump_certificate(crypto.FILETYPE_ASN1,
+                                                     certificate))
+
+    def _load_ca(self):
+        with open(self.ca_certificate, 'rb') as f:
+            ca = crypto.load_certificate(crypto.FILETYPE_ASN1, f.read())
+        with open(self._ca_key, 'rb') as f:
+            ca_key = crypto.load_privatekey(crypto.FILETYPE_PEM, f.read())
+        return ca, ca_key
+
+    def sign_request(self, certificate_request):
+        """ Issues certificate for certificate request.
+
+        @type  certificate_request: bytes
+        @param certificate_request: PKCS#10 request in DER or PEM format.
+        @rtype: bytes
+        @return: DER certificate signed by the test CA.
+        @raise ValueError: If request can't be loaded.
+        """
+        try:
+            if certificate_request.lstrip().startswith(b'-----'):
+                request = crypto.load_certificate_request(
+                                crypto.FILETYPE_PEM, certificate_request)
+            else:
+                request = crypto.load_certificate_request(
+                                crypto.FILETYPE_ASN1, certificate_request)
+        except crypto.Error as e:
+            raise ValueError("Unable to load certificate request: "
+                             "{0}".format(e))
+        with self._lock:
+            ca, ca_key = self._load_ca()
+        certificate = _new_certificate(None, request.get_pubkey(), ca, ca_key,
+                                       subject=request.get_subject())
+        return crypto.dump_certificate(crypto.FILETYPE_ASN1, certificate)
+
+    def write_crl(self, filename, revoked=()):
+        """ Writes certificate revocation list signed by the test CA.
+
+        @type  filename: string
+        @param filename: Filename of DER list, e.g.
+                         resources/OP-Pohjola-ws.crl.
+        @type  revoked: list<string>
+        @param revoked: Filenames of revoked certificates.
+        """
+        ca, ca_key = self._load_ca()
+        crl = crypto.CRL()
+        now = time.strftime('%Y%m%d%H%M%SZ', time.gmtime()).encode('ascii')
+        for certificate_file in revoked:
+            with open(certificate_file, 'rb') as f:
+                certificate = crypto.load_certificate(crypto.FILETYPE_ASN1,
+                                                      f.read())
+            entry = crypto.Revoked()
+            entry.set_serial('{0:x}'.format(
+                                certificate.get_serial_number()).encode())
+            entry.set_rev_date(now)
+            crl.add_revoked(entry)
+        directory = os.path.dirname(filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        _write(filename, crl.export(ca, ca_key, crypto.FILETYPE_ASN1,
+                                    days=1, digest=b'sha256'))
+
+
+def _new_key(bits):
+    """ Generates RSA key. """
+    key = crypto.PKey()
+    key.generate_key(crypto.TYPE_RSA, bits)
+    return key
+
+
+def _new_certificate(common_name, key, issuer, issuer_key, subject=None,
+                     days=365):
+    """ Generates X509v3 certificate signed by issuer (self-signed if None).
+    """
+    certificate = crypto.X509()
+    certificate.set_version(2)
+    certificate.set_serial_number(uuid4().int >> 65)
+    if subject is None:
+        subject = certificate.get_subject()
+        subject.C = 'FI'
+        subject.CN = common_name
+    else:
+        certificate.set_subject(subject)
+    # Allow some clock difference between the mock and its clients.
+    certificate.gmtime_adj_notBefore(-3600)
+    certificate.gmtime_adj_notAfter(days * 24 * 3600)
+    certificate.set_issuer(subject if issuer is None
+                           else issuer.get_subject())
+    certificate.set_pubkey(key)
+    certificate.sign(issuer_key, 'sha256')
+    return certificate
+
+
+def _write(filename, data):
+    with open(filename, 'wb') as f:
+        f.write(data)
+
+
+class BankFile():
+    """ BankFile is a file kept by L{MockBank}.
+
+    @type reference: string
+    @ivar reference: FileReference given by the mock.
+    @type filetype: string
+    @ivar filetype: Type of the file.
+    @type content: bytes
+    @ivar content: Content of the file.
+    @type status: string
+    @ivar status: NEW, DLD or WFP (uploaded, waiting for processing).
+    @type userfilename: string
+    @ivar userfilename: Filename given by the customer.
+    @type target: string
+    @ivar target: Folder of the file.
+    @type timestamp: string
+    @ivar timestamp: Time of creation.
+    """
+    def __init__(self, reference, filetype, content, status='NEW',
+                 userfilename=None, target='target'):
+        self.reference = reference
+        self.filetype = filetype
+        self.content = content
+        self.status = status
+        self.userfilename = userfilename
+        self.target = target
+        self.timestamp = timehelper.get_timestamp()
+
+
+class _Context():
+    """ Message context for L{plugin.SignerPlugin}. """
+    def __init__(self, envelope):
+        self.envelope = envelope
+
+
+class MockBank():
+    """ MockBank is a local web service server that imitates the bank.
+
+    Handling is thread safe, every request is served in its own thread.
+
+    @type pki: L{TestPKI}
+    @ivar pki: Keys and certificates.
+    @type files: OrderedDict
+    @ivar files: FileReference to L{BankFile}.
+    @type statements: dict
+    @ivar statements: Account number (14 digits) to TITO statement text.
+    @type counts: L{Counter}
+    @ivar counts: Number of handled operations and injected faults
+                  (fault:<name>).
+    """
+    def __init__(self, pki, host='127.0.0.1', port=0, bic='OKOYFIHH',
+                 latency=0.0, jitter=0.0, fault_rate=0.0, faults=FAULTS,
+                 seed=None):
+        """ Initializes MockBank. Call L{start} to serve requests.
+
+        @type  pki: L{TestPKI}
+        @param pki: Keys and certificates.
+        @type  host: string
+        @param host: Address to listen.
+        @type  port: int
+        @param port: Port to listen, 0 picks a free port.
+        @type  bic: string
+        @param bic: BIC of the mock bank.
+        @type  latency: float
+        @param latency: Seconds added to every response.
+        @type  jitter: float
+        @param jitter: Maximum random seconds added on top of latency.
+        @type  fault_rate: float
+        @param fault_rate: Share of requests that get a fault (0..1).
+        @type  faults: tuple<string>
+        @param faults: Faults to choose from, see L{FAULTS}.
+        @type  seed: int
+        @param seed: Random seed for jitter and faults.
+        @raise ValueError: If a fault is unknown.
+        """
+        unknown = set(faults) - set(FAULTS)
+        if unknown:
+            raise ValueError("Unknown faults: {0}".format(
+                                                ', '.join(sorted(unknown))))
+        self.pki = pki
+        self.bic = bic
+        self.latency = latency
+        self.jitter = jitter
+        self.fault_rate = fault_rate
+        self.faults = tuple(faults)
+        self.files = OrderedDict()
+        self.statements = {}
+        self.counts = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._reference = 0
+        self._signer = plugin.SignerPlugin(pki.bank_key, pki.bank_certificate)
+        self._server = _Server((host, port), _Handler)
+        self._server.mockbank = self
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """ Starts serving requests in a background thread. """
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='mockbank', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stops serving and closes the socket. """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def _get_url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{0}:{1}'.format(host, port)
+
+    def _get_bank(self):
+        file_service = self.url + FILE_SERVICE_PATH
+        cert_service = self.url + CERT_SERVICE_PATH
+        return Bank(self.bic, file_service, file_service, cert_service,
+                    cert_service)
+
+    url = property(_get_url)
+    bank = property(_get_bank)
+
+    def add_file(self, content, filetype, userfilename=None, status='NEW',
+                 target='target'):
+        """ Adds file that can be listed and downloaded.
+
+        @type  content: bytes or string
+        @param content: Content of the file.
+        @type  filetype: string
+        @param filetype: Type of the file, e.g. camt.054.001.02.
+        @type  userfilename: string
+        @param userfilename: Filename shown in file list.
+        @type  status: string
+        @param status: NEW or DLD.
+        @type  target: string
+        @param target: Folder of the file.
+        @rtype: string
+        @return: FileReference of the file.
+        """
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        with self._lock:
+            self._reference += 1
+            reference = str(self._reference)
+            self.files[reference] = BankFile(reference, filetype, content,
+                                             status, userfilename, target)
+        return reference
+
+    def add_statement(self, text):
+        """ Adds TITO statement returned to transaction queries.
+
+        Account number is read from the basic record of the statement.
+
+        @type  text: string
+        @param text: Statement text.
+        @rtype: string
+        @return: Account number (14 digits).
+        """
+        account = text[9:23].strip()
+        with self._lock:
+            self.statements[account] = text
+        return account
+
+    def handle_get(self, path):
+        """ Gets WSDL of a service.
+
+        @type  path: string
+        @param path: Requested path.
+        @rtype: tuple(int, bytes)
+        @return: HTTP status and body.
+        """
+        if path == FILE_SERVICE_PATH:
+            text = _wsdl(FILE_SERVICE, 'CorporateFileService',
+                         _FILE_OPERATIONS, 'RequestHeader', 'ResponseHeader',
+                         self.url + '/services/CorporateFileService')
+        elif path == CERT_SERVICE_PATH:
+            text = _wsdl(CERT_SERVICE, 'OPCertificateService',
+                         _CERT_OPERATIONS, 'CertificateRequestHeader',
+                         'CertificateResponseHeader',
+                         self.url + '/services/OPCertificateService')
+        else:
+            return (404, b'')
+        return (200, text.encode('utf-8'))
+
+    def handle_post(self, body):
+        """ Handles SOAP request.
+
+        @type  body: bytes
+        @param body: SOAP envelope.
+        @rtype: tuple(int, bytes)
+        @return: HTTP status and signed SOAP envelope.
+        """
+        try:
+            envelope = etree.fromstring(body)
+            (operation,) = plugin.BODY_XPATH(envelope)
+            request = operation[0]
+            header = request.find('{*}RequestHeader')
+            data = request.find('{*}ApplicationRequest').text
+            application_request = etree.fromstring(base64.b64decode(data))
+        except (etree.XMLSyntaxError, ValueError, TypeError, AttributeError,
+                IndexError) as e:
+            return (500, (_FAULT % (SOAP_ENV, e)).encode('utf-8'))
+
+        namespace = etree.QName(request).namespace
+        name = etree.QName(request).localname[:-2]
+        handlers = {'uploadFile': self._upload_file,
+                    'downloadFile': self._download_file,
+                    'downloadFileList': self._download_file_list,
+                    'getCertificate': self._get_certificate,
+                    'getServiceCertificates': self._get_service_certificates}
+        if name not in handlers:
+            return (500, (_FAULT % (SOAP_ENV, 'Operation unknown')
+                          ).encode('utf-8'))
+        with self._lock:
+            self.counts[name] += 1
+        fields = dict((etree.QName(element).localname, element.text)
+                      for element in header)
+        code, response = handlers[name](fields, application_request)
+        return (200, self._envelope(namespace, name, fields, code, response))
+
+    def _choose_fault(self):
+        """ Sleeps latency and picks fault for a request or None. """
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fault = None
+            if self.faults and self._random.random() < self.fault_rate:
+                fault = self._random.choice(self.faults)
+                self.counts['fault:' + fault] += 1
+        if delay > 0:
+            time.sleep(delay)
+        return fault
+
+    def _envelope(self, namespace, name, fields, code, application_response):
+        """ Builds signed SOAP response envelope. """
+        nsmap = {'SOAP-ENV': SOAP_ENV, 'wsse': WSSE, 'wsu': WSU, 'ds': DSIG}
+        env = etree.Element('{%s}Envelope' % SOAP_ENV, nsmap=nsmap)
+        header = etree.SubElement(env, '{%s}Header' % SOAP_ENV)
+        security = etree.SubElement(header, '{%s}Security' % WSSE,
+                                    {'{%s}mustUnderstand' % SOAP_ENV: '1'})
+        timestamp = etree.SubElement(security, '{%s}Timestamp' % WSU)
+        now = time.time()
+        etree.SubElement(timestamp, '{%s}Created' % WSU).text = \
+            time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now))
+        etree.SubElement(timestamp, '{%s}Expires' % WSU).text = \
+            time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now + 300))
+        body = etree.SubElement(env, '{%s}Body' % SOAP_ENV)
+        response = etree.SubElement(body, '{%s}%sout' % (namespace, name),
+                                    nsmap={'mod': namespace})
+        response_header = etree.SubElement(response,
+                                           '{%s}ResponseHeader' % namespace)
+        values = {'SenderId': fields.get('SenderId'),
+                  'RequestId': fields.get('RequestId'),
+                  'Timestamp': timehelper.get_timestamp(),
+                  'ResponseCode': code,
+                  'ResponseText': RESPONSE_TEXTS[code],
+                  'ReceiverId': fields.get('SenderId')}
+        header_type = ('ResponseHeader' if namespace == FILE_SERVICE
+                       else 'CertificateResponseHeader')
+        for field, type_, required in _HEADER_FIELDS[header_type]:
+            if values[field] is not None:
+                etree.SubElement(response_header, '{%s}%s' % (
+                                    namespace, field)).text = values[field]
+        etree.SubElement(response, '{%s}ApplicationResponse' % namespace
+                         ).text = base64.b64encode(application_response)
+        context = _Context(etree.tostring(env))
+        self._signer.sending(context)
+        return context.envelope
+
+    def _sign(self, root):
+        return signature.sign(str(etree.tostring(root), 'utf-8'),
+                              self.pki.bank_key, self.pki.bank_certificate)
+
+    def _application_response(self, fields, code, children=()):
+        """ Builds signed ApplicationResponse. """
+        E = _element_maker(XMLDATA)
+        root = E('ApplicationResponse',
+                 E('CustomerId', fields.get('SenderId') or '0'),
+                 E('Timestamp', timehelper.get_timestamp()),
+                 E('ResponseCode', code),
+                 E('ResponseText', RESPONSE_TEXTS[code]),
+                 *children)
+        return (code, self._sign(root))
+
+    def _descriptors(self, files):
+        E = _element_maker(XMLDATA)
+        descriptors = E('FileDescriptors')
+        for bank_file in files:
+            descriptor = E('FileDescriptor',
+                           E('FileReference', bank_file.reference),
+                           E('TargetId', bank_file.target))
+            if bank_file.userfilename:
+                descriptor.append(E('UserFilename', bank_file.userfilename))
+            descriptor.append(E('FileType', bank_file.filetype))
+            descriptor.append(E('FileTimestamp', bank_file.timestamp))
+            descriptor.append(E('Status', bank_file.status))
+            descriptors.append(descriptor)
+        return descriptors
+
+    def _upload_file(self, fields, request):
+        E = _element_maker(XMLDATA)
+        values = _children(request)
+        if values.get('Content') is None or values.get('FileType') is None:
+            return self._application_response(fields, '12')
+        content = base64.b64decode(values['Content'])
+        if values.get('Compression', 'false').lower() in ('true', '1'):
+            content = gzip.decompress(content)
+        if values['FileType'] == STATEMENT_FILETYPE:
+            # Transaction query "$$TP1 3ST branch account filter"
+            parts = content.decode('utf-8').split()
+            with self._lock:
+                statement = (self.statements.get(''.join(parts[2:4]))
+                             if len(parts) >= 4 else None)
+            if statement is None:
+                return self._application_response(fields, '24')
+            return self._application_response(
+                        fields, '00',
+                        [E('Compressed', 'false'),
+                         E('FileType', STATEMENT_FILETYPE),
+                         E('Content', base64.b64encode(
+                                        statement.encode('utf-8')))])
+        reference = self.add_file(content, values['FileType'],
+                                  values.get('UserFilename'), 'WFP',
+                                  values.get('TargetId') or 'target')
+        return self._application_response(
+                    fields, '00', [self._descriptors([self.files[reference]])])
+
+    def _download_file_list(self, fields, request):
+        values = _children(request)
+        status = values.get('Status', 'ALL')
+        filetype = values.get('FileType')
+        with self._lock:
+            files = [bank_file for bank_file in self.files.values()
+                     if bank_file.status != 'WFP' and
+                     (status == 'ALL' or bank_file.status == status) and
+                     (filetype is None or bank_file.filetype == filetype)]
+        if not files:
+            return self._application_response(fields, '00')
+        return self._application_response(fields, '00',
+                                          [self._descriptors(files)])
+
+    def _download_file(self, fields, request):
+        E = _element_maker(XMLDATA)
+        values = _children(request)
+        reference = request.findtext('{*}FileReferences/{*}FileReference')
+        with self._lock:
+            bank_file = self.files.get(reference)
+            if bank_file is not None:
+                bank_file.status = 'DLD'
+        if bank_file is None:
+            return self._application_response(fields, '24')
+        content = bank_file.content
+        if values.get('Compression', 'false').lower() in ('true', '1'):
+            content = gzip.compress(content)
+            children = [E('Compressed', 'true'),
+                        E('CompressionMethod', 'RFC1952')]
+        else:
+            children = [E('Compressed', 'false')]
+        children.append(E('FileType', bank_file.filetype))
+        children.append(E('Content', base64.b64encode(content)))
+        return self._application_response(fields, '00', children)
+
+    def _cert_response(self, fields, code, certificates=()):
+        """ Builds signed CertApplicationResponse. """
+        E = _element_maker(CERT_XMLDATA)
+        root = E('CertApplicationResponse',
+                 E('CustomerId', fields.get('SenderId') or '0'),
+                 E('Timestamp', timehelper.get_timestamp()),
+                 E('ResponseCode', code),
+                 E('ResponseText', RESPONSE_TEXTS[code]))
+        if certificates:
+            element = E('Certificates')
+            for certificate in certificates:
+                subject = crypto.load_certificate(crypto.FILETYPE_ASN1,
+                                                  certificate).get_subject()
+                name = ','.join('{0}={1}'.format(key.decode(), value.decode())
+                                for key, value in subject.get_components())
+                element.append(E('Certificate',
+                                 E('Name', name),
+                                 E('Certificate', base64.b64encode(
+                                                        certificate)),
+                                 E('CertificateFormat', 'X509v3')))
+            root.append(element)
+        return (code, self._sign(root))
+
+    def _get_certificate(self, fields, request):
+        content = request.findtext('{*}Content')
+        try:
+            certificate = self.pki.sign_request(base64.b64decode(content))
+        except (ValueError, TypeError) as e:
+            log.error(e)
+            return self._cert_response(fields, '12')
+        return self._cert_response(fields, '00', [certificate])
+
+    def _get_service_certificates(self, fields, request):
+        certificates = []
+        for filename in (self.pki.bank_certificate, self.pki.ca_certificate):
+            with open(filename, 'rb') as f:
+                certificates.append(f.read())
+        return self._cert_response(fields, '00', certificates)
+
+
+def _element_maker(namespace):
+    """ Gets function that builds elements of namespace. """
+    def make(tag, *children):
+        element = etree.Element('{%s}%s' % (namespace, tag),
+                                nsmap={None: namespace})
+        for child in children:
+            if isinstance(child, etree._Element):
+                element.append(child)
+            elif isinstance(child, bytes):
+                element.text = child.decode('ascii')
+            else:
+                element.text = child
+        return element
+    return make
+
+
+def _children(element):
+    """ Gets texts of direct children by local name. """
+    return dict((etree.QName(child).localname, child.text)
+                for child in element)
+
+
+def _break_signature(envelope):
+    """ Changes SignatureValue of SOAP envelope so validation fails. """
+    env = etree.fromstring(envelope)
+    value = env.find('.//{%s}SignatureValue' % DSIG)
+    raw = base64.b64decode(value.text)
+    value.text = base64.b64encode(bytes([raw[0] ^ 1]) + raw[1:])
+    return etree.tostring(env)
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    mockbank = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """ Passes HTTP requests to L{MockBank} and injects faults. """
+    def do_GET(self):
+        self._send(*self.server.mockbank.handle_get(self.path),
+                   content_type='text/xml')
+
+    def do_POST(self):
+        mockbank = self.server.mockbank
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        fault = mockbank._choose_fault()
+        if fault == 'drop':
+            self.close_connection = True
+            return
+        if fault == 'http':
+            self._send(503, b'')
+            return
+        status, envelope = mockbank.handle_post(body)
+        if status == 200 and fault == 'code':
+            envelope = _replace_code(mockbank, envelope)
+        elif status == 200 and fault == 'signature':
+            envelope = _break_signature(envelope)
+        self._send(status, envelope)
+
+    def _send(self, status, body, content_type='text/xml; charset=utf-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format_, *args):
+        log.debug("mockbank: " + format_, *args)
+
+
+def _replace_code(mockbank, envelope):
+    """ Builds response with code 26 for the request of envelope. """
+    env = etree.fromstring(envelope)
+    (body,) = plugin.BODY_XPATH(env)
+    response = body[0]
+    name = etree.QName(response)
+    fields = _children(response.find('{*}ResponseHeader'))
+    if name.namespace == FILE_SERVICE:
+        code, data = mockbank._application_response(fields, '26')
+    else:
+        code, data = mockbank._cert_response(fields, '26')
+    return mockbank._envelope(name.namespace, name.localname[:-3], fields,
+                              code, data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+                description="Local mock of the bank web service.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--directory', default='mockbank',
+                        help="directory of the test PKI")
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--fault-rate', type=float, default=0.0)
+    parser.add_argument('--faults', default=','.join(FAULTS))
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--statement', action='append', default=[],
+                        help="TITO statement file, may be repeated")
+    parser.add_argument('--file', action='append', default=[],
+                        metavar='FILETYPE=PATH',
+                        help="file served for download, may be repeated")
+    args = parser.parse_args(argv)
+
+    pki = TestPKI(args.directory)
+    server = MockBank(pki, args.host, args.port, latency=args.latency,
+                      jitter=args.jitter, fault_rate=args.fault_rate,
+                      faults=[x for x in args.faults.split(',') if x],
+                      seed=args.seed)
+    for filename in args.statement:
+        with open(filename, encoding='latin-1') as f:
+            server.add_statement(f.read())
+    for item in args.file:
+        filetype, filename = item.split('=', 1)
+        with open(filename, 'rb') as f:
+            server.add_file(f.read(), filetype, os.path.basename(filename))
+    server.start()
+    print("Serving {0}".format(server.bank.wsdl_url))
+    print("Certificate service {0}".format(server.bank.id_url))
+    print("Client key {0}, certificate {1}".format(pki.client_key,
+                                                   pki.client_certificate))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
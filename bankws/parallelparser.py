@@ -0,0 +1,219 @@
+'''Parallelparser module parses archived "Tapahtumaotekysely" statements in a
+pool of worker processes.
+
+Columns are parsed from memory mapped byte ranges. Large files are split on
+record boundaries and the account of the statement is carried over the split
+points, so every transaction keeps the account of its basic record.
+Responses are parsed one file (statement) per task so that basic and balance
+records stay with their transactions.
+
+Usage:
+Get columns of all transactions in a directory using every core
+    >>> columns = parse_columns('archive/')
+Iterate transactions in order with their basic and balance records
+    >>> for basic, transaction, balance in iter_transactions('archive/'):
+            print(basic.account, transaction.transaction.money_cents)
+
+External libraries:
+    - NumPy (parse_columns)
+'''
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from bankws import bulkparser
+    from bankws.transactionlistresponse import TransactionListResponse
+except ImportError:
+    import bulkparser
+    from transactionlistresponse import TransactionListResponse
+
+CHUNK_SIZE = 64 * 1024 * 1024
+""" Files larger than this (bytes) are split to several tasks. """
+
+
+def split_file(filename, chunk_size=CHUNK_SIZE):
+    """ Splits file to byte ranges that start at the beginning of a record.
+
+    @type  filename: string
+    @param filename: Statement file.
+    @type  chunk_size: int
+    @param chunk_size: Approximate size of ranges in bytes.
+    @rtype: list<tuple(int, int)>
+    @return: (start, end) byte ranges covering the whole file.
+    """
+    size = os.path.getsize(filename)
+    if size <= chunk_size:
+        return [(0, size)]
+    ranges = []
+    with open(filename, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            start = 0
+            while start < size:
+                newline = mapped.find(b'\n', start + chunk_size)
+                end = size if newline == -1 else newline + 1
+                ranges.append((start, end))
+                start = end
+    return ranges
+
+
+def _map_range(task):
+    """ Worker: parses columns of one byte range of a file.
+
+    @type  task: tuple
+    @param task: (filename, start, end, encoding, dictionary_encode)
+    @rtype: tuple
+    @return: (L{TransactionColumns}, raw accounts, number of transactions
+             without basic record, account of last basic record)
+    """
+    import numpy
+    try:
+        from bankws.transactioncolumns import build_columns
+    except ImportError:
+        from transactioncolumns import build_columns
+
+    filename, start, end, encoding, dictionary_encode = task
+    if end == start:
+        buf = numpy.zeros(0, dtype=numpy.uint8)
+        fields, orphans, account = bulkparser._map_fields(buf, encoding)
+    else:
+        with open(filename, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0,
+                           access=mmap.ACCESS_READ) as mapped:
+                buf = numpy.frombuffer(mapped, dtype=numpy.uint8,
+                                       count=end - start, offset=start)
+                try:
+                    fields, orphans, account = bulkparser._map_fields(
+                                                        buf, encoding)
+                finally:
+                    # View must be released before the map can be closed.
+                    del buf
+    # Accounts are completed over range boundaries and encoded by the
+    # parent.
+    accounts = fields.pop('account')
+    columns = build_columns(fields, dictionary_encode, encoding)
+    return columns, accounts, orphans, account
+
+
+def parse_columns(path, processes=None, chunk_size=CHUNK_SIZE,
+                  dictionary_encode=True, encoding=bulkparser.DEFAULT_ENCODING):
+    """ Parses transactions of statement files to columns in parallel.
+
+    @type  path: string
+    @param path: File or directory name.
+    @type  processes: int
+    @param processes: Number of worker processes (default: number of CPUs).
+    @type  chunk_size: int
+    @param chunk_size: Files larger than this are split (bytes).
+    @type  dictionary_encode: boolean
+    @param dictionary_encode: Dictionary encode string columns.
+    @type  encoding: string
+    @param encoding: Encoding of files.
+    @rtype: L{TransactionColumns}
+    @return: Transactions of all files in file order.
+    """
+    import numpy
+    try:
+        from bankws.transactioncolumns import concat_columns, string_column
+    except ImportError:
+        from transactioncolumns import concat_columns, string_column
+
+    tasks = []
+    files = []
+    for filename in bulkparser.statement_files(path):
+        for start, end in split_file(filename, chunk_size):
+            tasks.append((filename, start, end, encoding, dictionary_encode))
+            files.append(filename)
+
+    with ProcessPoolExecutor(processes) as executor:
+        results = list(executor.map(_map_range, tasks))
+
+    # Leading transactions of a range belong to the last statement of the
+    # previous range of the same file.
+    accounts = []
+    carry = None
+    previous = None
+    for filename, (columns, account, orphans, last_account) in zip(files,
+                                                                   results):
+        if filename != previous:
+            carry = None
+            previous = filename
+        if orphans and carry is not None:
+            account = account.copy()
+            account[:orphans] = carry
+        if last_account is not None:
+            carry = last_account
+        accounts.append(account)
+
+    merged = concat_columns([result[0] for result in results])
+    if accounts:
+        account = numpy.concatenate(accounts)
+    else:
+        account = numpy.zeros(0, dtype='S1')
+    merged.columns['account'], dictionary = string_column(
+                                    account, dictionary_encode, encoding)
+    if dictionary is not None:
+        merged.dictionaries['account'] = dictionary
+    return merged
+
+
+def _parse_file(task):
+    """ Worker: parses one statement file to TransactionListResponse. """
+    filename, encoding = task
+    records = [line.decode(encoding)
+               for line in bulkparser.iter_records(filename)]
+    if records:
+        return TransactionListResponse(records)
+    return None
+
+
+def parse_responses(path, processes=None,
+                    encoding=bulkparser.DEFAULT_ENCODING):
+    """ Parses statement files to TransactionListResponse objects in
+    parallel.
+
+    @type  path: string
+    @param path: File or directory name.
+    @type  processes: int
+    @param processes: Number of worker processes (default: number of CPUs).
+    @type  encoding: string
+    @param encoding: Encoding of files.
+    @rtype: generator of L{TransactionListResponse}
+    @return: One response per non-empty file in file order.
+    """
+    tasks = [(filename, encoding)
+             for filename in bulkparser.statement_files(path)]
+    workers = processes or os.cpu_count() or 1
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(processes) as executor:
+        for response in executor.map(_parse_file, tasks,
+                                      chunksize=chunksize):
+            if response is not None:
+                yield response
+
+
+def iter_transactions(path, processes=None,
+                      encoding=bulkparser.DEFAULT_ENCODING):
+    """ Iterates transactions of statement files parsed in parallel.
+
+    @type  path: string
+    @param path: File or directory name.
+    @type  processes: int
+    @param processes: Number of worker processes (default: number of CPUs).
+    @type  encoding: string
+    @param encoding: Encoding of files.
+    @rtype: generator of tuple(L{BasicRecord}, L{Transaction},
+            L{BalanceRecord})
+    @return: Transactions in order with their basic and balance records.
+             Balance record is None if statement has none.
+    """
+    for response in parse_responses(path, processes, encoding):
+        if not response.transactions:
+            continue
+        basic = response.basic_record
+        try:
+            balance = response.balance_record
+        except AttributeError:
+            balance = None
+        for transaction in response.transactions:
+            yield basic, transaction, balance
@@ -0,0 +1,139 @@
+'''Payloadlog module decides how SOAP envelopes and application messages are
+logged.
+
+Payload logging is off by default. Callers pass the payload itself and it
+is decoded, redacted and truncated only when a record is really emitted,
+so with payload logging off the only cost is one attribute check.
+
+Redaction replaces text of elements carrying base64 content, signatures,
+certificates and keys (e.g. Content, ApplicationRequest, SignatureValue,
+BinarySecurityToken) and PEM blocks with their length.
+
+Usage:
+    >>> payloadlog.configure(enabled=True, limit=4096, sample_rate=0.1)
+    >>> payloadlog.log(logger, "Received envelope", context.reply)
+    >>> if payloadlog.enabled(logger):
+            logger.debug("%s", payloadlog.Payload(envelope))
+'''
+import logging
+import random
+import re
+
+_REDACTED_ELEMENTS = ('Content', 'ApplicationRequest', 'ApplicationResponse',
+                      'SignatureValue', 'DigestValue', 'BinarySecurityToken',
+                      'X509Certificate', 'Certificate', 'TransferKey', 'HMAC',
+                      'PrivateKey')
+""" Local names of elements whose text is never logged. """
+_ELEMENT = re.compile(r'(<(?:[\w.-]+:)?(?:{0})(?:\s[^>]*)?>)([^<]+)'.format(
+                      '|'.join(_REDACTED_ELEMENTS)))
+_PEM = re.compile(r'-----BEGIN ([A-Z0-9 ]+)-----.*?-----END \1-----',
+                  re.DOTALL)
+
+
+class PayloadPolicy():
+    """ PayloadPolicy holds settings of payload logging.
+
+    @type enabled: boolean
+    @ivar enabled: Are payloads logged at all.
+    @type level: int
+    @ivar level: Logging level of payload records.
+    @type limit: int
+    @ivar limit: Maximum number of characters logged from a payload, None
+                 for no limit.
+    @type sample_rate: float
+    @ivar sample_rate: Share of payloads logged, from 0.0 to 1.0.
+    @type redact: boolean
+    @ivar redact: Are base64 content, signatures and keys redacted.
+    """
+    def __init__(self, enabled=False, level=logging.DEBUG, limit=2048,
+                 sample_rate=1.0, redact=True):
+        self.enabled = enabled
+        self.level = level
+        self.limit = limit
+        self.sample_rate = sample_rate
+        self.redact = redact
+
+
+policy = PayloadPolicy()
+""" Policy used by bankws modules. """
+
+
+def configure(**settings):
+    """ Changes settings of L{policy}.
+
+    @param settings: Attributes of L{PayloadPolicy}.
+    @raise ValueError: If setting is unknown or sample rate is not between
+                       0 and 1.
+    """
+    for name, value in settings.items():
+        if not hasattr(policy, name):
+            raise ValueError("Unknown payload logging setting {0}".format(
+                             name))
+        if name == 'sample_rate' and not 0.0 <= value <= 1.0:
+            raise ValueError("Sample rate must be between 0 and 1")
+    for name, value in settings.items():
+        setattr(policy, name, value)
+
+
+def enabled(logger):
+    """ Checks if payloads are logged to logger.
+
+    @type  logger: L{logging.Logger}
+    @param logger: Logger
+    @rtype: boolean
+    """
+    return policy.enabled and logger.isEnabledFor(policy.level)
+
+
+def render(payload, limit=None, redact=True):
+    """ Gets loggable text of payload.
+
+    @type  payload: bytes or string
+    @param payload: Envelope, message or element text.
+    @type  limit: int
+    @param limit: Maximum number of characters, None for no limit.
+    @type  redact: boolean
+    @param redact: Redact base64 content, signatures and keys.
+    @rtype: string
+    """
+    if payload is None:
+        return 'None'
+    if isinstance(payload, (bytes, bytearray)):
+        text = bytes(payload).decode('utf-8', 'replace')
+    else:
+        text = str(payload)
+    if redact:
+        text = _PEM.sub(lambda m: '[REDACTED {0}]'.format(m.group(1)), text)
+        text = _ELEMENT.sub(lambda m: '{0}[REDACTED {1} characters]'.format(
+                                m.group(1), len(m.group(2))), text)
+    if limit is not None and len(text) > limit:
+        text = '{0}... [{1} more characters]'.format(text[:limit],
+                                                     len(text) - limit)
+    return text
+
+
+class Payload():
+    """ Payload is rendered with L{render} only when converted to string,
+    i.e. when logging formats the record. """
+    def __init__(self, payload):
+        self._payload = payload
+
+    def __str__(self):
+        return render(self._payload, policy.limit, policy.redact)
+
+
+def log(logger, message, payload):
+    """ Logs payload with policy, doing nothing if payload logging is off.
+
+    @type  logger: L{logging.Logger}
+    @param logger: Logger
+    @type  message: string
+    @param message: Description, payload is appended after colon.
+    @type  payload: bytes or string
+    @param payload: Payload
+    """
+    if not policy.enabled or not logger.isEnabledFor(policy.level):
+        return
+    if policy.sample_rate < 1.0 and random.random() >= policy.sample_rate:
+        return
+    logger.log(policy.level, "%s: %s", message, Payload(payload))
@@ -17,11 +17,18 @@ from lxml import etree
 from suds.plugin import MessagePlugin
 from suds.bindings.binding import envns
 from suds.wsse import wsuns, dsns, wssens
-import Crypto.PublicKey.RSA as RSAKey
 
 try:
+    from bankws import cryptobackend
+    from bankws import instrumentation
+    from bankws import metrics
+    from bankws import payloadlog
     from bankws import signature
 except ImportError:
+    import cryptobackend
+    import instrumentation
+    import metrics
+    import payloadlog
     import signature
 
 
@@ -68,9 +75,14 @@ class SignerPlugin(MessagePlugin):
     @type certificate: string
     @ivar certificate: X509v3 DER certificate filename.
     @type keytype: string
-    @ivar keytype: Identifier for rsa-sha1
+    @ivar keytype: Identifier for rsa-sha1 or rsa-sha256
+    @type digest_method: string
+    @ivar digest_method: Identifier for sha1 or sha256 digests.
+    @type signer: L{signingservice.SigningService}
+    @ivar signer: Calculates SignatureValues in worker processes, if set.
     """
-    def __init__(self, private_key, certificate):
+    def __init__(self, private_key, certificate, algorithm='sha1',
+                 signer=None):
         """
         Initializes Suds MessagePlugin.
 
@@ -78,13 +90,19 @@ class SignerPlugin(MessagePlugin):
         @param private_key: RSA - private key filename.
         @type  certificate: string
         @param certificate: X509 certificate filename.
+        @type  algorithm: string
+        @param algorithm: Digest of the signature and references, sha1 or
+                          sha256.
+        @type  signer: L{signingservice.SigningService}
+        @param signer: Signing service having the same key.
+        @raise ValueError: If key or algorithm is unsupported.
         """
+        if algorithm not in cryptobackend.SIGNATURE_URIS:
+            raise ValueError("Unsupported algorithm {0}".format(algorithm))
         self.log = logging.getLogger('bankws')
         if os.path.isfile(private_key):
-            with open(private_key, 'rb') as f:
-                content = f.read()
             try:
-                RSAKey.importKey(content)
+                signature.load_private_key(private_key)
             except ValueError:
                 raise ValueError('Unsupported RSA key format')
             self.keyfile = private_key
@@ -95,14 +113,20 @@ class SignerPlugin(MessagePlugin):
             self.certificate = certificate
         else:
             raise IOError("{0} doesn't exists".format(certificate))
-        self.keytype = RSA
+        self.algorithm = algorithm
+        self.signer = signer
+        self.keytype = cryptobackend.SIGNATURE_URIS[algorithm]
+        self.digest_method = cryptobackend.DIGEST_URIS[algorithm]
 
     def received(self, context):
         """ Checks signature validity"""
-        self.log.info("Received data: {0}".format(context.reply))
-        env = etree.fromstring(context.reply)
-        valid = signature.validate(etree.tostring(env))
+        payloadlog.log(self.log, "Received envelope", context.reply)
+        with instrumentation.stage('verify_envelope',
+                                   size_in=len(context.reply)):
+            env = etree.fromstring(context.reply)
+            valid = signature.validate(etree.tostring(env))
         if not valid:
+            metrics.SIGNATURE_FAILURES.inc(document='envelope')
             raise RuntimeError("Invalid signature")
 
     def sending(self, context):
@@ -111,15 +135,18 @@ class SignerPlugin(MessagePlugin):
         @type  context: Bytes
         @param context: Suds generated Soap-envelope.
         """
-        env = etree.fromstring(context.envelope)
-        (body,) = BODY_XPATH(env)
-        queue = SignQueue()
-        queue.push_and_mark(body)
-        security = ensure_security_header(env, queue)
-        security_id = self.insert_binary_security_token(security, queue)
-        self.insert_signature_template(security, security_id, queue)
-        context.envelope = self.get_signature(etree.tostring(env))
-        self.log.info("Signed envelope: {0}".format(context.envelope))
+        with instrumentation.stage('sign_envelope',
+                                   size_in=len(context.envelope)) as event:
+            env = etree.fromstring(context.envelope)
+            (body,) = BODY_XPATH(env)
+            queue = SignQueue(self.digest_method)
+            queue.push_and_mark(body)
+            security = ensure_security_header(env, queue)
+            security_id = self.insert_binary_security_token(security, queue)
+            self.insert_signature_template(security, security_id, queue)
+            context.envelope = self.get_signature(etree.tostring(env))
+            event.size_out = len(context.envelope)
+        payloadlog.log(self.log, "Signed envelope", context.envelope)
 
     def insert_signature_template(self, security, security_id, queue):
         """
@@ -155,9 +182,8 @@ class SignerPlugin(MessagePlugin):
                                   EncodingType=X509BASE64
                                   )
         id_ = queue.mark(binsec)
-        with open(self.certificate, "rb") as f:
-            content = f.read()
-            binsec.text = base64.b64encode(content)
+        binsec.text = base64.b64encode(
+                        signature.load_certificate(self.certificate))
         return id_
 
     def append_signed_info(self, signature, queue):
@@ -205,7 +231,8 @@ class SignerPlugin(MessagePlugin):
         body = BODY_XPATH(doc)[0]
         body_id = body.attrib['{' + wsuns[1] + '}Id']
         digest = signature.calculate_digest(str(etree.tostring(body), 'utf-8'),
-                                            exclusive_=True)
+                                            exclusive_=True,
+                                            algorithm=self.algorithm)
 
         body_digest = base64.b64encode(digest.digest())
 
@@ -225,7 +252,8 @@ class SignerPlugin(MessagePlugin):
         expired.text = expired.text.split(".")[0] + 'Z'
         digest = signature.calculate_digest(
                                 str(etree.tostring(timestamp), 'utf-8'),
-                                exclusive_=True)
+                                exclusive_=True,
+                                algorithm=self.algorithm)
 
         timestamp_digest = base64.b64encode(digest.digest())
 
@@ -255,16 +283,21 @@ class SignerPlugin(MessagePlugin):
                 dv.text = timestamp_digest
         # Calculate signaturevalue
         infomessage = str(etree.tostring(signed_info), 'utf-8')
-        signaturevalue = signature.calculate_signature_value(infomessage,
-                                                             self.keyfile,
-                                                             exclusive_=True)
+        if self.signer is not None:
+            signaturevalue = self.signer.calculate_signature_value(
+                                infomessage, exclusive_=True,
+                                algorithm=self.algorithm)
+        else:
+            signaturevalue = signature.calculate_signature_value(
+                                infomessage, self.keyfile, exclusive_=True,
+                                algorithm=self.algorithm)
         # Append signaturevalue to tree
         value = base64.b64encode(signaturevalue)
         SignatureValue = signature_.find(
                           "{http://www.w3.org/2000/09/xmldsig#}SignatureValue"
                         )
         SignatureValue.text = value
-        self.log.debug("SignatureValue: {0}".format(value))
+        self.log.debug("SignatureValue: %s", value)
         # Return result as a string
         return etree.tostring(doc)
 
@@ -275,6 +308,8 @@ class SignQueue(object):
 
     @type queue: List
     @ivar queue: List containing given id's.
+    @type digest_method: string
+    @ivar digest_method: DigestMethod of inserted references.
     """
     WSU_ID = ns_id('Id', wsuns)
     """WS-security utility id"""
@@ -284,9 +319,10 @@ class SignQueue(object):
     """Digital signature reference value"""
     DS_TRANSFORMS = ns_id('Transforms', dsns)
     """Digital signature transform value"""
-    def __init__(self):
+    def __init__(self, digest_method=XMLDSIG_SHA1):
         """ Initializes SignQueue class """
         self.queue = []
+        self.digest_method = digest_method
 
     def mark(self, element):
         """ Marks element with an unique id
@@ -322,7 +358,7 @@ class SignQueue(object):
                     {'URI': '#{0}'.format(element_id)})
             transforms = etree.SubElement(reference, self.DS_TRANSFORMS)
             set_algorithm(transforms, 'Transform', C14N)
-            set_algorithm(reference, 'DigestMethod', XMLDSIG_SHA1)
+            set_algorithm(reference, 'DigestMethod', self.digest_method)
             etree.SubElement(reference, self.DS_DIGEST_VALUE)
 
 
@@ -0,0 +1,267 @@
+'''Reconciliation module joins sent C2B payments to their feedback.
+
+Payments are indexed by EndToEndId (and InstrId) to an SQLite database when
+messages are produced, so the index survives between runs. Feedback
+(pain.002 or camt.054) is streamed through the response parsers and the
+status of every item is stored to the original payment with an indexed
+lookup.
+
+Usage:
+    >>> index = ReconciliationIndex('payments.db')
+    >>> index.register(c2b_message)
+    >>> result = index.reconcile(webservice.download_file(ref).content)
+    >>> print(result)
+    >>> index.unmatched_payments()
+'''
+import sqlite3
+
+try:
+    from bankws import c2b
+except ImportError:
+    import c2b
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS payments (
+    end_to_end_id TEXT PRIMARY KEY,
+    instr_id TEXT,
+    msg_id TEXT NOT NULL,
+    pmt_inf_id TEXT,
+    amount TEXT NOT NULL,
+    currency TEXT,
+    creditor_iban TEXT,
+    status TEXT,
+    status_code TEXT,
+    status_info TEXT,
+    archive_ref TEXT,
+    feedback_msg_id TEXT
+);
+CREATE INDEX IF NOT EXISTS payments_instr_id ON payments (instr_id);
+CREATE INDEX IF NOT EXISTS payments_msg_id ON payments (msg_id);
+"""
+
+_INSERT = ("INSERT OR REPLACE INTO payments (end_to_end_id, instr_id, "
+           "msg_id, pmt_inf_id, amount, currency, creditor_iban) "
+           "VALUES (?, ?, ?, ?, ?, ?, ?)")
+_UPDATE = ("UPDATE payments SET status = ?, status_code = ?, status_info = ?, "
+           "archive_ref = ?, feedback_msg_id = ? WHERE ")
+
+
+class ReconciliationResult():
+    """ ReconciliationResult holds outcome of applying one feedback file.
+
+    @type matched: int
+    @ivar matched: Number of feedback items joined to a payment.
+    @type group_rejected: int
+    @ivar group_rejected: Number of payments rejected by group status.
+    @type unmatched_feedback: list
+    @ivar unmatched_feedback: Feedback items (L{PmntInfAndStatus} or
+                              L{TxDtls}) whose payment is not indexed.
+    """
+    def __init__(self):
+        self.matched = 0
+        self.group_rejected = 0
+        self.unmatched_feedback = []
+
+    def __str__(self):
+        lines = ["{0} matched, {1} unmatched feedback items".format(
+                 self.matched, len(self.unmatched_feedback))]
+        if self.group_rejected:
+            lines.append("{0} payments rejected with the message".format(
+                         self.group_rejected))
+        for item in self.unmatched_feedback:
+            lines.append("unmatched: {0}".format(_feedback_ids(item)[0]))
+        return '\n'.join(lines)
+
+
+class ReconciliationIndex():
+    """ ReconciliationIndex is a persistent index of sent payments.
+
+    @type connection: L{sqlite3.Connection}
+    @ivar connection: Database connection.
+    """
+    def __init__(self, filename=':memory:'):
+        """ Opens or creates index.
+
+        @type  filename: string
+        @param filename: SQLite database filename.
+        """
+        self.connection = sqlite3.connect(filename)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Closes database connection. """
+        self.connection.close()
+
+    def register(self, message):
+        """ Indexes all transactions of C2B message.
+
+        A payment with an already indexed EndToEndId replaces the old one,
+        e.g. when a rejected payment is sent again.
+
+        @type  message: L{C2B}
+        @param message: Message with group header set.
+        @rtype: int
+        @return: Number of indexed transactions.
+        """
+        rows = [_payment_row(message._msg_id, sepa, tx)
+                for sepa in message._payments for tx in sepa._transactions]
+        with self.connection:
+            self.connection.executemany(_INSERT, rows)
+        return len(rows)
+
+    def register_transaction(self, msg_id, sepa, tx):
+        """ Indexes one transaction, e.g. while it is streamed.
+
+        Changes are committed by L{commit}.
+
+        @type  msg_id: string
+        @param msg_id: MsgId of the message.
+        @type  sepa: L{SEPA}
+        @param sepa: Payment the transaction belongs to.
+        @type  tx: L{CdtTrfTxInf}
+        @param tx: Transaction.
+        """
+        self.connection.execute(_INSERT, _payment_row(msg_id, sepa, tx))
+
+    def commit(self):
+        """ Commits transactions indexed with L{register_transaction}. """
+        self.connection.commit()
+
+    def get(self, end_to_end_id):
+        """ Gets indexed payment.
+
+        @type  end_to_end_id: string
+        @param end_to_end_id: EndToEndId of the payment.
+        @rtype: dict or None
+        @return: Column name to value.
+        """
+        row = self.connection.execute(
+                    "SELECT * FROM payments WHERE end_to_end_id = ?",
+                    (end_to_end_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def reconcile(self, app_response):
+        """ Streams feedback file and stores statuses to payments.
+
+        @param app_response: pain.002 or camt.054 XML
+        @type app_response: bytes or binary file object
+        @rtype: L{ReconciliationResult}
+        @return: Matched count and unmatched feedback items.
+        @raise ValueError: If the document is not pain.002 or camt.054.
+        """
+        namespace = c2b._document_namespace(app_response)
+        if namespace == c2b.PAIN_002:
+            response = c2b.C2BResponsePain()
+            items = response.iter_payments(app_response)
+        elif namespace == c2b.CAMT_054:
+            response = c2b.C2BResponseCamt()
+            items = response.iter_transactions(app_response)
+        else:
+            raise ValueError("Unsupported feedback document {0}".format(
+                                                                namespace))
+        return self._apply(response, items)
+
+    def apply(self, response):
+        """ Stores statuses of an already parsed response to payments.
+
+        @type  response: L{C2BResponse}, L{C2BResponsePain} or
+                         L{C2BResponseCamt}
+        @param response: Parsed feedback.
+        @rtype: L{ReconciliationResult}
+        @return: Matched count and unmatched feedback items.
+        """
+        if isinstance(response, c2b.C2BResponse):
+            response = response.get_response()
+        if isinstance(response, c2b.C2BResponsePain):
+            items = response.get_payments()
+        else:
+            items = response.get_transactions()
+        return self._apply(response, items)
+
+    def _apply(self, response, items):
+        result = ReconciliationResult()
+        with self.connection:
+            for item in items:
+                end_to_end_id, instr_id = _feedback_ids(item)
+                values = _feedback_values(response, item)
+                cursor = self.connection.execute(
+                            _UPDATE + "end_to_end_id = ?",
+                            values + (end_to_end_id,))
+                if cursor.rowcount == 0 and instr_id is not None:
+                    cursor = self.connection.execute(
+                                _UPDATE + "instr_id = ?",
+                                values + (instr_id,))
+                if cursor.rowcount:
+                    result.matched += 1
+                else:
+                    result.unmatched_feedback.append(item)
+            if (response._response_type == 'pain' and
+                    response._grp_sts == 'RJCT' and
+                    response._orgnl_msg_id is not None):
+                # Rejection of whole message doesn't list transactions.
+                cursor = self.connection.execute(
+                            _UPDATE + "msg_id = ? AND status IS NULL",
+                            ('RJCT', response._sts_cd,
+                             response._addtl_sts_rsn_inf, None,
+                             response._hdr_msg_id, response._orgnl_msg_id))
+                result.group_rejected = cursor.rowcount
+        return result
+
+    def unmatched_payments(self, msg_id=None):
+        """ Gets payments that have not received feedback.
+
+        @type  msg_id: string
+        @param msg_id: Limit to one message (optional).
+        @rtype: list<dict>
+        @return: Indexed payments without status.
+        """
+        condition = "WHERE status IS NULL"
+        parameters = ()
+        if msg_id is not None:
+            condition += " AND msg_id = ?"
+            parameters = (msg_id,)
+        cursor = self.connection.execute(
+                    "SELECT * FROM payments " + condition +
+                    " ORDER BY msg_id, end_to_end_id", parameters)
+        return [dict(row) for row in cursor]
+
+    def count(self, status=None):
+        """ Gets number of indexed payments, optionally with given status. """
+        if status is None:
+            return self.connection.execute(
+                        "SELECT COUNT(*) FROM payments").fetchone()[0]
+        return self.connection.execute(
+                    "SELECT COUNT(*) FROM payments WHERE status = ?",
+                    (status,)).fetchone()[0]
+
+
+def _payment_row(msg_id, sepa, tx):
+    """ Gets database row for L{CdtTrfTxInf}. """
+    return (tx._cdt_end_to_end_id, tx._cdt_instr_id, msg_id,
+            sepa._payment_information_id, str(tx._cdt_instd_amt),
+            tx._cdt_instd_amt_curr, tx._cdt_cdtr_acct)
+
+
+def _feedback_ids(item):
+    """ Gets EndToEndId and InstrId of feedback item. """
+    if isinstance(item, c2b.c2bhelper.PmntInfAndStatus):
+        return item._orgnl_end_to_end_id, item._orgnl_instr_id
+    return item._end_to_end_id, item._instr_id
+
+
+def _feedback_values(response, item):
+    """ Gets status, code, info, archive reference and feedback MsgId. """
+    if isinstance(item, c2b.c2bhelper.PmntInfAndStatus):
+        return (item._tx_sts, item._sts_cd, item._sts_addtl_sts_rns_inf,
+                item._orgnl_tx_id, response._hdr_msg_id)
+    return (response._ntry_sts or 'BOOK', None, None, item._acct_svcr_ref,
+            response._hdr_msg_id)
@@ -0,0 +1,240 @@
+'''Recording module records SOAP traffic of WebService and replays it.
+
+RecordingTransport is HTTPSClientCertTransport that writes every WSDL
+download and SOAP request with its reply and timing to a JSON lines file.
+Requests are stored redacted (certificates, signatures and uploaded content,
+see L{payloadlog.render}), they are kept only to show the shape of the
+traffic. Replies are stored as they are, because replaying verifies their
+signatures; the recording holds bank data and must be protected like the
+bank files themselves.
+
+ReplayTransport gives recorded replies back in the recorded order of each
+SOAP action, waiting the recorded duration divided by speed. With speed
+None replies come without delay, which makes deterministic performance
+tests of the client side.
+
+Usage:
+    >>> ws = WebService(sender_id, key, certificate, bank,
+                        http_transport=RecordingTransport('traffic.jsonl'))
+    >>> ws.download_filelist('NEW')
+Later, with the same bank object and ten times faster:
+    >>> ws = WebService(sender_id, key, certificate, bank,
+                        http_transport=ReplayTransport('traffic.jsonl',
+                                                       speed=10))
+    >>> ws.download_filelist('NEW')
+'''
+import base64
+import io
+import json
+import os
+import threading
+import time
+import urllib.parse
+from collections import deque
+
+from suds.transport import Reply, Transport, TransportError
+
+try:
+    from bankws import instrumentation
+    from bankws import payloadlog
+    from bankws.transport import HTTPSClientCertTransport
+except ImportError:
+    import instrumentation
+    import payloadlog
+    from transport import HTTPSClientCertTransport
+
+FORMAT_VERSION = 1
+""" Version of the record format. """
+_KEPT_HEADERS = ('Content-Type',)
+
+
+def _action(request):
+    """ Gets key of SOAP request, SOAPAction or path of the url. """
+    action = (request.headers or {}).get('SOAPAction') or ''
+    if isinstance(action, bytes):
+        action = action.decode('utf-8', 'replace')
+    action = action.strip('"')
+    if action:
+        return action
+    return urllib.parse.urlsplit(request.url).path
+
+
+def read_records(filename):
+    """ Reads records of a recording.
+
+    @type  filename: string
+    @param filename: JSON lines file written by L{RecordingTransport}.
+    @rtype: list<dict>
+    @return: Records in recorded order.
+    @raise ValueError: If file is not a recording of supported version.
+    """
+    records = []
+    with open(filename, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get('format') != FORMAT_VERSION:
+                raise ValueError("Unsupported recording format {0}".format(
+                                 record.get('format')))
+            records.append(record)
+    return records
+
+
+class RecordingTransport(HTTPSClientCertTransport):
+    """ RecordingTransport sends like HTTPSClientCertTransport and appends
+    each exchange to a file.
+
+    @type filename: string
+    @ivar filename: JSON lines file, appended to.
+    @type redact: boolean
+    @ivar redact: Are requests redacted.
+    """
+    def __init__(self, filename, redact=True, *args, **kwargs):
+        HTTPSClientCertTransport.__init__(self, *args, **kwargs)
+        self.filename = filename
+        self.redact = redact
+        self._started = time.time()
+        self._lock = threading.Lock()
+
+    def _write(self, record):
+        record['format'] = FORMAT_VERSION
+        line = json.dumps(record, sort_keys=True)
+        with self._lock:
+            # Only the owner may read, replies contain bank data.
+            fd = os.open(self.filename, os.O_WRONLY | os.O_CREAT | os.O_APPEND,
+                         0o600)
+            with open(fd, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+    def open(self, request):
+        """ Opens url and records the document, e.g. WSDL. """
+        start = time.perf_counter()
+        document = HTTPSClientCertTransport.open(self, request).read()
+        self._write({'kind': 'open',
+                     'url': request.url,
+                     'offset': round(time.time() - self._started, 6),
+                     'duration': time.perf_counter() - start,
+                     'reply': base64.b64encode(document).decode('ascii')})
+        return io.BytesIO(document)
+
+    def send(self, request):
+        """ Sends request and records it with the reply. """
+        offset = time.time() - self._started
+        start = time.perf_counter()
+        error = None
+        try:
+            result = HTTPSClientCertTransport.send(self, request)
+        except TransportError as e:
+            error, result = e, None
+        duration = time.perf_counter() - start
+        message = request.message or b''
+        record = {'kind': 'send',
+                  'url': request.url,
+                  'action': _action(request),
+                  'offset': round(offset, 6),
+                  'duration': duration,
+                  'request_size': len(message),
+                  'request': payloadlog.render(message, redact=self.redact)}
+        if error is not None:
+            record.update({'status': getattr(error, 'httpcode', None),
+                           'error': str(error)})
+        elif result is None:
+            record['status'] = None
+        else:
+            headers = result.headers or {}
+            record.update({'status': result.code,
+                           'headers': dict((name, headers[name])
+                                           for name in _KEPT_HEADERS
+                                           if headers.get(name)),
+                           'reply': base64.b64encode(
+                                        result.message).decode('ascii')})
+        self._write(record)
+        if error is not None:
+            raise error
+        return result
+
+
+class ReplayTransport(Transport):
+    """ ReplayTransport answers from a recording instead of the network.
+
+    @type speed: float
+    @ivar speed: Recorded durations are divided by speed, None for no
+                 waiting.
+    @type loop: boolean
+    @ivar loop: Start replies of an action from the beginning when they run
+                out, otherwise TransportError is raised.
+    """
+    def __init__(self, filename, speed=1.0, loop=False):
+        """
+        @type  filename: string
+        @param filename: JSON lines file written by L{RecordingTransport}.
+        @type  speed: float
+        @param speed: 1.0 for recorded speed, 10 for ten times faster and
+                      None for no waiting.
+        @type  loop: boolean
+        @param loop: Replay replies of an action again when they run out.
+        @raise ValueError: If speed is not positive.
+        """
+        Transport.__init__(self)
+        if speed is not None and speed <= 0:
+            raise ValueError("Speed must be positive")
+        self.speed = speed
+        self.loop = loop
+        self._documents = {}
+        self._records = {}
+        self._replies = {}
+        self._lock = threading.Lock()
+        for record in read_records(filename):
+            if record['kind'] == 'open':
+                self._documents[record['url']] = record
+            else:
+                self._records.setdefault(record['action'], []).append(record)
+        for action, records in self._records.items():
+            self._replies[action] = deque(records)
+
+    def _wait(self, record):
+        if self.speed is not None:
+            time.sleep(record['duration'] / self.speed)
+
+    def _document(self, url):
+        record = self._documents.get(url)
+        if record is None:
+            # Recorded from another host, e.g. a mock bank on other port.
+            path = urllib.parse.urlsplit(url).path
+            for other, candidate in self._documents.items():
+                if urllib.parse.urlsplit(other).path == path:
+                    return candidate
+        return record
+
+    def open(self, request):
+        """ Gets recorded document of url. """
+        record = self._document(request.url)
+        if record is None:
+            raise TransportError("No recording of {0}".format(request.url),
+                                 404)
+        self._wait(record)
+        return io.BytesIO(base64.b64decode(record['reply']))
+
+    def send(self, request):
+        """ Gets next recorded reply of the SOAP action of request. """
+        action = _action(request)
+        with self._lock:
+            replies = self._replies.get(action)
+            if not replies and self.loop and action in self._records:
+                replies = self._replies[action] = deque(self._records[action])
+            if not replies:
+                raise TransportError("No recorded reply for {0}".format(
+                                     action), 404)
+            record = replies.popleft()
+        with instrumentation.stage('http',
+                                   size_in=len(request.message or b'')) \
+                as event:
+            self._wait(record)
+            if 'error' in record:
+                raise TransportError(record['error'], record['status'])
+            if record['status'] is None:
+                return None
+            reply = base64.b64decode(record['reply'])
+            event.size_out = len(reply)
+        return Reply(record['status'], record.get('headers', {}), reply)
@@ -3,11 +3,28 @@ class for different kind xml-requests.
 '''
 import base64
 
+try:
+    from bankws import instrumentation
+    from bankws import signature
+except ImportError:
+    import instrumentation
+    import signature
+
 
 class Request:
     '''
     Baseclass for request objects.
+
+    @type signer: L{signingservice.SigningService}
+    @ivar signer: Signs the request in worker processes when set. Signing
+                  runs in the background and the text attribute waits for
+                  it.
+    @type algorithm: string
+    @ivar algorithm: Signature algorithm, sha1 or sha256.
     '''
+    signer = None
+    algorithm = 'sha1'
+
     def __init__(self, id_, environment):
         '''
         Constructor
@@ -32,6 +49,46 @@ class Request:
         except AttributeError:
             return None
 
+    @property
+    def text(self):
+        """ Signed request, waits for the signer if it is still signing.
+
+        @raise AttributeError: If no message has been generated.
+        @raise IOError: If the signer can't read key or certificate.
+        @raise ValueError: If key is in unsupported format.
+        """
+        pending = self.__dict__.get('_pending')
+        if pending is not None:
+            with instrumentation.stage('sign_request') as event:
+                self._text = pending.result()
+                self._pending = None
+                event.size_out = len(self._text)
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        self._pending = None
+        self._text = value
+
+    def _sign(self, message):
+        """
+        Signs message with key and certificate attributes of subclass and
+        saves it to text attribute. With a signer the message is only given
+        to it.
+
+        @type  message: string
+        @param message: ApplicationRequest xml.
+        """
+        if self.signer is not None:
+            self._text = None
+            self._pending = self.signer.submit(message, self.algorithm)
+            return
+        with instrumentation.stage('sign_request',
+                                   size_in=len(message)) as event:
+            self.text = signature.sign(message, self.key, self.certificate,
+                                       algorithm=self.algorithm)
+            event.size_out = len(self.text)
+
     def __str__(self):
         try:
             return self.text.decode('utf-8')
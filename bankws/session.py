@@ -0,0 +1,187 @@
+'''Session module loads what web service calls need once, in the parent of
+prefork worker processes, so that forked workers share it copy-on-write
+instead of loading it again.
+
+Preloaded are the suds client with the parsed WSDL and the signing plugin,
+the private key and certificate, compiled XML schemas, the index of the
+certificate revocation list and the SSL context of the transport. After a
+fork only the state that must not be shared is renewed: the transport
+forgets connection state of the parent and random number generators are
+reseeded. This happens by itself with os.fork (multiprocessing, gunicorn,
+uWSGI with lazy-apps off); other prefork servers call L{after_fork} in
+their post fork hook.
+
+Usage:
+    >>> session = Session(bank, private_key, certificate).preload()
+    # Fork workers, then in a worker:
+    >>> ws = session.webservice(sender_id)
+    >>> ws.download_filelist('NEW')
+'''
+import gc
+import logging
+import os
+import sys
+import threading
+import weakref
+
+try:
+    from bankws import appresponse
+    from bankws import c2b
+    from bankws import certificate as certificates
+    from bankws import cryptobackend
+    from bankws import signature
+    from bankws import transport
+    from bankws.webservice import WebService, build_client
+except ImportError:
+    import appresponse
+    import c2b
+    import certificate as certificates
+    import cryptobackend
+    import signature
+    import transport
+    from webservice import WebService, build_client
+
+log = logging.getLogger("bankws")
+_sessions = weakref.WeakSet()
+
+
+class Session():
+    """ Session keeps one suds client and the credentials of a bank
+    connection.
+
+    Suds clients are not thread safe: WebServices of a session share its
+    client, so use them from one thread of a process at a time.
+
+    @type bank: L{Bank}
+    @ivar bank: Bank of the session.
+    @type private_key: string
+    @ivar private_key: Private key filename.
+    @type certificate: string
+    @ivar certificate: Certificate filename.
+    @type environment: string
+    @ivar environment: TEST or PRODUCTION.
+    @type algorithm: string
+    @ivar algorithm: Signature algorithm, sha1 or sha256.
+    """
+    def __init__(self, bank, private_key, certificate, environment="TEST",
+                 http_transport=None, algorithm='sha1'):
+        """
+        @type  bank: L{Bank}
+        @param bank: Object containing needed data for banks web service.
+        @type  private_key: string
+        @param private_key: Private key filename.
+        @type  certificate: string
+        @param certificate: Certificate filename.
+        @type  environment: string
+        @param environment: TEST or PRODUCTION
+        @type  http_transport: L{suds.transport.Transport}
+        @param http_transport: Transport of SOAP requests, defaults to
+                               L{transport.HTTPSClientCertTransport}.
+        @type  algorithm: string
+        @param algorithm: Signature algorithm of requests and envelopes,
+                          sha1 or sha256.
+        @raise ValueError: If environment or algorithm is unknown.
+        """
+        env = environment.upper()
+        if not env in ["TEST", "PRODUCTION"]:
+            raise ValueError("Unsupported environment value.")
+        if algorithm not in cryptobackend.SIGNATURE_URIS:
+            raise ValueError("Unsupported algorithm {0}".format(algorithm))
+        self.bank = bank
+        self.private_key = private_key
+        self.certificate = certificate
+        self.environment = env
+        self.algorithm = algorithm
+        self._transport = http_transport
+        self._client = None
+        self._lock = threading.Lock()
+        _sessions.add(self)
+
+    @property
+    def client(self):
+        """ Suds client, made on first use.
+
+        @raise ValueError: If bank is invalid or key or certificate can't be
+                           loaded.
+        """
+        with self._lock:
+            if self._client is None:
+                self._client = build_client(self.bank, self.private_key,
+                                            self.certificate,
+                                            self.environment,
+                                            self._transport,
+                                            algorithm=self.algorithm)
+            return self._client
+
+    def preload(self, freeze=False):
+        """ Loads everything the operations need.
+
+        @type  freeze: boolean
+        @param freeze: Move all objects of the process to the permanent
+                       generation of the garbage collector (gc.freeze), so
+                       collections in workers don't write to the shared
+                       pages. Call right before forking.
+        @rtype: L{Session}
+        @return: The session itself.
+        @raise ValueError: If bank is invalid or key or certificate can't be
+                           loaded.
+        """
+        client = self.client
+        signature.load_private_key(self.private_key)
+        signature.load_certificate(self.certificate)
+        appresponse.get_schema()
+        c2b.get_schema()
+        if certificates.revoked_serials() is None:
+            log.warning("Certificate revocation list is not available.")
+        if isinstance(client.options.transport,
+                      transport.HTTPSClientCertTransport):
+            transport.ssl_context()
+        if freeze and hasattr(gc, 'freeze'):
+            gc.freeze()
+        return self
+
+    def webservice(self, sender_id, language="FI", instruments=None,
+                   signer=None):
+        """ Gets WebService using the client of the session.
+
+        @type  sender_id: string
+        @param sender_id: Senders id
+        @type  language: string
+        @param language: FI, SV or EN
+        @type  instruments: list<L{instrumentation.Instrument}>
+        @param instruments: Instruments getting the stages of operations.
+        @type  signer: L{signingservice.SigningService}
+        @param signer: Signs ApplicationRequests in worker processes, started
+                       by the worker after the fork.
+        @rtype: L{WebService}
+        """
+        return WebService(sender_id, self.private_key, self.certificate,
+                          self.bank, self.environment, language, instruments,
+                          session=self, signer=signer,
+                          algorithm=self.algorithm)
+
+    def after_fork(self):
+        """ Renews state that a forked child must not share with its
+        parent. """
+        self._lock = threading.Lock()
+        if self._client is not None:
+            after_fork = getattr(self._client.options.transport,
+                                 'after_fork', None)
+            if after_fork is not None:
+                after_fork()
+
+
+def after_fork():
+    """ Renews sockets of all sessions and reseeds random number generators
+    in a forked child. Called by os.fork, call yourself if a prefork server
+    forks otherwise. """
+    random = sys.modules.get('Crypto.Random')
+    if random is not None and hasattr(random, 'atfork'):
+        # PyCrypto refuses to make random numbers until reseeded.
+        random.atfork()
+    for session in list(_sessions):
+        session.after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=after_fork)
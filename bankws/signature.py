@@ -11,28 +11,36 @@ To verify signature:
 
 To sign xml message:
 >>> signed_xml = sign(xml_string,"private_key.pem","certificate.x509")
+Or with RSA-SHA256 and SHA-256 digests:
+>>> signed_xml = sign(xml_string, "private_key.pem", "certificate.x509",
+                      algorithm='sha256')
+
+Validation uses the algorithms named in SignedInfo, rsa-sha1 and sha1 or
+rsa-sha256 and sha256. RSA is done by the backend of module cryptobackend.
 
 Xml signing. http://www.w3.org/TR/xmldsig-core/
 Needed external libraries:
     - LXML
-    - PyCrypto
-    - PyOpenSSL >0.12
+    - cryptography, or PyCrypto and PyOpenSSL >0.12
+    - PyOpenSSL >0.12 for the certificate revocation check
+The crypto libraries are imported by the functions needing them, so
+importing the module stays cheap for code that only parses messages.
 """
 from io import StringIO, BytesIO
 import base64
 import hashlib
 import logging
+import os
+import threading
 
-import Crypto.PublicKey.RSA as RSA
-import Crypto.Hash.SHA as SHA
-from Crypto.Signature import PKCS1_v1_5
 from lxml.builder import ElementMaker
 from lxml import etree
-import OpenSSL
 
 try:
+    from bankws import cryptobackend
     from bankws.certificate import check_revocation_status
 except ImportError:
+    import cryptobackend
     from certificate import check_revocation_status
 # Generate needed xml elements.
 E = ElementMaker(namespace="http://www.w3.org/2000/09/xmldsig#",
@@ -52,6 +60,10 @@ KEYINFO = E.KeyInfo
 X509DATA = E.X509Data
 X509CERTIFICATE = E.X509Certificate
 
+# Contents of key and certificate files by filename.
+_credentials = {}
+_credentials_lock = threading.Lock()
+
 
 def validate(xml_string):
     """
@@ -78,6 +90,8 @@ def validate(xml_string):
         return False
 
     digestvalues = {}
+    digestmethods = {}
+    signaturemethod = cryptobackend.RSA_SHA1
     signed_info = None
     signaturevalue = None
 
@@ -85,10 +99,16 @@ def validate(xml_string):
         if element.tag == "{http://www.w3.org/2000/09/xmldsig#}DigestValue":
             key = element.getparent().get('URI')
             digestvalues[key] = element.text
+        if element.tag == "{http://www.w3.org/2000/09/xmldsig#}DigestMethod":
+            key = element.getparent().get('URI')
+            digestmethods[key] = element.get('Algorithm')
+        if element.tag == ("{http://www.w3.org/2000/09/xmldsig#}"
+                           "SignatureMethod"):
+            signaturemethod = element.get('Algorithm')
         if element.tag == "{http://www.w3.org/2000/09/xmldsig#}SignedInfo":
             signed_info = element
         if element.tag == "{http://www.w3.org/2000/09/xmldsig#}SignatureValue":
-            log.debug("{0}: {1}".format(element.tag, element.text))
+            log.debug("%s: %s", element.tag, element.text)
             signaturevalue = element.text
 
     # Get certificate from xml string
@@ -106,6 +126,11 @@ def validate(xml_string):
         log.error("SignedInfo is missing.")
         return False
 
+    signature_algorithm = cryptobackend.SIGNATURE_METHODS.get(signaturemethod)
+    if signature_algorithm is None:
+        log.error("Unsupported SignatureMethod %s", signaturemethod)
+        return False
+
     # Values are base64 encoded so decode them
     certificate_data = base64.b64decode(bytes(certificate, 'utf-8'))
     signaturevalue = base64.b64decode(bytes(signaturevalue, 'utf-8'))
@@ -126,17 +151,24 @@ def validate(xml_string):
     #Calculate digests.
     for key, value in digestvalues.items():
         digest_value = ""
+        method = digestmethods.get(key) or cryptobackend.SHA1
+        digest_algorithm = cryptobackend.DIGEST_METHODS.get(method)
+        if digest_algorithm is None:
+            log.error("Unsupported DigestMethod %s", method)
+            return False
         if key == "":  # Whole document is used
             tree.remove(signature)
             xmlstring = str(etree.tostring(tree), 'utf-8')
-            digest = calculate_digest(xmlstring, exclusive, comments)
+            digest = calculate_digest(xmlstring, exclusive, comments,
+                                      digest_algorithm)
             digest_value = str(base64.b64encode(digest.digest()), 'utf-8')
         else:
             result = tree.xpath("//*[@wsu:Id='" + key[1:] + "']",
                                 namespaces=tree.nsmap)
             if len(result) == 1:
                 xmlstring = str(etree.tostring(result[0]), 'utf-8')
-                digest = calculate_digest(xmlstring, exclusive, comments)
+                digest = calculate_digest(xmlstring, exclusive, comments,
+                                          digest_algorithm)
                 digest_value = str(base64.b64encode(digest.digest()), 'utf-8')
 
         if digest_value != value:
@@ -151,27 +183,21 @@ def validate(xml_string):
         log.error("Unsupported certificate format.")
         return False
 
-    # Generate certificate object from data found on x509data
-    filetype = OpenSSL.crypto.FILETYPE_ASN1
+    # Verify signature with certificate found on x509data
     try:
-        cert = OpenSSL.crypto.load_certificate(filetype, certificate_data)
-    except OpenSSL.crypto.Error as e:
-        log.exception(e)
-        return False
-
-    # Verify signature
-    try:
-        OpenSSL.crypto.verify(
-            cert, signaturevalue, bytes(canonicalizated_info, 'utf-8'), 'sha1'
-            )
-    except OpenSSL.crypto.Error as e:
+        valid = cryptobackend.get_backend().verify(
+                    certificate_data, signaturevalue,
+                    bytes(canonicalizated_info, 'utf-8'), signature_algorithm)
+    except ValueError as e:
         log.exception(e)
         return False
-
-    return True
+    if not valid:
+        log.error("Signature value doesn't match.")
+    return valid
 
 
-def sign(xml_string, private_key, certificate, xml_declaration_=False):
+def sign(xml_string, private_key, certificate, xml_declaration_=False,
+         algorithm='sha1'):
     """
     Signs xml message with dsig algorithm.
 
@@ -183,10 +209,14 @@ def sign(xml_string, private_key, certificate, xml_declaration_=False):
     @param certificate: Name of the file containing X509v3 certificate.
     @type  xml_declaration_: boolean
     @param xml_declaration:  Add xml declaration to xml string.
+    @type  algorithm: string
+    @param algorithm: Digest of the signature and the reference, sha1 or
+                      sha256.
     @rtype: string
     @return: Xml string signed with private key.
     @raise IOError: In case of failing open private key or certificate file.
-    @raise ValueError: In case of private key being in unsupported format.
+    @raise ValueError: In case of private key being in unsupported format or
+                       unsupported algorithm.
     """
     # Test that xml can be parsed.
     try:
@@ -194,7 +224,8 @@ def sign(xml_string, private_key, certificate, xml_declaration_=False):
     except etree.XMLSyntaxError:
         raise RuntimeError("Malformatted xml string")
     xml_string = str(etree.tostring(e), 'utf-8')
-    signature = generate_xml_signature(xml_string, private_key, certificate)
+    signature = generate_xml_signature(xml_string, private_key, certificate,
+                                       algorithm)
     e.append(signature)
     return etree.tostring(e,
                           xml_declaration=xml_declaration_,
@@ -257,24 +288,86 @@ def canonicalizate_message(xml_string, exclusive_=False, comments_=False):
     return message
 
 
-def calculate_digest(xml_string, exclusive_=False, comments_=False):
+def calculate_digest(xml_string, exclusive_=False, comments_=False,
+                     algorithm='sha1'):
     """
     Calculates message digest for signing
 
     @type xml_string: string
     @param xml_string: Xml text
+    @type  algorithm: string
+    @param algorithm: sha1 or sha256
     @rtype: L{Digest}
-    @return: sha-1 digest of the message
+    @return: Digest of the message
     """
     message = canonicalizate_message(xml_string, exclusive_, comments_)
-    digest = hashlib.sha1(bytes(message, 'utf-8'))
+    digest = hashlib.new(algorithm, bytes(message, 'utf-8'))
     return digest
 
 
+def _read(filename):
+    """ Reads file, cached until the file changes.
+
+    @raise IOError: If the file can't be read.
+    @rtype: tuple(bytes, dict)
+    @return: Content and dictionary for values derived from it.
+    """
+    try:
+        stat = os.stat(filename)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with _credentials_lock:
+            cached = _credentials.get(filename)
+            if cached is None or cached[0] != version:
+                with open(filename, 'rb') as f:
+                    cached = (version, f.read(), {})
+                _credentials[filename] = cached
+    except EnvironmentError as e:
+        logging.getLogger('bankws').exception(e)
+        raise IOError("Failed to open file {0}".format(filename))
+    return cached[1], cached[2]
+
+
+def load_certificate(filename):
+    """
+    Reads certificate file once per process, again only if it changes.
+
+    @type  filename: string
+    @param filename: X509v3 certificate filename.
+    @rtype: bytes
+    @return: Certificate as it is in the file.
+    @raise IOError: If the file can't be read.
+    """
+    return _read(filename)[0]
+
+
+def load_private_key(filename):
+    """
+    Imports RSA private key once per process and backend, again only if the
+    file changes.
+
+    @type  filename: string
+    @param filename: Private RSA-key filename.
+    @rtype: object
+    @return: Key of the current L{cryptobackend.Backend}.
+    @raise IOError: If the file can't be read.
+    @raise ValueError: If the backend can't import the key.
+    """
+    backend = cryptobackend.get_backend()
+    content, derived = _read(filename)
+    key = derived.get(backend.name)
+    if key is None:
+        try:
+            key = derived[backend.name] = backend.load_private_key(content)
+        except ValueError as e:
+            logging.getLogger('bankws').exception(e)
+            raise
+    return key
+
+
 def calculate_signature_value(xml_string, private_key, exclusive_=False,
-                              comments_=False):
+                              comments_=False, algorithm='sha1'):
     """
-    Calculates rsa-sha1 signaturevalue for signed xml
+    Calculates RSA signaturevalue for signed xml
 
     @type  xml_string: bytes or string
     @param xml_string: Signed info element as a string.
@@ -284,36 +377,24 @@ def calculate_signature_value(xml_string, private_key, exclusive_=False,
     @param exclusive_: Use exclusive canonicalization
     @type  comments_: boolean
     @param comments_: Use with_comments-style canonicalization.
+    @type  algorithm: string
+    @param algorithm: sha1 for rsa-sha1 or sha256 for rsa-sha256.
     @raise IOError: If the private key can't be read from file.
-    @raise ValueError: If PyCrypto can't import RSA-key
+    @raise ValueError: If the backend can't import RSA-key or algorithm is
+                       unsupported.
     @rtype: string
     @return: Calculated signaturevalue as a raw string.
     """
-    log = logging.getLogger('bankws')
     canonicalizated_info = canonicalizate_message(xml_string,
                                                   exclusive_,
                                                   comments_)
+    pkey = load_private_key(private_key)
+    return cryptobackend.get_backend().sign(
+                pkey, canonicalizated_info.encode('utf-8'), algorithm)
 
-    try:
-        with open(private_key, 'rb') as f:
-            content = f.read()
-    except EnvironmentError as e:
-        log.exception(e)
-        raise IOError("Failed to open file {0}".format(private_key))
 
-    try:
-        pkey = RSA.importKey(content)
-    except ValueError as e:
-        log.exception(e)
-        raise
-
-    info_digest = SHA.new(canonicalizated_info.encode('utf-8'))
-    signer = PKCS1_v1_5.new(pkey)
-    signaturevalue = signer.sign(info_digest)
-    return signaturevalue
-
-
-def generate_xml_signature(xml_string, private_key, X509certificate):
+def generate_xml_signature(xml_string, private_key, X509certificate,
+                           algorithm='sha1'):
     """ Generates xml signature
 
     @type  xml_string: String
@@ -322,32 +403,34 @@ def generate_xml_signature(xml_string, private_key, X509certificate):
     @param X509certificate: Certificate filename
     @type  private_key: string
     @param private_key: RSA private key filename
+    @type  algorithm: string
+    @param algorithm: sha1 or sha256
     @raise IOError: In case of failing open private key or certificate file.
-    @raise ValueError: In case of private key being in unsupported format.
+    @raise ValueError: In case of private key being in unsupported format or
+                       unsupported algorithm.
     @rtype: L{lxml.etree._Element}
     @return: Signature element.
     """
     log = logging.getLogger('bankws')
     log.info("Generating signature.")
+    if algorithm not in cryptobackend.SIGNATURE_URIS:
+        raise ValueError("Unsupported algorithm {0}".format(algorithm))
     # Canonicalization algorithms
     C14NWITHCOMMENTS = ("http://www.w3.org/TR/2001/REC-xml-c14n-20010315"
                         "#WithComments")
-    # Signature algorithms
-    RSASHA1 = "http://www.w3.org/2000/09/xmldsig#rsa-sha1"
     # Transform algorithms
     ENVELOPED = "http://www.w3.org/2000/09/xmldsig#enveloped-signature"
-    # Digest algorithms
-    SHA1 = "http://www.w3.org/2000/09/xmldsig#sha1"
-    digest = calculate_digest(xml_string, comments_=True)
+    digest = calculate_digest(xml_string, comments_=True,
+                              algorithm=algorithm)
     info = \
     SIGNEDINFO(
         CANONICALIZATIONMETHOD(Algorithm=C14NWITHCOMMENTS),
-        SIGNATUREMETHOD(Algorithm=RSASHA1),
+        SIGNATUREMETHOD(Algorithm=cryptobackend.SIGNATURE_URIS[algorithm]),
         REFERENCE(
             TRANSFORMS(
                 TRANSFORM(Algorithm=ENVELOPED)
             ),
-            DIGESTMETHOD(Algorithm=SHA1),
+            DIGESTMETHOD(Algorithm=cryptobackend.DIGEST_URIS[algorithm]),
             DIGESTVALUE(str(base64.b64encode(digest.digest()), 'utf-8')),
             URI=""
         ),
@@ -359,18 +442,13 @@ def generate_xml_signature(xml_string, private_key, X509certificate):
     tree.append(info)
 
     info_message = str(etree.tostring(info), 'utf-8')
-    log.debug("Signature Info part: {0}".format(info_message))
+    log.debug("Signature Info part: %s", info_message)
     signaturevalue = calculate_signature_value(info_message,
                                                private_key,
-                                               comments_=True)
-
-    try:
-        with open(X509certificate, 'rb') as f:
-            content = f.read()
-    except EnvironmentError as e:
-        log.exception(e)
-        raise IOError("Failed to open file {0}".format(X509certificate))
+                                               comments_=True,
+                                               algorithm=algorithm)
 
+    content = load_certificate(X509certificate)
     signature = \
     DOC(
         SIGNATUREVALUE(str(base64.b64encode(signaturevalue), 'utf-8')),
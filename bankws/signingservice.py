@@ -0,0 +1,189 @@
+'''Signingservice module signs ApplicationRequests and SOAP envelopes in a
+pool of worker processes that have the private key loaded.
+
+Signing (canonicalization and RSA) is CPU bound and holds the GIL, so one
+process signs at most one request at a time however many threads upload or
+download. With a
+SigningService the signatures are made in the workers: threads of the
+process run meanwhile, and many requests are signed in parallel.
+
+Usage:
+Batch of requests, in order:
+    >>> with SigningService(private_key, certificate, processes=4) as signer:
+            signed = signer.sign_many(messages)
+Futures:
+    >>> future = signer.submit(message)
+    >>> signed = future.result()
+WebService signs ApplicationRequests and envelopes with the service, and
+download_files signs the requests of the next files while downloading:
+    >>> ws = WebService(sender_id, private_key, certificate, bank,
+                        signer=signer)
+    >>> for reference, response in ws.download_files(references):
+            save(reference, response.content)
+'''
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from bankws import cryptobackend
+    from bankws import signature
+except ImportError:
+    import cryptobackend
+    import signature
+
+# Key and certificate filenames of a worker process.
+_worker = {}
+
+
+def _init_worker(private_key, certificate, backend):
+    """ Worker: loads backend, key and certificate once. """
+    cryptobackend.set_backend(backend)
+    signature.load_private_key(private_key)
+    signature.load_certificate(certificate)
+    _worker['private_key'] = private_key
+    _worker['certificate'] = certificate
+
+
+def _sign(message, algorithm):
+    """ Worker: signs ApplicationRequest. """
+    return signature.sign(message, _worker['private_key'],
+                          _worker['certificate'], algorithm=algorithm)
+
+
+def _sign_value(signed_info, exclusive_, comments_, algorithm):
+    """ Worker: calculates SignatureValue of SignedInfo. """
+    return signature.calculate_signature_value(signed_info,
+                                               _worker['private_key'],
+                                               exclusive_, comments_,
+                                               algorithm)
+
+
+class SigningService():
+    """ SigningService signs with one key and certificate in worker
+    processes.
+
+    @type private_key: string
+    @ivar private_key: RSA private key filename.
+    @type certificate: string
+    @ivar certificate: X509 certificate filename.
+    @type algorithm: string
+    @ivar algorithm: sha1 or sha256, used when not given to the methods.
+    """
+    def __init__(self, private_key, certificate, processes=None,
+                 algorithm='sha1', backend=None, mp_context=None):
+        """
+        @type  private_key: string
+        @param private_key: RSA private key filename.
+        @type  certificate: string
+        @param certificate: X509 certificate filename.
+        @type  processes: int
+        @param processes: Number of worker processes (default: number of
+                          CPUs).
+        @type  algorithm: string
+        @param algorithm: sha1 or sha256
+        @type  backend: string
+        @param backend: Name of the crypto backend of the workers, see
+                        L{cryptobackend.set_backend}. Default is the backend
+                        of this process.
+        @type  mp_context: L{multiprocessing.context.BaseContext}
+        @param mp_context: Start method of the workers, e.g.
+                           multiprocessing.get_context('spawn') when the
+                           process has threads.
+        @raise IOError: If key or certificate can't be read.
+        @raise ValueError: If key or algorithm is unsupported.
+        """
+        if algorithm not in cryptobackend.SIGNATURE_URIS:
+            raise ValueError("Unsupported algorithm {0}".format(algorithm))
+        if backend is None:
+            backend = cryptobackend.get_backend().name
+        elif backend not in cryptobackend.BACKENDS:
+            raise ValueError("Unknown crypto backend {0}".format(backend))
+        # Fail here rather than in every worker.
+        signature.load_private_key(private_key)
+        signature.load_certificate(certificate)
+        self.private_key = os.path.abspath(private_key)
+        self.certificate = os.path.abspath(certificate)
+        self.algorithm = algorithm
+        self.processes = processes or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(
+                            self.processes, mp_context=mp_context,
+                            initializer=_init_worker,
+                            initargs=(self.private_key, self.certificate,
+                                      backend))
+
+    def submit(self, message, algorithm=None):
+        """ Signs ApplicationRequest in a worker, see L{signature.sign}.
+
+        @type  message: string
+        @param message: ApplicationRequest xml.
+        @type  algorithm: string
+        @param algorithm: sha1 or sha256, algorithm of the service by default.
+        @rtype: L{concurrent.futures.Future}
+        @return: Future of the signed xml (bytes).
+        """
+        return self._executor.submit(_sign, message,
+                                     algorithm or self.algorithm)
+
+    def sign(self, message, algorithm=None):
+        """ Signs ApplicationRequest and waits for the result.
+
+        @rtype: bytes
+        @raise IOError: If the worker can't read key or certificate.
+        @raise ValueError: If key is in unsupported format.
+        """
+        return self.submit(message, algorithm).result()
+
+    def sign_many(self, messages, algorithm=None, chunksize=None):
+        """ Signs ApplicationRequests in the workers.
+
+        @type  messages: list<string>
+        @param messages: ApplicationRequest xmls.
+        @type  algorithm: string
+        @param algorithm: sha1 or sha256, algorithm of the service by default.
+        @type  chunksize: int
+        @param chunksize: Messages sent to a worker at once, by default a
+                          quarter of the messages per worker.
+        @rtype: list<bytes>
+        @return: Signed xmls in the order of messages.
+        """
+        messages = list(messages)
+        if chunksize is None:
+            chunksize = max(1, len(messages) // (self.processes * 4))
+        algorithms = [algorithm or self.algorithm] * len(messages)
+        return list(self._executor.map(_sign, messages, algorithms,
+                                       chunksize=chunksize))
+
+    def submit_value(self, signed_info, exclusive_=False, comments_=False,
+                     algorithm=None):
+        """ Calculates SignatureValue of SignedInfo in a worker, see
+        L{signature.calculate_signature_value}.
+
+        @rtype: L{concurrent.futures.Future}
+        @return: Future of the raw signature value (bytes).
+        """
+        return self._executor.submit(_sign_value, signed_info, exclusive_,
+                                     comments_, algorithm or self.algorithm)
+
+    def calculate_signature_value(self, signed_info, exclusive_=False,
+                                  comments_=False, algorithm=None):
+        """ Calculates SignatureValue of SignedInfo and waits for it, e.g.
+        for SignerPlugin.
+
+        @rtype: bytes
+        """
+        return self.submit_value(signed_info, exclusive_, comments_,
+                                 algorithm).result()
+
+    def shutdown(self, wait=True):
+        """ Stops the workers.
+
+        @type  wait: boolean
+        @param wait: Wait for pending signatures.
+        """
+        self._executor.shutdown(wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
@@ -0,0 +1,220 @@
+'''Transactionarchive module stores parsed "Tapahtumaotekysely" transactions
+to an indexed SQLite database.
+
+Transactions are deduplicated on archive id, so the same statement can be
+ingested many times. Raw records are stored so lookups return the same
+L{Transaction} objects that TransactionListResponse gives.
+
+Usage:
+    >>> archive = TransactionArchive('transactions.db')
+    >>> archive.ingest(webservice.transaction_query(account))
+    >>> archive.by_reference('1232')
+    >>> archive.by_account('57200020004440', date(2013, 1, 1),
+                           date(2013, 1, 31))
+    >>> archive.close()
+'''
+import sqlite3
+
+try:
+    from bankws.transactionlistresponse import (TransactionListResponse,
+                                                TransactionBasicRecord,
+                                                TransactionExtraRecord,
+                                                Transaction)
+except ImportError:
+    from transactionlistresponse import (TransactionListResponse,
+                                         TransactionBasicRecord,
+                                         TransactionExtraRecord,
+                                         Transaction)
+
+DATE_FIELDS = ('registration_date', 'value_date', 'payment_date')
+""" Date columns that can be used in range lookups. """
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    archive_id TEXT PRIMARY KEY,
+    account TEXT NOT NULL,
+    registration_date TEXT,
+    value_date TEXT,
+    payment_date TEXT,
+    amount_cents INTEGER NOT NULL,
+    code TEXT,
+    reference TEXT,
+    record TEXT NOT NULL,
+    extras TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_reference
+    ON transactions (reference);
+CREATE INDEX IF NOT EXISTS transactions_account_registration_date
+    ON transactions (account, registration_date);
+CREATE INDEX IF NOT EXISTS transactions_account_value_date
+    ON transactions (account, value_date);
+CREATE INDEX IF NOT EXISTS transactions_account_payment_date
+    ON transactions (account, payment_date);
+CREATE INDEX IF NOT EXISTS transactions_amount
+    ON transactions (amount_cents);
+"""
+
+_INSERT = ("INSERT OR IGNORE INTO transactions (archive_id, account, "
+           "registration_date, value_date, payment_date, amount_cents, code, "
+           "reference, record, extras) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+_SELECT = "SELECT record, extras FROM transactions "
+
+
+class TransactionArchive():
+    """ TransactionArchive is an indexed store of transactions.
+
+    @type connection: L{sqlite3.Connection}
+    @ivar connection: Database connection.
+    """
+    def __init__(self, filename=':memory:'):
+        """ Opens or creates archive.
+
+        @type  filename: string
+        @param filename: SQLite database filename.
+        """
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Closes database connection. """
+        self.connection.close()
+
+    def ingest(self, responses):
+        """ Stores transactions of parsed statements.
+
+        Transactions whose archive id is already stored are skipped.
+
+        @type  responses: L{TransactionListResponse} or iterable of them
+        @param responses: Parsed statements.
+        @rtype: int
+        @return: Number of new transactions stored.
+        """
+        if isinstance(responses, TransactionListResponse):
+            responses = [responses]
+        before = self.connection.total_changes
+        with self.connection:
+            for response in responses:
+                if not response.transactions:
+                    continue
+                account = response.basic_record.account
+                self.connection.executemany(_INSERT, (
+                        _row(account, transaction)
+                        for transaction in response.transactions))
+        return self.connection.total_changes - before
+
+    def get(self, archive_id):
+        """ Gets transaction by archive id.
+
+        @type  archive_id: string
+        @param archive_id: Archive id of the transaction.
+        @rtype: L{Transaction} or None
+        @return: Transaction if it is stored.
+        """
+        result = self._query("WHERE archive_id = ?", (archive_id.strip(),))
+        return result[0] if result else None
+
+    def by_reference(self, reference):
+        """ Gets transactions with given reference number.
+
+        @type  reference: string
+        @param reference: Reference number.
+        @rtype: list<L{Transaction}>
+        @return: Transactions in date order.
+        """
+        return self._query("WHERE reference = ? "
+                           "ORDER BY registration_date, archive_id",
+                           (reference.strip(),))
+
+    def by_account(self, account, start=None, end=None,
+                   date_field='registration_date'):
+        """ Gets transactions of account, optionally between dates.
+
+        @type  account: string
+        @param account: Account number as in statement basic record.
+        @type  start: L{datetime.date}
+        @param start: First date included (optional).
+        @type  end: L{datetime.date}
+        @param end: Last date included (optional).
+        @type  date_field: string
+        @param date_field: One of L{DATE_FIELDS}.
+        @rtype: list<L{Transaction}>
+        @return: Transactions in date order.
+        @raise ValueError: If date_field is unknown.
+        """
+        if date_field not in DATE_FIELDS:
+            raise ValueError("Unknown date field {0}".format(date_field))
+        condition = "WHERE account = ?"
+        parameters = [account.strip()]
+        if start is not None:
+            condition += " AND {0} >= ?".format(date_field)
+            parameters.append(start.isoformat())
+        if end is not None:
+            condition += " AND {0} <= ?".format(date_field)
+            parameters.append(end.isoformat())
+        return self._query(condition + " ORDER BY {0}, archive_id".format(
+                                                                date_field),
+                           parameters)
+
+    def by_amount(self, minimum_cents, maximum_cents=None):
+        """ Gets transactions whose amount is in given range.
+
+        @type  minimum_cents: int
+        @param minimum_cents: Smallest signed amount in cents.
+        @type  maximum_cents: int
+        @param maximum_cents: Largest signed amount in cents (defaults to
+                              minimum_cents).
+        @rtype: list<L{Transaction}>
+        @return: Transactions in amount order.
+        """
+        if maximum_cents is None:
+            maximum_cents = minimum_cents
+        return self._query("WHERE amount_cents BETWEEN ? AND ? "
+                           "ORDER BY amount_cents, archive_id",
+                           (minimum_cents, maximum_cents))
+
+    def count(self):
+        """ Gets number of stored transactions. """
+        return self.connection.execute(
+                    "SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def _query(self, condition, parameters):
+        """ Runs select and rebuilds transactions from raw records. """
+        cursor = self.connection.execute(_SELECT + condition, parameters)
+        return [_transaction(record, extras) for record, extras in cursor]
+
+
+def _row(account, transaction):
+    """ Gets database row for L{Transaction}. """
+    record = transaction.transaction
+    return (record.archive_id.strip(), account,
+            _iso_date(record.registration_date),
+            _iso_date(record.value_date),
+            _iso_date(record.payment_date),
+            record.money_cents, record._code, record.reference_number,
+            record._message,
+            '\n'.join(extra._message for extra in transaction.extras))
+
+
+def _transaction(record, extras):
+    """ Rebuilds L{Transaction} from stored raw records. """
+    transaction = Transaction(TransactionBasicRecord(record))
+    if extras:
+        for extra in extras.split('\n'):
+            transaction.append_extra_record(TransactionExtraRecord(extra))
+    return transaction
+
+
+def _iso_date(value):
+    """ Converts YYMMDD field to ISO date string or None if it is empty. """
+    value = value.strip()
+    if len(value) != 6 or not value.isdigit() or value == '000000':
+        return None
+    return '20{0}-{1}-{2}'.format(value[0:2], value[2:4], value[4:6])
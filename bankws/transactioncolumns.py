@@ -0,0 +1,327 @@
+'''Transactioncolumns module exports parsed "Tapahtumaotekysely" statements
+as columns instead of per-row objects.
+
+Usage:
+    >>> columns = transaction_columns(transaction_list_responses)
+    >>> columns['amount_cents'].sum()
+    >>> columns.decode('reference')
+    >>> table = columns.to_arrow()
+
+Columns::
+    - account: Account of the statement (dictionary encoded)
+    - archive_id: Archive id of the transaction
+    - registration_date, value_date, payment_date: datetime64[D]
+    - amount_cents: Signed amount in cents (int64)
+    - sign: +1 or -1 (int8)
+    - reference: Reference number (dictionary encoded)
+    - counterparty: Payee/Payer name (dictionary encoded)
+    - code: Transaction code (dictionary encoded)
+
+External libraries:
+    - NumPy
+    - PyArrow (optional, needed only by to_arrow)
+'''
+import codecs
+
+import numpy
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+try:
+    from bankws.transactionlistresponse import TransactionListResponse
+except ImportError:
+    from transactionlistresponse import TransactionListResponse
+
+COLUMNS = ('account', 'archive_id', 'registration_date', 'value_date',
+           'payment_date', 'amount_cents', 'sign', 'reference',
+           'counterparty', 'code')
+""" Names of exported columns in order. """
+DICTIONARY_COLUMNS = ('account', 'reference', 'counterparty', 'code')
+""" Columns that are dictionary encoded when encoding is enabled. """
+_DATE_COLUMNS = ('registration_date', 'value_date', 'payment_date')
+
+
+class TransactionColumns():
+    """ TransactionColumns holds transactions as NumPy arrays.
+
+    Dictionary encoded columns contain int32 codes that index to the array in
+    L{dictionaries}.
+
+    @type columns: dict
+    @ivar columns: Column name to NumPy array.
+    @type dictionaries: dict
+    @ivar dictionaries: Column name to array of distinct values for
+                        dictionary encoded columns.
+    """
+    def __init__(self, columns, dictionaries):
+        """ Initializes TransactionColumns.
+
+        @type  columns: dict
+        @param columns: Column name to NumPy array.
+        @type  dictionaries: dict
+        @param dictionaries: Column name to array of distinct values.
+        """
+        self.columns = columns
+        self.dictionaries = dictionaries
+
+    def __len__(self):
+        return len(self.columns['amount_cents'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def decode(self, name):
+        """ Gets values of column with dictionary encoding removed.
+
+        @type  name: string
+        @param name: Column name.
+        @rtype: L{numpy.ndarray}
+        @return: Column values.
+        """
+        if name in self.dictionaries:
+            return self.dictionaries[name][self.columns[name]]
+        return self.columns[name]
+
+    def to_arrow(self):
+        """ Converts columns to Arrow table.
+
+        Dictionary encoded columns become Arrow dictionary arrays.
+
+        @rtype: L{pyarrow.Table}
+        @return: Table containing all columns.
+        @raise RuntimeError: If PyArrow is not installed.
+        """
+        if pyarrow is None:
+            raise RuntimeError("PyArrow is needed for Arrow export.")
+        arrays = []
+        for name in COLUMNS:
+            if name in self.dictionaries:
+                arrays.append(pyarrow.DictionaryArray.from_arrays(
+                                    self.columns[name],
+                                    self.dictionaries[name]))
+            else:
+                arrays.append(pyarrow.array(self.columns[name]))
+        return pyarrow.Table.from_arrays(arrays, names=list(COLUMNS))
+
+
+def transaction_columns(responses, dictionary_encode=True):
+    """ Exports transactions of parsed statements to columns.
+
+    @type  responses: L{TransactionListResponse} or iterable of them
+    @param responses: Parsed statements.
+    @type  dictionary_encode: boolean
+    @param dictionary_encode: Dictionary encode string columns.
+    @rtype: L{TransactionColumns}
+    @return: Transactions of all statements in order.
+    """
+    if isinstance(responses, TransactionListResponse):
+        responses = [responses]
+    raw = _empty_raw()
+    for response in responses:
+        if not response.transactions:
+            continue
+        account = response.basic_record.account
+        for transaction in response.transactions:
+            _append_record(raw, account, transaction.transaction)
+    return build_columns(raw, dictionary_encode)
+
+
+def concat_columns(parts):
+    """ Concatenates columns in order.
+
+    Dictionaries of dictionary encoded columns are merged and codes are
+    remapped to the merged dictionary. Columns missing from the first part
+    are left out.
+
+    @type  parts: iterable of L{TransactionColumns}
+    @param parts: Columns to concatenate.
+    @rtype: L{TransactionColumns}
+    @return: Concatenated columns.
+    """
+    parts = list(parts)
+    if not parts:
+        return build_columns(_empty_raw())
+    columns = {}
+    dictionaries = {}
+    for name in COLUMNS:
+        if name not in parts[0].columns:
+            continue
+        if name in parts[0].dictionaries:
+            merged, inverse = numpy.unique(numpy.concatenate(
+                                [part.dictionaries[name] for part in parts]),
+                                return_inverse=True)
+            inverse = inverse.reshape(-1)
+            codes = []
+            offset = 0
+            for part in parts:
+                codes.append(inverse[offset + part.columns[name]])
+                offset += len(part.dictionaries[name])
+            columns[name] = numpy.concatenate(codes).astype(numpy.int32)
+            dictionaries[name] = merged
+        else:
+            columns[name] = numpy.concatenate([part.columns[name]
+                                               for part in parts])
+    return TransactionColumns(columns, dictionaries)
+
+
+def _empty_raw():
+    """ Gets empty raw column lists for L{build_columns}. """
+    raw = dict((name, []) for name in COLUMNS if name != 'amount_cents')
+    raw['amount'] = []
+    return raw
+
+
+def _append_record(raw, account, record):
+    """ Appends fields of L{TransactionBasicRecord} to raw column lists. """
+    raw['account'].append(account)
+    raw['archive_id'].append(record.archive_id)
+    raw['registration_date'].append(record.registration_date)
+    raw['value_date'].append(record.value_date)
+    raw['payment_date'].append(record.payment_date)
+    raw['sign'].append(record._sign)
+    raw['amount'].append(record._amount)
+    raw['reference'].append(record._reference_number)
+    raw['counterparty'].append(record._name)
+    raw['code'].append(record._code)
+
+
+def build_columns(raw, dictionary_encode=True, encoding='latin-1'):
+    """ Builds typed columns from raw fixed width fields.
+
+    @type  raw: dict
+    @param raw: Column name to list of unparsed fields (str or bytes). Amount
+                digits are under key 'amount' and sign characters under
+                'sign'. String columns missing from raw are left out, e.g.
+                account to be added later with L{string_column}.
+    @type  dictionary_encode: boolean
+    @param dictionary_encode: Dictionary encode string columns.
+    @type  encoding: string
+    @param encoding: Encoding of bytes fields.
+    @rtype: L{TransactionColumns}
+    @return: Typed columns.
+    """
+    columns = {}
+    dictionaries = {}
+    for name in _DATE_COLUMNS:
+        columns[name] = _to_datetime64(raw[name])
+    signs = numpy.char.strip(_as_array(raw['sign']))
+    minus = b'-' if signs.dtype.kind == 'S' else '-'
+    columns['sign'] = numpy.where(signs == minus, -1, 1).astype(numpy.int8)
+    amount, valid = _parse_digits(_as_array(raw['amount']))
+    if not valid.all():
+        raise ValueError("Amount field contains other than digits.")
+    columns['amount_cents'] = amount * columns['sign']
+    columns['archive_id'] = _decode(
+                            numpy.char.strip(_as_array(raw['archive_id'])),
+                            encoding)
+    for name in DICTIONARY_COLUMNS:
+        if name not in raw:
+            continue
+        columns[name], dictionary = string_column(raw[name],
+                                                  dictionary_encode, encoding)
+        if dictionary is not None:
+            dictionaries[name] = dictionary
+    return TransactionColumns(columns, dictionaries)
+
+
+def string_column(values, dictionary_encode=True, encoding='latin-1'):
+    """ Builds stripped string column from raw fixed width fields.
+
+    @type  values: list or L{numpy.ndarray}
+    @param values: Unparsed fields (str or bytes).
+    @type  dictionary_encode: boolean
+    @param dictionary_encode: Dictionary encode the column.
+    @type  encoding: string
+    @param encoding: Encoding of bytes fields.
+    @rtype: tuple
+    @return: (column, dictionary). Dictionary is None without encoding.
+    """
+    values = _as_array(values)
+    if not dictionary_encode:
+        return _decode(numpy.char.strip(values), encoding), None
+    # Distinct values are searched before stripping and decoding so that
+    # only the dictionary needs to be processed.
+    dictionary, codes = _unique(values)
+    dictionary, merged = _unique(numpy.char.strip(dictionary))
+    return merged[codes].astype(numpy.int32), _decode(dictionary, encoding)
+
+
+def _as_array(values):
+    """ Converts list of str or bytes fields to NumPy string array. """
+    if len(values) == 0:
+        return numpy.zeros(0, dtype='S1')
+    return numpy.ascontiguousarray(values)
+
+
+def _unique(values):
+    """ Gets sorted distinct values and inverse indices of string array.
+
+    Bytes are compared as raw memory which is faster than string comparison.
+    """
+    if values.dtype.kind == 'S' and len(values):
+        width = values.dtype.itemsize
+        dictionary, codes = numpy.unique(values.view('V%d' % width),
+                                         return_inverse=True)
+        return dictionary.view('S%d' % width), codes.reshape(-1)
+    dictionary, codes = numpy.unique(values, return_inverse=True)
+    return dictionary, codes.reshape(-1)
+
+
+def _decode(array, encoding):
+    """ Decodes bytes array to unicode array. """
+    if array.dtype.kind != 'S':
+        return array
+    if codecs.lookup(encoding).name == 'iso8859-1' and len(array):
+        # Latin-1 bytes are the same as the first 256 code points.
+        width = array.dtype.itemsize
+        code_points = array.view(numpy.uint8).reshape(-1, width)
+        return code_points.astype(numpy.uint32).view('U%d' % width).reshape(-1)
+    return numpy.char.decode(array, encoding)
+
+
+def _parse_digits(array):
+    """ Parses fixed width digit fields to integers.
+
+    Bytes fields are parsed with arithmetic on their digits, which is much
+    faster than converting strings one by one.
+
+    @rtype: tuple(L{numpy.ndarray}, L{numpy.ndarray})
+    @return: int64 values and mask of fields that contained only digits.
+    """
+    if array.dtype.kind == 'S' and len(array):
+        width = array.dtype.itemsize
+        digits = (array.view(numpy.uint8).reshape(-1, width)
+                  .astype(numpy.int64) - ord('0'))
+        valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+        powers = 10 ** numpy.arange(width - 1, -1, -1, dtype=numpy.int64)
+        return digits @ powers, valid
+    text = numpy.char.strip(array)
+    valid = numpy.char.isdigit(text)
+    numbers = numpy.zeros(len(text), dtype=numpy.int64)
+    if valid.any():
+        numbers[valid] = text[valid].astype(numpy.int64)
+    return numbers, valid
+
+
+def _to_datetime64(values):
+    """ Converts YYMMDD fields to datetime64[D] array.
+
+    Empty and zero dates become NaT.
+    """
+    numbers, valid = _parse_digits(_as_array(values))
+    valid &= (numbers != 0) & (numbers < 1000000)
+    years = 2000 + numbers // 10000 - 1970
+    months = numbers // 100 % 100 - 1
+    days = numbers % 100 - 1
+    month_starts = (years.astype('datetime64[Y]').astype('datetime64[M]') +
+                    months.astype('timedelta64[M]'))
+    dates = (month_starts.astype('datetime64[D]') +
+             days.astype('timedelta64[D]'))
+    # Month 00 and days that overflow to the next month are not valid dates.
+    valid &= ((months >= 0) & (months < 12) &
+              (dates.astype('datetime64[M]') == month_starts))
+    dates[~valid] = numpy.datetime64('NaT')
+    return dates
@@ -1,7 +1,58 @@
 ''' Transactionlistresponse contains classes for parsing "Tapahtumaotekysely"
 events.
+
+Amounts are fixed point fields. Every amount is available as a signed integer
+in its smallest unit (cents) and as a Decimal view:
+    >>> record.money_cents
+    >>> record.money_decimal
 '''
 import datetime
+from decimal import Decimal
+
+CENT_DECIMALS = 2
+""" Number of decimals in TITO amount fields (N18, 16 integer 2 decimal) """
+RATE_DECIMALS = 7
+""" Number of decimals in TITO exchange rate field (N11, 4 integer 7 decimal)
+"""
+
+
+def to_scaled_int(sign, digits):
+    """ Converts fixed point field to signed integer in its smallest unit.
+
+    All amounts and rates in the records are converted with this function so
+    that e.g. amount field '000000000000012345' with sign '-' becomes -12345
+    cents.
+
+    @type  sign: string
+    @param sign: Sign character of the field ('+' or '-').
+    @type  digits: string
+    @param digits: Digits of the field without decimal separator.
+    @rtype: int
+    @return: Signed value scaled by the number of decimals in field.
+    """
+    value = int(digits)
+    if sign == '-':
+        return -value
+    return value
+
+
+def scaled_to_decimal(value, decimals=CENT_DECIMALS):
+    """ Gets Decimal view of a scaled integer.
+
+    @type  value: int
+    @param value: Value returned by L{to_scaled_int}.
+    @type  decimals: int
+    @param decimals: Number of decimals in value.
+    @rtype: L{Decimal}
+    @return: Exact decimal value.
+    """
+    return Decimal(value).scaleb(-decimals)
+
+
+def _format_scaled(value, decimals):
+    """ Formats absolute value of scaled integer as a decimal string. """
+    integer, fraction = divmod(abs(value), 10 ** decimals)
+    return '{0}.{1:0{2}d}'.format(integer, fraction, decimals)
 
 
 class BasicRecord:
@@ -109,6 +160,8 @@ class TransactionBasicRecord():
         - transaction_marker:  Name of transaction operation (debosit, intake)
         - description: Code and description for transaction.
         - money: Amount of money moved in transaction
+        - money_cents: Amount of money as signed integer cents
+        - money_decimal: Amount of money as Decimal
         - name: Payee/Payer name
         - account: Payee account number
         - reference_number: Transaction reference number.
@@ -119,6 +172,7 @@ class TransactionBasicRecord():
         @type  message: string
         @param message: Line from message that contains transaction.
         """
+        self._message = message
         self.material_id = message[0]  # S AN1
         self.record_type = message[1:3]  # 10  AN2
         self.record_length = message[3:6]  # N3
@@ -192,11 +246,30 @@ class TransactionBasicRecord():
         @rtype: string
         @return: Amount of money.
         """
-        amount = str(int(self._amount[:-2])) + '.' + self._amount[-2:]
-        return (self._sign + amount)
+        return self._sign + _format_scaled(self.money_cents, CENT_DECIMALS)
 
     money = property(_get_money_in_transaction)
 
+    def _get_money_cents(self):
+        """ Returns amount of money in transaction in cents.
+
+        @rtype: int
+        @return: Signed amount of cents.
+        """
+        return to_scaled_int(self._sign, self._amount)
+
+    money_cents = property(_get_money_cents)
+
+    def _get_money_decimal(self):
+        """ Returns amount of money in transaction as Decimal.
+
+        @rtype: L{Decimal}
+        @return: Signed amount of money.
+        """
+        return scaled_to_decimal(self.money_cents)
+
+    money_decimal = property(_get_money_decimal)
+
     def _get_name(self):
         """ Returns name given in transaction record.
 
@@ -241,6 +314,11 @@ class TransactionExtraRecord():
     properties::
         - content: Returns tuple containing type and textual description about
         record.
+        - amount_decimal: Equivalent value as Decimal (type 05)
+        - exchange_rate_decimal: Exchange rate as Decimal (type 05)
+
+    Type 05 records also have amount_cents (signed integer cents) and
+    exchange_rate_scaled (rate multiplied by 10^7) attributes.
     """
     def __init__(self, message):
         """ Initializes TransactionExtraRecord class.
@@ -248,6 +326,7 @@ class TransactionExtraRecord():
         @type  message: string
         @param message: Line of text that contains ExtraRecord.
         """
+        self._message = message
         self.material_id = message[0]  # S AN1
         self.record_type = message[1:3]  # 11 AN2
         self.record_length = message[3:6]  # N3
@@ -289,6 +368,8 @@ class TransactionExtraRecord():
             # empty = message[31]  # AN1
             self.exchange_rate = message[32:43]  # N11 4 integer 7 decimal
             self.rate_reference = message[43:49]  # AN6 # Kurssiviite
+            self.amount_cents = to_scaled_int(self.sign, self.amount)
+            self.exchange_rate_scaled = to_scaled_int('+', self.exchange_rate)
         elif self.information_type == '06':
             # Applicant information (Toimeksiantajan tiedot)
             self.applicant_info_1 = message[8:43]
@@ -338,9 +419,8 @@ class TransactionExtraRecord():
             content = "ArchiveReference: {0}\n".format(
                                     self.transaction_to_be_fixed_id.strip())
         elif self.information_type == '05':
-            amount = str(int(self.amount[:-2])) + "." + self.amount[-2:]
-            rate = (str(int(self.exchange_rate[:4])) + "." +
-                    self.exchange_rate[-7:])
+            amount = _format_scaled(self.amount_cents, CENT_DECIMALS)
+            rate = _format_scaled(self.exchange_rate_scaled, RATE_DECIMALS)
             content = ("Amount: {0}{1}\nISO-Code: {2}\n"
                        "Rate: {3}\nReference: {4}\n".format(self.sign, amount,
                                                 self.currency, rate,
@@ -366,6 +446,30 @@ class TransactionExtraRecord():
 
     content = property(_get_content)
 
+    def _get_amount_decimal(self):
+        """ Gets equivalent value of currency transaction (type 05).
+
+        @rtype: L{Decimal} or None
+        @return: Signed equivalent value or None if record is not type 05.
+        """
+        if self.information_type != '05':
+            return None
+        return scaled_to_decimal(self.amount_cents)
+
+    amount_decimal = property(_get_amount_decimal)
+
+    def _get_exchange_rate_decimal(self):
+        """ Gets exchange rate of currency transaction (type 05).
+
+        @rtype: L{Decimal} or None
+        @return: Exchange rate or None if record is not type 05.
+        """
+        if self.information_type != '05':
+            return None
+        return scaled_to_decimal(self.exchange_rate_scaled, RATE_DECIMALS)
+
+    exchange_rate_decimal = property(_get_exchange_rate_decimal)
+
 
 class BalanceRecord():
     """ BalanceRecord contains info about customers
@@ -375,6 +479,8 @@ class BalanceRecord():
         - query_date
         - balance
         - available balance
+        - balance_cents, balance_decimal
+        - available_balance_cents, available_balance_decimal
     """
     def __init__(self, message):
         """ Initializes BalanceRecord
@@ -412,22 +518,61 @@ class BalanceRecord():
         @rtype: string
         @return: Amount of money in account.
         """
-        amount = str(int(self._amount1[:-2])) + "." + self._amount1[-2:]
-        return (self._sign1 + amount)
+        return self._sign1 + _format_scaled(self.balance_cents, CENT_DECIMALS)
 
     balance = property(_get_balance)
 
+    def _get_balance_cents(self):
+        """ Returns current balance in cents.
+
+        @rtype: int
+        @return: Signed amount of cents in account.
+        """
+        return to_scaled_int(self._sign1, self._amount1)
+
+    balance_cents = property(_get_balance_cents)
+
+    def _get_balance_decimal(self):
+        """ Returns current balance as Decimal.
+
+        @rtype: L{Decimal}
+        @return: Amount of money in account.
+        """
+        return scaled_to_decimal(self.balance_cents)
+
+    balance_decimal = property(_get_balance_decimal)
+
     def _get_usable_balance(self):
         """ Returns amount of usable balance
 
         @rtype: string
         @return: Amount of usable money.
         """
-        amount = str(int(self._amount2[:-2])) + "." + self._amount2[-2:]
-        return (self._sign2 + amount)
+        return self._sign2 + _format_scaled(self.available_balance_cents,
+                                            CENT_DECIMALS)
 
     available_balance = property(_get_usable_balance)
 
+    def _get_usable_balance_cents(self):
+        """ Returns amount of usable balance in cents.
+
+        @rtype: int
+        @return: Signed amount of usable cents.
+        """
+        return to_scaled_int(self._sign2, self._amount2)
+
+    available_balance_cents = property(_get_usable_balance_cents)
+
+    def _get_usable_balance_decimal(self):
+        """ Returns amount of usable balance as Decimal.
+
+        @rtype: L{Decimal}
+        @return: Amount of usable money.
+        """
+        return scaled_to_decimal(self.available_balance_cents)
+
+    available_balance_decimal = property(_get_usable_balance_decimal)
+
 
 class InformationRecord():
     """ InformationRecord exists only if there is some error
@@ -511,7 +656,15 @@ class TransactionListResponse():
         - information_record Gets InformationRecord (if exists)
     """
     def __init__(self, message):
-        records = message.splitlines()
+        """ Initializes TransactionListResponse.
+
+        @type  message: string or iterable of strings
+        @param message: Message text or already split record lines.
+        """
+        if isinstance(message, str):
+            records = message.splitlines()
+        else:
+            records = message
         self._working = True
         self._transactions = []
         for record in records:
@@ -14,13 +14,60 @@ import urllib.error
 import ssl
 import sys
 import os
+import threading
+from http.cookiejar import CookieJar
 
 from suds.transport.http import HttpTransport
 from suds.transport.__init__ import Reply
 from suds.transport.__init__ import TransportError
 from logging import getLogger
 
+try:
+    from bankws import instrumentation
+    from bankws import metrics
+    from bankws import payloadlog
+except ImportError:
+    import instrumentation
+    import metrics
+    import payloadlog
+
 log = getLogger(__name__)
+CA_CERTS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "resources", "cacerts.pem")
+_contexts = {}
+_contexts_lock = threading.Lock()
+
+
+def ssl_context(ca_certs=CA_CERTS, key_file=None, cert_file=None):
+    """ Gets SSL context, made once per process for the same files.
+
+    Loading the CA certificates is the expensive part of a connection, the
+    context is shared by all connections and by processes forked after it
+    was made.
+
+    @type  ca_certs: string
+    @param ca_certs: CA certificates filename, None for no verification.
+    @type  key_file: string
+    @param key_file: Private key filename of client certificate.
+    @type  cert_file: string
+    @param cert_file: Client certificate filename.
+    @rtype: L{ssl.SSLContext}
+    """
+    key = (ca_certs, key_file, cert_file)
+    with _contexts_lock:
+        context = _contexts.get(key)
+        if context is None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            # Host name is checked by CertValidatingHTTPSConnection.
+            context.check_hostname = False
+            if ca_certs:
+                context.load_verify_locations(ca_certs)
+            else:
+                context.verify_mode = ssl.CERT_NONE
+            if cert_file:
+                context.load_cert_chain(cert_file, key_file)
+            _contexts[key] = context
+        return context
 
 
 class InvalidCertificateException(http.client.HTTPException,
@@ -96,10 +143,8 @@ class CertValidatingHTTPSConnection(http.client.HTTPConnection):
                                                host name differ.
         """
         sock = socket.create_connection((self.host, self.port))
-        self.sock = ssl.wrap_socket(sock, keyfile=self.key_file,
-                                          certfile=self.cert_file,
-                                          cert_reqs=self.cert_reqs,
-                                          ca_certs=self.ca_certs)
+        context = ssl_context(self.ca_certs, self.key_file, self.cert_file)
+        self.sock = context.wrap_socket(sock, server_hostname=self.host)
         if self.cert_reqs & ssl.CERT_REQUIRED:
             cert = self.sock.getpeercert()  # Get other end certificate
             hostname = self.host.split(':', 0)[0]
@@ -143,31 +188,55 @@ class HTTPSClientCertTransport(HttpTransport):
         @rtype: fp
         """
         tm = self.options.timeout
-        certpath = os.path.join(os.path.dirname(os.path.abspath(__file__)),
-                                "resources/cacerts.pem")
-        handler = VerifiedHTTPSHandler(ca_certs=certpath)
+        handler = VerifiedHTTPSHandler(ca_certs=CA_CERTS)
         url = urllib.request.build_opener(handler)
         return url.open(u2request, timeout=tm)
 
+    def after_fork(self):
+        """ Forgets connection state inherited from the parent process.
+
+        Connections are opened per request, so only the cached opener of
+        HttpTransport and the cookies of the parent's sessions are dropped.
+        """
+        self.urlopener = None
+        self.cookiejar = CookieJar()
+
     def send(self, request):
         """ Overrides Suds default send function to get 500 error messages
         parsed. """
-        result = None
         url = request.url
         msg = request.message
+        size = len(msg or b'')
+        metrics.BYTES_SENT.inc(size)
+        metrics.HTTP_IN_FLIGHT.inc()
+        try:
+            with instrumentation.stage('http', size_in=size) as event:
+                result = self._send(request, url, msg)
+                if result is not None:
+                    received = len(result.message)
+                    event.size_out = received
+                    metrics.BYTES_RECEIVED.inc(received)
+        finally:
+            metrics.HTTP_IN_FLIGHT.dec()
+        return result
+
+    def _send(self, request, url, msg):
+        """ Sends request and reads the reply. """
+        result = None
         headers = request.headers
         try:
             u2request = urllib.request.Request(url, msg, headers)
             self.addcookies(u2request)
             self.proxy = self.options.proxy
             request.headers.update(u2request.headers)
-            log.debug('sending:\n%s', request)
+            if payloadlog.enabled(log):
+                payloadlog.log(log, 'Sending to {0}'.format(url), msg)
             fp = self.u2open(u2request)
             self.getcookies(fp, u2request)
             headers = (fp.headers.dict if sys.version_info < (3, 0)
                        else fp.headers)
             result = Reply(200, headers, fp.read())
-            log.debug('received:\n%s', result)
+            payloadlog.log(log, 'Received', result.message)
         except urllib.error.HTTPError as e:
             if e.code in (202, 204):
                 result = None
@@ -175,7 +244,7 @@ class HTTPSClientCertTransport(HttpTransport):
                 # At least Osuuspankki returns all errors on uploaded data with
                 # http 500 error.
                 result = Reply(500, e.fp.headers, e.fp.read())
-                log.debug('received:\n%s', result)
+                payloadlog.log(log, 'Received', result.message)
             else:
                 raise TransportError(e.msg, e.code, e.fp)
         return result
@@ -17,11 +17,11 @@ from lxml import etree
 try:
     from bankws.request import Request
     from bankws import timehelper
-    from bankws import signature
+    from bankws import instrumentation
 except ImportError:
     from request import Request
     import timehelper
-    import signature
+    import instrumentation
 
 E = ElementMaker(namespace="http://bxd.fi/xmldata/",
                  nsmap={None: "http://bxd.fi/xmldata/"})
@@ -109,20 +109,21 @@ class UploadFile(Request):
         @raise ValueError: If key is in unsupported format.
         """
         # Generate document.
-        data = base64.b64encode(bytes(content, 'utf-8'))
-        uploader = \
-            DOC(
-                CUSTOMERID(self._id),
-                COMMAND("UploadFile"),  # Mandatory for NORDEA
-                TIMESTAMP(timehelper.get_timestamp()),
-                ENVIRONMENT(self._environment),
-                FILENAME(self.filename),
-                TARGET(self.targetid),
-                COMPRESSION(self.compression),
-                SOFTWAREID(self.software),
-                FILETYPE(self.filetype),
-                CONTENT(str(data, 'utf-8'))
-                )
-        # Sign document
-        message = str(etree.tostring(uploader), 'utf-8')
-        self.text = signature.sign(message, self.key, self.certificate)
+        with instrumentation.stage('build_request') as event:
+            data = base64.b64encode(bytes(content, 'utf-8'))
+            uploader = \
+                DOC(
+                    CUSTOMERID(self._id),
+                    COMMAND("UploadFile"),  # Mandatory for NORDEA
+                    TIMESTAMP(timehelper.get_timestamp()),
+                    ENVIRONMENT(self._environment),
+                    FILENAME(self.filename),
+                    TARGET(self.targetid),
+                    COMPRESSION(self.compression),
+                    SOFTWAREID(self.software),
+                    FILETYPE(self.filetype),
+                    CONTENT(str(data, 'utf-8'))
+                    )
+            message = str(etree.tostring(uploader), 'utf-8')
+            event.size_out = len(message)
+        self._sign(message)
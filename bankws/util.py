@@ -1,6 +1,6 @@
 ''' Util module contains some simple utility functions
 
-Check is account number valid IBAN number:
+Check is account number valid IBAN number of a SEPA country:
     >>> is_valid_iban(account_number)
 
 Get account number and branch from Finnish account number
@@ -8,32 +8,107 @@ Get account number and branch from Finnish account number
 
 Check is last char correct in means of Luhn modulus 10.
     >>> check_luhn_modulo10(key)
+
+Batch versions for many account numbers are in module accountbatch.
 '''
 import re
 
+# valid =  [1,2,31,33,34,36,37,38,39,4,5,6,8]
+_ACCOUNT_NUMBER = re.compile(r"""
+        (^[^3,7,9]     # String may not start with 3,7,9
+        \d{5})         # After first char 5 more digits
+        -?             # There can be '-'
+        (\d{2,8}$)     # Account number is from 2 to 8 digits
+        |              # or
+        (^3[^2,5]      # If string starts with it can't cont. with 2 or 5
+        \d{4})         # 4 more digits
+        -?             # There can be '-'
+        (\d{2,8}$)     # 2 to 8 digits
+        """, re.VERBOSE)
+
+IBAN_FORMATS = {
+    'AD': '4n4n12c', 'AT': '5n11n', 'BE': '3n7n2n', 'BG': '4a4n2n8c',
+    'CH': '5n12c', 'CY': '3n5n16c', 'CZ': '4n6n10n', 'DE': '8n10n',
+    'DK': '4n9n1n', 'EE': '2n2n11n1n', 'ES': '4n4n1n1n10n', 'FI': '3n11n',
+    'FR': '5n5n11c2n', 'GB': '4a6n8n', 'GI': '4a15c', 'GR': '3n4n16c',
+    'HR': '7n10n', 'HU': '3n4n1n15n1n', 'IE': '4a6n8n', 'IS': '4n2n6n10n',
+    'IT': '1a5n5n12c', 'LI': '5n12c', 'LT': '5n11n', 'LU': '3n13c',
+    'LV': '4a13c', 'MC': '5n5n11c2n', 'MT': '4a5n18c', 'NL': '4a10n',
+    'NO': '4n6n1n', 'PL': '8n16n', 'PT': '4n4n11n2n', 'RO': '4a16c',
+    'SE': '3n16n1n', 'SI': '5n8n2n', 'SK': '4n6n10n', 'SM': '1a5n5n12c',
+    'VA': '3n15n',
+}
+""" SEPA country code to BBAN structure of IBAN in the notation of the IBAN
+registry: n digits, a uppercase letters and c letters or digits. """
+_IBAN_CHARACTERS = {'n': '[0-9]', 'a': '[A-Z]', 'c': '[A-Za-z0-9]'}
+_IBAN_PATTERNS = {}
+# Letters are counted as two digit numbers A=10 ... Z=35
+_IBAN_DIGITS = str.maketrans(dict(
+    (chr(code), str(code - 55)) for code in range(ord('A'), ord('Z') + 1)))
+
+
+def iban_structure(country):
+    """ Expands BBAN structure of country to one character class per position
+
+    @type  country: string
+    @param country: Country code
+    @rtype: string or None
+    @return: Classes n, a or c of BBAN characters, e.g. 'nnnnn' for '5n'.
+             None if country has no SEPA IBAN format.
+    """
+    structure = IBAN_FORMATS.get(country)
+    if structure is None:
+        return None
+    return ''.join(kind * int(count) for count, kind in
+                   re.findall(r'(\d+)([nac])', structure))
+
+
+def _iban_pattern(country):
+    """ Gets compiled pattern of IBAN of country, compiling it on first use """
+    pattern = _IBAN_PATTERNS.get(country)
+    if pattern is None:
+        structure = iban_structure(country)
+        if structure is None:
+            return None
+        pattern = re.compile(country + '[0-9]{2}' + ''.join(
+                    _IBAN_CHARACTERS[kind] for kind in structure) + '$')
+        _IBAN_PATTERNS[country] = pattern
+    return pattern
+
+
+def iban_remainder(account_number):
+    """ Counts mod-97 remainder of IBAN, which is 1 for valid check digits
+
+    Country code and check digits are moved to the end and letters are
+    changed to numbers. An IBAN has at most 34 characters, so the number has
+    less than 70 digits; one int() is faster in Python than counting the
+    remainder in parts.
+
+    @type  account_number: string
+    @param account_number: IBAN containing only letters and digits
+    @rtype: int
+    @return: Remainder
+    @raise ValueError: If account number contains other characters
+    """
+    number = (account_number[4:] + account_number[:4]).upper()
+    return int(number.translate(_IBAN_DIGITS)) % 97
+
 
 def is_valid_iban(account_number):
     """ Checks if account number is valid IBAN number
 
+    Length and BBAN structure are checked with the rules of the country in
+    L{IBAN_FORMATS}. Account number must not contain spaces.
+
     @type  account_number: string
     @param account_number: IBAN account number
     @rtype: boolean
     @return: Is account number valid.
     """
-    # Valid (finnish) IBAN number contains 18 numbers
-    if len(account_number) != 18:
-        return False
-    # Add F=15 I=18 00 to string
-    number = account_number[4:] + "151800"
-    # number should contain only numbers
-    if not number.isdigit():
+    pattern = _iban_pattern(account_number[:2])
+    if pattern is None or pattern.match(account_number) is None:
         return False
-    # Check number is 98 - number mod 97
-    check = "{:0>2}".format(98 - (int(number) % 97))
-    # Check that check number is correct.
-    if check != account_number[2:4]:
-        return False
-    return True
+    return iban_remainder(account_number) == 1
 
 
 def parse_account_number(account_number):
@@ -51,25 +126,15 @@ def parse_account_number(account_number):
             raise ValueError("This is not valid IBAN account number.")
         # Drop country code and check number
         account_number = account_number[4:]
-    # valid =  [1,2,31,33,34,36,37,38,39,4,5,6,8]
-    pat = re.compile(r"""
-            (^[^3,7,9]     # String may not start with 3,7,9
-            \d{5})         # After first char 5 more digits
-            -?             # There can be '-'
-            (\d{2,8}$)     # Account number is from 2 to 8 digits
-            |              # or
-            (^3[^2,5]      # If string starts with it can't cont. with 2 or 5
-            \d{4})         # 4 more digits
-            -?             # There can be '-'
-            (\d{2,8}$)     # 2 to 8 digits
-            """, re.VERBOSE)
-
-    match = pat.match(account_number)
+    match = _ACCOUNT_NUMBER.match(account_number)
     if match is None:
         raise ValueError("Unsupported account number.")
 
-    branch = match.group(1)
-    account = match.group(2)
+    if match.group(1) is not None:
+        branch, account = match.group(1, 2)
+    else:
+        # Branch starting with 3 is matched by the second alternative
+        branch, account = match.group(3, 4)
     #fill with zeros
     if branch[0] in ['4', '5']:
         # Banks whose branch starts with 4 and 5.
@@ -4,24 +4,34 @@ Usage::
      >>> ws = WebService(sender_id, private_key, certificate, bank)
      >>> response = ws.uploadfile(content, environment, filetype)
 
+Stages of the operations are timed by instruments, see module
+instrumentation::
+     >>> recorder = instrumentation.Recorder()
+     >>> ws = WebService(sender_id, private_key, certificate, bank,
+                         instruments=[recorder])
+
 External libraries:
     - Suds
+The SOAP client parts of suds are imported when the first WebService is
+made.
 '''
 import sys
+import copy
 import base64
 import binascii
 import logging
+import os
+from collections import deque
 from datetime import date
+from itertools import islice
 
-from suds.client import Client
-from suds.xsd.doctor import ImportDoctor, Import
-from suds.wsse import Security, Timestamp
 from suds import WebFault
 from suds.transport import TransportError
 
 try:
-    from bankws import transport
-    from bankws import plugin
+    from bankws import instrumentation
+    from bankws import metrics
+    from bankws import payloadlog
     from bankws import idhandler
     from bankws import timehelper
     from bankws import util
@@ -31,8 +41,9 @@ try:
     from bankws.appresponse import ApplicationResponse
     from bankws.transactionlistresponse import TransactionListResponse
 except ImportError:
-    import transport
-    import plugin
+    import instrumentation
+    import metrics
+    import payloadlog
     import idhandler
     import timehelper
     import util
@@ -43,10 +54,76 @@ except ImportError:
     from transactionlistresponse import TransactionListResponse
 
 
+def build_client(bank, private_key, certificate, environment="TEST",
+                 http_transport=None, signer=None, algorithm='sha1'):
+    """ Makes suds client of bank web service, the WSDL is loaded and parsed.
+
+    @type  bank: L{Bank}
+    @param bank: Object containing needed data for banks web service.
+    @type  private_key: string
+    @param private_key: Private key filename.
+    @type  certificate: string
+    @param certificate: Filename of certificate filename.
+    @type  environment: string
+    @param environment: TEST or PRODUCTION
+    @type  http_transport: L{suds.transport.Transport}
+    @param http_transport: Transport of SOAP requests, defaults to
+                           L{transport.HTTPSClientCertTransport}.
+    @type  signer: L{signingservice.SigningService}
+    @param signer: Signs envelopes in worker processes.
+    @type  algorithm: string
+    @param algorithm: Envelope signature algorithm, sha1 or sha256.
+    @rtype: L{suds.client.Client}
+    @raise ValueError: If bank is invalid or SignerPlugin fails to initialize.
+    """
+    from suds.client import Client
+    from suds.xsd.doctor import ImportDoctor, Import
+    from suds.wsse import Security, Timestamp
+    try:
+        from bankws import plugin
+        from bankws import transport
+    except ImportError:
+        import plugin
+        import transport
+
+    # Fixes namespace issue from wsdl.
+    schema_url = 'http://model.bxd.fi'
+    schema_import = Import(schema_url)
+    schema_doctor = ImportDoctor(schema_import)
+    try:
+        if environment.upper() == 'TEST':
+            url = bank.wsdl_test_url
+        else:
+            url = bank.wsdl_url
+    except AttributeError as e:
+        raise ValueError("Invalid Bank object: {}".format(e))
+
+    # Adds security header to SOAP-request.
+    security = Security()
+    security.tokens.append(Timestamp())
+    # Generate plugin to add signature to request.
+    try:
+        signer = plugin.SignerPlugin(private_key, certificate, algorithm,
+                                     signer=signer)
+    except (IOError, ValueError) as e:
+        logging.getLogger("bankws").error(e)
+        raise ValueError("Unable to create SignerPlugin")
+
+    if http_transport is None:
+        http_transport = transport.HTTPSClientCertTransport()
+    return Client(url, doctor=schema_doctor,
+                  transport=http_transport,
+                  wsse=security,
+                  plugins=[signer],
+                  faults=False)
+
+
 class WebService:
 
     def __init__(self, sender_id, private_key, certificate, bank,
-                 environment="TEST", language="FI"):
+                 environment="TEST", language="FI", instruments=None,
+                 http_transport=None, session=None, signer=None,
+                 algorithm=None):
         """
         Makes soap request to bank webservice channel.
 
@@ -63,8 +140,26 @@ class WebService:
         @type  language: string
         @param language: Get responses in selected language (possible
                          values SV, FI and EN)
-        @raise ValueError: If language is not on the list or SignerPlugin fails
-                           to initialize.
+        @type  instruments: list<L{instrumentation.Instrument}>
+        @param instruments: Instruments getting the stages of operations.
+        @type  http_transport: L{suds.transport.Transport}
+        @param http_transport: Transport of SOAP requests, e.g.
+                               L{recording.RecordingTransport}. Defaults to
+                               L{transport.HTTPSClientCertTransport}.
+        @type  session: L{session.Session}
+        @param session: Preloaded session whose client is used instead of
+                        making a new one, see L{session.Session.webservice}.
+        @type  signer: L{signingservice.SigningService}
+        @param signer: Signs ApplicationRequests, and envelopes unless the
+                       client comes from session, in worker processes. Must
+                       have the same private key.
+        @type  algorithm: string
+        @param algorithm: sha1 or sha256, used for ApplicationRequests and
+                          envelopes alike. Defaults to the algorithm of
+                          session, else of signer, else sha1.
+        @raise ValueError: If language is not on the list, SignerPlugin fails
+                           to initialize, signer has another key or session
+                           another algorithm.
         """
         self.logger = logging.getLogger("bankws")
 
@@ -78,54 +173,75 @@ class WebService:
             raise ValueError(error)
 
         self._environment = env
-        # Fixes namespace issue from wsdl.
-        schema_url = 'http://model.bxd.fi'
-        schema_import = Import(schema_url)
-        schema_doctor = ImportDoctor(schema_import)
         try:
-            if self._environment == 'TEST':
-                url = bank.wsdl_test_url
-            else:
-                url = bank.wsdl_url
-
             self._receiver_id = bank.BIC
         except AttributeError as e:
             raise ValueError("Invalid Bank object: {}".format(e))
 
-        # Adds security header to SOAP-request.
-        security = Security()
-        security.tokens.append(Timestamp())
-        # Generate plugin to add signature to request.
-        try:
-            signer = plugin.SignerPlugin(private_key, certificate)
-        except (IOError, ValueError) as e:
-            self.logger.error(e)
-            raise ValueError("Unable to create SignerPlugin")
+        if (signer is not None and
+                signer.private_key != os.path.abspath(private_key)):
+            raise ValueError("Signer has another private key")
 
-        self.client = Client(url, doctor=schema_doctor,
-                        transport=transport.HTTPSClientCertTransport(),
-                        wsse=security,
-                        plugins=[signer],
-                        faults=False)
+        if algorithm is None:
+            if session is not None:
+                algorithm = session.algorithm
+            elif signer is not None:
+                algorithm = signer.algorithm
+            else:
+                algorithm = 'sha1'
+
+        if session is None:
+            self.client = build_client(bank, private_key, certificate, env,
+                                       http_transport, signer, algorithm)
+        elif session.environment != env:
+            raise ValueError("Session is for {0} environment".format(
+                             session.environment))
+        elif session.algorithm != algorithm:
+            raise ValueError("Session signs with {0}".format(
+                             session.algorithm))
+        else:
+            self.client = session.client
 
         self._sender_id = sender_id
         self._language = language
         self._privatekey = private_key
         self._certificate = certificate
+        self.instruments = list(instruments or [])
+        self.signer = signer
+        self.algorithm = algorithm
+
+    def clone(self):
+        """ Gets copy of WebService that has its own SOAP client.
+
+        Suds clients are not thread safe, so use one clone per thread when
+        making requests concurrently.
+
+        @rtype: L{WebService}
+        @return: Copy sharing configuration but not the client.
+        """
+        other = copy.copy(self)
+        other.client = self.client.clone()
+        return other
 
     def _generate_request_header(self):
-        """ Generate request header for request. """
-        request_id = idhandler.get_object()
-        self.request_header = self.client.factory.create("ns0:RequestHeader")
-        self.request_header.SenderId = self._sender_id  # ID given from bank.
-        self.request_header.RequestId = request_id.next_value()  # UNIQUE ID
-        self.request_header.Timestamp = timehelper.get_timestamp()
-        # not required
-        self.request_header.Language = self._language  # "EN" or "SV" or "FI"
-        self.request_header.UserAgent = "bankws 1.01"
-        self.request_header.ReceiverId = self._receiver_id  # BIC for the bank
-        idhandler.save_object(request_id)
+        """ Generate request header for request.
 
+        @rtype: L{suds.sudsobject.Object}
+        @return: Generated header, also stored to request_header attribute.
+        """
+        with instrumentation.stage('request_header'):
+            request_header = self.client.factory.create("ns0:RequestHeader")
+            request_header.SenderId = self._sender_id  # ID given from bank.
+            request_header.RequestId = idhandler.next_request_id()  # UNIQUE ID
+            request_header.Timestamp = timehelper.get_timestamp()
+            # not required
+            request_header.Language = self._language  # "EN" or "SV" or "FI"
+            request_header.UserAgent = "bankws 1.01"
+            request_header.ReceiverId = self._receiver_id  # BIC for the bank
+        self.request_header = request_header
+        return request_header
+
+    @instrumentation.instrumented('transaction_query')
     def transaction_query(self, account_number, only_new_transactions=False):
         """ Makes transaction query.
 
@@ -148,9 +264,12 @@ class WebService:
         #Response is in content field
         #uncomment if you want to see text before parsing.
         #print(ret_val.content) 
-        TLR = TransactionListResponse(ret_val.content)
+        with instrumentation.stage('parse_statement',
+                                   size_in=len(ret_val.content)):
+            TLR = TransactionListResponse(ret_val.content)
         return TLR
 
+    @instrumentation.instrumented('upload_file')
     def upload_file(self, content, filetype_="pain.001.001.02",
                     folder_="target", filename_="test.xml"):
         """ Uploads file to bank.
@@ -172,12 +291,15 @@ class WebService:
                              self._privatekey, self._certificate,
                              folder=folder_, filename=filename_,
                              filetype=filetype_)
+        appdata.signer = self.signer
+        appdata.algorithm = self.algorithm
 
         try:
             appdata.generate_message(content)
         except (EnvironmentError, ValueError) as e:
             self.logger.exception(e)
             raise RuntimeError(e)
+        request = self._request_text(appdata)
 
         # Uncomment if you want to see appdata before sending
         # print(appdata)
@@ -187,9 +309,7 @@ class WebService:
         # Make soap request
         try:
             (status, response) = self.client.service.uploadFile(
-                                            self.request_header,
-                                            str(appdata.get_request(), 'utf-8')
-                                            )
+                                            self.request_header, request)
         except (WebFault, TransportError) as e:
             self.logger.exception(e)
             raise RuntimeError(e)
@@ -205,6 +325,7 @@ class WebService:
         # Parse response
         return self._parse_response(response)
 
+    @instrumentation.instrumented('download_file')
     def download_file(self, reference):
         """ Downloads file from bank.
 
@@ -214,22 +335,84 @@ class WebService:
         @return: Application response returned from the bank.
         @raise RuntimeError: If request was not accepted by bank.
         """
-        # Generate downloadfile request
+        return self._download(self._get_file_request(reference))
+
+    def download_files(self, references, window=8):
+        """ Downloads files one after another, generating requests ahead.
+
+        With a signer the requests of the next window files are signed in
+        its worker processes while the earlier files are downloaded. Every
+        download is reported to instruments as operation download_file. The
+        stages of building a request ahead are reported when its download
+        starts and are not part of the duration of the operation.
+
+        @type  references: iterable of string
+        @param references: Reference ids of files to be downloaded.
+        @type  window: int
+        @param window: Number of requests generated ahead.
+        @rtype: generator of tuple(string, L{ApplicationResponse})
+        @return: Reference and application response of each file, in order.
+        @raise RuntimeError: If a request was not accepted by bank, files
+                             after it are not downloaded.
+        """
+        references = iter(references)
+        window = max(1, window)
+        pending = deque()
+        while True:
+            for reference in islice(references, window - len(pending)):
+                pending.append((reference,) +
+                               self._get_file_request_ahead(reference))
+            if not pending:
+                return
+            reference, appdata, events = pending.popleft()
+            with instrumentation.operation(self.instruments, 'download_file'):
+                instrumentation.report(events)
+                response = self._download(appdata)
+            yield reference, response
+
+    def _get_file_request_ahead(self, reference):
+        """ Generates downloadfile request outside its operation.
+
+        @rtype: tuple(L{GetFile}, list<L{instrumentation.StageEvent}>)
+        @return: Request and the stages of building it.
+        """
+        if not self.instruments:
+            return self._get_file_request(reference), []
+        recorder = instrumentation.Recorder()
+        with instrumentation.operation([recorder], 'download_file'):
+            appdata = self._get_file_request(reference)
+        return appdata, [event for event in recorder.events
+                         if event.stage is not None]
+
+    def _get_file_request(self, reference):
+        """ Generates downloadfile request.
+
+        @rtype: L{GetFile}
+        """
         appdata = GetFile(self._sender_id, self._environment, self._privatekey,
                           self._certificate)
+        appdata.signer = self.signer
+        appdata.algorithm = self.algorithm
         try:
             appdata.generate_message(reference)
         except (EnvironmentError, ValueError) as e:
             self.logger.exception(e)
             raise RuntimeError(e)
+        return appdata
 
+    def _download(self, appdata):
+        """ Sends downloadfile request.
+
+        @type  appdata: L{GetFile}
+        @param appdata: Generated request.
+        @rtype: L{ApplicationResponse}
+        """
+        request = self._request_text(appdata)
         self._generate_request_header()
         # Make soap request.
         try:
             (status, response) = self.client.service.downloadFile(
-                                    self.request_header,
-                                    str(appdata.get_request(), 'utf-8')
-                                    )
+                                    self.request_header, request)
         except (WebFault, TransportError) as e:
             self.logger.exception(e)
             raise RuntimeError(e)
@@ -245,6 +428,7 @@ class WebService:
         # Parse response
         return self._parse_response(response)
 
+    @instrumentation.instrumented('download_filelist')
     def download_filelist(self, status):
         """ Downloads list of files saved to bank.
 
@@ -257,19 +441,20 @@ class WebService:
         # Generate getfilelist request.
         appdata = GetFileList(self._sender_id, self._environment,
                               self._privatekey, self._certificate)
+        appdata.signer = self.signer
+        appdata.algorithm = self.algorithm
         try:
             appdata.generate_message(status)
         except (EnvironmentError, ValueError) as e:
             self.logger.exception(e)
             raise RuntimeError(e)
+        request = self._request_text(appdata)
         self._generate_request_header()
 
         # Make soap request.
         try:
             (status, response) = self.client.service.downloadFileList(
-                                    self.request_header,
-                                    str(appdata.get_request(), 'utf-8')
-                                    )
+                                    self.request_header, request)
         except WebFault as e:
             self.logger.exception(e)
             raise RuntimeError(e)
@@ -285,6 +470,25 @@ class WebService:
         # Parse response
         return self._parse_response(response)
 
+    def _request_text(self, appdata):
+        """ Gets base64 encoded request, waiting for the signer.
+
+        @type  appdata: L{Request}
+        @param appdata: Generated request.
+        @rtype: string
+        @raise RuntimeError: If signing failed.
+        """
+        try:
+            return str(appdata.get_request(), 'utf-8')
+        except Exception as e:
+            # A signing pool fails in more ways than signing in process,
+            # e.g. with a crashed worker (BrokenProcessPool).
+            if appdata.signer is None and not isinstance(
+                    e, (EnvironmentError, ValueError)):
+                raise
+            self.logger.exception(e)
+            raise RuntimeError(e)
+
     def _parse_response(self, response):
         """
         Parses response returned from bank.
@@ -297,13 +501,16 @@ class WebService:
         @raise RuntimeError: If request wasn't accepted.
         """
         header = response.ResponseHeader
+        metrics.RESPONSE_CODES.inc(code=header.ResponseCode)
         # Decode ApplicationResponse
         try:
-            application_response = base64.b64decode(
-                                       bytes(response.ApplicationResponse,
-                                            'utf-8')
-                                       )
-            self.logger.debug(application_response)
+            with instrumentation.stage('decode') as event:
+                encoded = bytes(response.ApplicationResponse, 'utf-8')
+                event.size_in = len(encoded)
+                application_response = base64.b64decode(encoded)
+                event.size_out = len(application_response)
+            payloadlog.log(self.logger, "Decoded ApplicationResponse",
+                           application_response)
         except binascii.Error as e:
             self.logger.exception("Failed to base64 decode response")
             raise RuntimeError(e)
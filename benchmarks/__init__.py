@@ -0,0 +1,5 @@
+'''Benchmarks for bankws.
+
+Run from the repository root, e.g.:
+    >>> python -m benchmarks.bulkparser
+'''
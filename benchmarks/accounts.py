@@ -0,0 +1,55 @@
+'''Measures validation of account numbers one by one and in batches.
+
+Usage:
+    >>> python -m benchmarks.accounts [count ...]
+'''
+import sys
+import time
+
+from benchmarks import fixtures
+from bankws import accountbatch, util
+
+
+def _measure(name, count, function, repeat=3):
+    """ Runs function and prints time per account number of the best run. """
+    elapsed = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        run = time.perf_counter() - start
+        elapsed = run if elapsed is None else min(elapsed, run)
+    print("{0:<28} {1:>9} numbers {2:8.3f} s {3:8.2f} us/number".format(
+          name, count, elapsed, elapsed / count * 1e6))
+
+
+def _parse_one_by_one(numbers):
+    for number in numbers:
+        try:
+            util.parse_account_number(number)
+        except ValueError:
+            pass
+
+
+def main(sizes=None):
+    if not sizes:
+        sizes = [fixtures.SIZES['large'], 5 * fixtures.SIZES['large']]
+    for count in sizes:
+        numbers = fixtures.account_numbers(count)
+        ibans = numbers[1::2]
+        _measure("is_valid_iban", len(ibans),
+                 lambda: [util.is_valid_iban(x) for x in ibans])
+        _measure("valid_iban_mask", len(ibans),
+                 lambda: accountbatch.valid_iban_mask(ibans))
+        ibans = fixtures.sepa_ibans(count)
+        _measure("is_valid_iban (SEPA)", count,
+                 lambda: [util.is_valid_iban(x) for x in ibans])
+        _measure("valid_iban_mask (SEPA)", count,
+                 lambda: accountbatch.valid_iban_mask(ibans))
+        _measure("parse_account_number", count,
+                 lambda: _parse_one_by_one(numbers))
+        _measure("parse_account_numbers", count,
+                 lambda: accountbatch.parse_account_numbers(numbers))
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]])
@@ -0,0 +1,142 @@
+'''Compares crypto backends of bankws.cryptobackend and writes the results as
+JSON.
+
+For every installed backend and algorithm (sha1, sha256) the suite times
+raw RSA signing and verification of a SignedInfo sized message, and
+signature.sign and signature.validate of the C2B payment message that the
+stages benchmark signs. Results are in the format of the stages benchmark,
+so earlier runs can be compared:
+    >>> python -m benchmarks.backends --size small --output new.json
+    >>> python -m benchmarks.backends --compare old.json --output new.json
+
+Signatures are made with the test PKI of bankws.mockbank. Validation
+checks the revocation list in resources/ of the working directory, so the
+suite runs in a temporary directory with a list of the test CA there.
+'''
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+from benchmarks import fixtures, stages
+from bankws import cryptobackend, signature
+
+ALGORITHMS = ('sha1', 'sha256')
+_MESSAGE = b'<SignedInfo xmlns="http://www.w3.org/2000/09/xmldsig#">' \
+           + b'x' * 600 + b'</SignedInfo>'
+
+
+def _repeated(function, count):
+    def run():
+        for i in range(count):
+            function()
+    return run
+
+
+def _backend_stages(backend, pki, document, size, count, rounds, repeat):
+    """ Measures one backend. """
+    results = []
+    cryptobackend.set_backend(backend)
+    with open(pki.client_key, 'rb') as f:
+        key = backend.load_private_key(f.read())
+    with open(pki.client_certificate, 'rb') as f:
+        certificate = f.read()
+    for algorithm in ALGORITHMS:
+        name = '{0} {1}'.format(backend.name, algorithm)
+        value = backend.sign(key, _MESSAGE, algorithm)
+        if not backend.verify(certificate, value, _MESSAGE, algorithm):
+            raise RuntimeError("{0} can't verify its signature".format(name))
+        results.append(stages._measure(
+            name + ' sign', 'fixed', rounds, len(_MESSAGE),
+            _repeated(lambda: backend.sign(key, _MESSAGE, algorithm), rounds),
+            repeat))
+        results.append(stages._measure(
+            name + ' verify', 'fixed', rounds, len(_MESSAGE),
+            _repeated(lambda: backend.verify(certificate, value, _MESSAGE,
+                                             algorithm), rounds),
+            repeat))
+        results.append(stages._measure(
+            name + ' signature.sign', size, count, len(document),
+            lambda: signature.sign(document, pki.client_key,
+                                   pki.client_certificate,
+                                   algorithm=algorithm),
+            repeat))
+        signed = signature.sign(document, pki.client_key,
+                                pki.client_certificate, algorithm=algorithm)
+        results.append(stages._measure(
+            name + ' signature.validate', size, count, len(signed),
+            lambda: signature.validate(signed), repeat))
+    return results
+
+
+def run(size, rounds=100, repeat=3, names=None):
+    """ Runs all stages of the installed backends.
+
+    @type  size: string
+    @param size: Name of fixture size in L{fixtures.SIZES}.
+    @type  rounds: int
+    @param rounds: Signatures per run of the raw sign and verify stages.
+    @type  repeat: int
+    @param repeat: Runs per stage.
+    @type  names: list<string>
+    @param names: Backends, all of L{cryptobackend.BACKENDS} by default.
+    @rtype: dict
+    @return: Results and environment, as written to the JSON file.
+    """
+    pki = fixtures.test_pki()
+    count = fixtures.SIZES[size]
+    document = fixtures.c2b_message(count).to_bytes()
+    results = []
+    previous = cryptobackend.get_backend()
+    directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            pki.write_crl(os.path.join('resources', 'OP-Pohjola-ws.crl'))
+            for name in names or sorted(cryptobackend.BACKENDS):
+                try:
+                    backend = cryptobackend.BACKENDS[name]()
+                except ImportError as e:
+                    print("{0:<28} skipped: {1}".format(name, e))
+                    continue
+                results.extend(_backend_stages(backend, pki, document, size,
+                                               count, rounds, repeat))
+        finally:
+            os.chdir(directory)
+            cryptobackend.set_backend(previous)
+    return {'format': stages.FORMAT_VERSION,
+            'created': datetime.now().isoformat(),
+            'environment': stages._environment(),
+            'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+                description="Benchmark crypto backends.")
+    parser.add_argument('--size', default='small',
+                        choices=sorted(fixtures.SIZES))
+    parser.add_argument('--backends', default=','.join(
+                            sorted(cryptobackend.BACKENDS)),
+                        help="comma separated backends")
+    parser.add_argument('--rounds', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='benchmark-backends.json')
+    parser.add_argument('--compare', help="earlier JSON result file")
+    args = parser.parse_args(argv)
+    names = [name for name in args.backends.split(',') if name]
+    unknown = [name for name in names if name not in cryptobackend.BACKENDS]
+    if unknown:
+        parser.error("unknown backends: {0}".format(', '.join(unknown)))
+
+    report = run(args.size, args.rounds, args.repeat, names)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("Results written to {0}".format(args.output))
+    if args.compare:
+        stages._compare(report['results'], args.compare)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
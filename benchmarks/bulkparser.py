@@ -0,0 +1,52 @@
+'''Measures throughput of memory mapped statement parsing in GB/s.
+
+Usage:
+    >>> python -m benchmarks.bulkparser [files] [transactions per file]
+'''
+import sys
+import tempfile
+import time
+
+from benchmarks import fixtures
+from bankws import bulkparser
+from bankws.transactionlistresponse import TransactionListResponse
+
+
+def _measure(name, size, function, repeat=3):
+    """ Runs function and prints throughput of the best run. """
+    elapsed = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        count = function()
+        run = time.perf_counter() - start
+        elapsed = run if elapsed is None else min(elapsed, run)
+    print("{0:<24} {1:>9} transactions {2:8.3f} s {3:8.3f} GB/s".format(
+          name, count, elapsed, size / elapsed / 1e9))
+
+
+def _read_and_parse(path):
+    """ Baseline: read every file to str and parse it. """
+    count = 0
+    for filename in bulkparser.statement_files(path):
+        with open(filename, encoding='latin-1') as f:
+            count += len(TransactionListResponse(f.read()).transactions)
+    return count
+
+
+def main(files=200, transactions=5000):
+    with tempfile.TemporaryDirectory() as directory:
+        size = fixtures.write_tito_archive(directory, files, transactions)
+        print("Archive: {0} files, {1:.1f} MB".format(files, size / 1e6))
+        _measure("read + parse", size, lambda: _read_and_parse(directory))
+        _measure("mmap responses", size, lambda: sum(
+                 len(r.transactions)
+                 for r in bulkparser.parse_responses(directory)))
+        _measure("mmap fields", size, lambda: sum(
+                 len(bulkparser.map_file(f)['amount'])
+                 for f in bulkparser.statement_files(directory)))
+        _measure("mmap columns", size,
+                 lambda: len(bulkparser.parse_columns(directory)))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:3]])
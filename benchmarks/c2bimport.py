@@ -0,0 +1,84 @@
+'''Measures importing payroll CSV to a streamed C2B-message.
+
+The baseline validates and builds every row in Python before writing it,
+which is how payments were created before the bulk importer.
+
+Usage:
+    >>> python -m benchmarks.c2bimport [rows ...]
+'''
+import csv
+import sys
+import time
+from io import BytesIO, StringIO
+
+from benchmarks import fixtures
+from bankws import c2b, c2bhelper, c2bimport, util
+from bankws.entity import Entity
+
+PAYER = Entity('Payer Oy', 'FI', 'Street 1')
+
+
+def _measure(name, count, function, repeat=3):
+    """ Runs function and prints time per row of the best run. """
+    elapsed = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        run = time.perf_counter() - start
+        elapsed = run if elapsed is None else min(elapsed, run)
+    print("{0:<24} {1:>9} rows {2:8.3f} s {3:8.2f} us/row".format(
+          name, count, elapsed, elapsed / count * 1e6))
+
+
+def _sepa():
+    return c2bhelper.SEPA(PAYER, 'TRF', 'SEPA', '2013-05-31', 'MATID',
+                          'FI4950009420028730', 'OKOYFIHH', 'SLEV',
+                          pmt_inf_id='SALARY', ccy='EUR')
+
+
+def _row_by_row(text):
+    """ Checks and writes rows one at a time, collecting failures. """
+    rejected = []
+    with c2b.C2BWriter(BytesIO(), PAYER, 'SALARY') as writer:
+        writer.begin_payment(_sepa())
+        for number, row in enumerate(csv.DictReader(StringIO(text))):
+            if not util.is_valid_iban(row['iban']):
+                rejected.append((number, 'iban'))
+                continue
+            try:
+                tx = c2bhelper.CdtTrfTxInf(Entity(row['name'], None),
+                                           row['purpose'] or None,
+                                           row['end_to_end_id'],
+                                           row['amount'], 'EUR', row['bic'],
+                                           row['iban'],
+                                           ustrd=row['message'] or None)
+            except ValueError:
+                rejected.append((number, 'amount'))
+                continue
+            writer.add_transaction(tx)
+    return rejected
+
+
+def _check(text):
+    c2bimport.check_payments(c2bimport.read_csv(StringIO(text)))
+
+
+def _import(text):
+    with c2b.C2BWriter(BytesIO(), PAYER, 'SALARY') as writer:
+        return c2bimport.import_payments(
+                    writer, _sepa(), c2bimport.read_csv(StringIO(text)))
+
+
+def main(sizes=None):
+    if not sizes:
+        sizes = [fixtures.SIZES['medium'], fixtures.SIZES['large']]
+    for count in sizes:
+        text = fixtures.payment_csv(count)
+        print("Payroll: {0} rows, {1:.1f} MB".format(count, len(text) / 1e6))
+        _measure("row by row (baseline)", count, lambda: _row_by_row(text))
+        _measure("read_csv + check", count, lambda: _check(text))
+        _measure("import_payments", count, lambda: _import(text))
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]])
@@ -0,0 +1,52 @@
+'''Measures parsing of camt.054 notifications.
+
+Time per transaction stays constant when parsing is linear in the number
+of TxDtls elements. A full tree parse is shown as baseline.
+
+Usage:
+    >>> python -m benchmarks.c2bresponse [transactions ...]
+'''
+import sys
+import time
+from io import BytesIO
+
+from lxml import etree as ET
+
+from benchmarks import fixtures
+from bankws import c2b
+
+
+def _measure(name, count, function, repeat=3):
+    """ Runs function and prints time per transaction of the best run. """
+    elapsed = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        run = time.perf_counter() - start
+        elapsed = run if elapsed is None else min(elapsed, run)
+    print("{0:<24} {1:>9} transactions {2:8.3f} s {3:8.2f} us/tx".format(
+          name, count, elapsed, elapsed / count * 1e6))
+
+
+def _stream(data):
+    """ Streams transactions without keeping them. """
+    response = c2b.C2BResponseCamt()
+    for tx in response.iter_transactions(BytesIO(data)):
+        pass
+
+
+def main(sizes=None):
+    if not sizes:
+        sizes = [fixtures.SIZES['medium'], fixtures.SIZES['large']]
+    for count in sizes:
+        data = fixtures.camt054_notification(count)
+        print("Notification: {0} transactions, {1:.1f} MB".format(
+              count, len(data) / 1e6))
+        _measure("tree parse (baseline)", count,
+                 lambda: ET.parse(BytesIO(data)))
+        _measure("C2BResponse", count, lambda: c2b.C2BResponse(data))
+        _measure("iter_transactions", count, lambda: _stream(data))
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]])
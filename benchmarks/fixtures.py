@@ -0,0 +1,351 @@
+'''Fixtures module generates synthetic data for benchmarks.
+
+Usage:
+    >>> text = tito_statement(10000)
+    >>> write_tito_archive('/tmp/archive', files=100, transactions=1000)
+    >>> pki = test_pki()
+    >>> response = application_response(text, pki)
+'''
+import base64
+import os
+import random
+import tempfile
+
+SIZES = {'small': 100, 'medium': 10000, 'large': 100000}
+""" Number of transactions in standard fixture sizes. """
+
+
+def _basic_record(account, day):
+    """ Generates type 00 basic record. """
+    record = ('T00322001' + account.ljust(14) + '   ' + day + day +
+              day + '1200' + '1234567890'.ljust(17) + ' ' * 31 + 'EUR' +
+              'Account'.ljust(30) + '0' * 18 + 'Owner Oy'.ljust(35) +
+              'OP-Pohjola'.ljust(40))
+    return record.ljust(322)
+
+
+def _transaction_record(number, day, cents, reference):
+    """ Generates type 10 transaction record. """
+    sign = '-' if cents < 0 else '+'
+    marker = '2' if cents < 0 else '1'
+    return ('T10188' + '120000' + '{0:0>18}'.format(number) + day * 3 +
+            marker + '710' + 'Viitesiirto'.ljust(35) + sign +
+            '{0:0>18}'.format(abs(cents)) + ' ' + 'A' +
+            'Payer {0}'.format(number % 1000).ljust(35) + ' ' +
+            '12345600000785' + ' ' + reference.ljust(20) + ' ' * 8 + '0')
+
+
+def _currency_record(cents, rate):
+    """ Generates type 11 extra record with information type 05. """
+    sign = '-' if cents < 0 else '+'
+    return ('T11049' + '05' + sign + '{0:0>18}'.format(abs(cents)) + ' ' +
+            'USD' + ' ' + '{0:0>11}'.format(rate) + 'REF001')
+
+
+def _balance_record(day, cents):
+    """ Generates type 40 balance record. """
+    sign = '-' if cents < 0 else '+'
+    return ('T40050' + day + sign + '{0:0>18}'.format(abs(cents)) + sign +
+            '{0:0>18}'.format(abs(cents)))
+
+
+def tito_statement(transactions, account='57200020004440', day='130115',
+                   seed=0, start=0):
+    """ Generates "Tapahtumaotekysely" statement text.
+
+    @type  transactions: int
+    @param transactions: Number of transaction records.
+    @type  account: string
+    @param account: Account number of statement.
+    @type  day: string
+    @param day: Date of statement (YYMMDD).
+    @type  seed: int
+    @param seed: Random seed.
+    @type  start: int
+    @param start: First archive id number.
+    @rtype: string
+    @return: Statement text.
+    """
+    rnd = random.Random(seed)
+    lines = [_basic_record(account, day)]
+    total = 0
+    for number in range(start, start + transactions):
+        cents = rnd.randint(-500000, 500000)
+        total += cents
+        lines.append(_transaction_record(number, day, cents,
+                                         str(rnd.randint(1, 9999))))
+        if number % 10 == 0:
+            lines.append(_currency_record(cents, 13204500))
+    lines.append(_balance_record(day, total))
+    return '\n'.join(lines) + '\n'
+
+
+def write_tito_archive(directory, files, transactions):
+    """ Writes directory of statement files.
+
+    @type  directory: string
+    @param directory: Target directory (created if missing).
+    @type  files: int
+    @param files: Number of files.
+    @type  transactions: int
+    @param transactions: Transactions per file.
+    @rtype: int
+    @return: Total size of written files in bytes.
+    """
+    os.makedirs(directory, exist_ok=True)
+    size = 0
+    for i in range(files):
+        text = tito_statement(transactions, seed=i, start=i * transactions)
+        filename = os.path.join(directory, 'statement_{0:05}.txt'.format(i))
+        with open(filename, 'wb') as f:
+            size += f.write(text.encode('latin-1'))
+    return size
+
+
+_CAMT_054 = 'urn:iso:std:iso:20022:tech:xsd:camt.054.001.02'
+_CAMT_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<Document xmlns="' + _CAMT_054 + '"><BkToCstmrDbtCdtNtfctn>'
+    '<GrpHdr><MsgId>NTF0001</MsgId><CreDtTm>2013-05-02T08:00:00</CreDtTm>'
+    '<MsgRcpt><Id><OrgId><Othr><Id>1000000000</Id><SchmeNm><Cd>BANK</Cd>'
+    '</SchmeNm></Othr></OrgId></Id></MsgRcpt></GrpHdr>'
+    '<Ntfctn><Id>NTF0001-1</Id><CreDtTm>2013-05-02T08:00:00</CreDtTm>'
+    '<Acct><Id><IBAN>FI4950009420028730</IBAN></Id></Acct>'
+    '<Ntry><Amt Ccy="EUR">{total}</Amt><CdtDbtInd>DBIT</CdtDbtInd>'
+    '<Sts>BOOK</Sts><BookgDt><Dt>2013-05-02</Dt></BookgDt>'
+    '<AcctSvcrRef>130502593497O10001</AcctSvcrRef>'
+    '<BkTxCd><Prtry><Cd>NTRF</Cd></Prtry></BkTxCd>'
+    '<NtryDtls><Btch><PmtInfId>PMT-1</PmtInfId>'
+    '<NbOfTxs>{count}</NbOfTxs></Btch>')
+_CAMT_TRANSACTION = (
+    '<TxDtls><Refs><AcctSvcrRef>130502593497O1{number:05}</AcctSvcrRef>'
+    '<InstrId>INSTR-{number}</InstrId><EndToEndId>E2E-{number}</EndToEndId>'
+    '</Refs><AmtDtls><InstdAmt><Amt Ccy="EUR">{amount}</Amt></InstdAmt>'
+    '</AmtDtls><RltdPties><Cdtr><Nm>Receiver {number}</Nm><PstlAdr>'
+    '<AdrLine>Street {number}</AdrLine><AdrLine>00100 Helsinki</AdrLine>'
+    '</PstlAdr></Cdtr><CdtrAcct><Id><IBAN>FI2112345600000785</IBAN></Id>'
+    '</CdtrAcct></RltdPties><RltdAgts><CdtrAgt><FinInstnId><BIC>OKOYFIHH'
+    '</BIC></FinInstnId></CdtrAgt></RltdAgts><RmtInf><Strd><CdtrRefInf>'
+    '<Tp><CdOrPrtry><Cd>SCOR</Cd></CdOrPrtry></Tp><Ref>{reference}</Ref>'
+    '</CdtrRefInf></Strd></RmtInf><RltdDts><AccptncDtTm>2013-05-02T07:00:00'
+    '</AccptncDtTm></RltdDts></TxDtls>')
+_CAMT_FOOTER = '</NtryDtls></Ntry></Ntfctn></BkToCstmrDbtCdtNtfctn></Document>'
+
+
+def camt054_notification(transactions, seed=0):
+    """ Generates camt.054 debit notification of one batch.
+
+    @type  transactions: int
+    @param transactions: Number of TxDtls elements.
+    @type  seed: int
+    @param seed: Random seed.
+    @rtype: bytes
+    @return: Notification XML.
+    """
+    rnd = random.Random(seed)
+    parts = []
+    total = 0
+    for number in range(transactions):
+        cents = rnd.randint(1, 500000)
+        total += cents
+        parts.append(_CAMT_TRANSACTION.format(
+                        number=number,
+                        amount='{0}.{1:02}'.format(*divmod(cents, 100)),
+                        reference=rnd.randint(1, 9999)))
+    header = _CAMT_HEADER.format(
+                total='{0}.{1:02}'.format(*divmod(total, 100)),
+                count=transactions)
+    return (header + ''.join(parts) + _CAMT_FOOTER).encode('utf-8')
+
+
+def _finnish_iban(bban):
+    """ Adds country code and check digits to 14 digit Finnish BBAN. """
+    check = 98 - int(bban + '151800') % 97
+    return 'FI{0:02}{1}'.format(check, bban)
+
+
+def account_numbers(count, seed=0):
+    """ Generates Finnish account numbers, half IBAN and half BBAN.
+
+    @type  count: int
+    @param count: Number of account numbers.
+    @type  seed: int
+    @param seed: Random seed.
+    @rtype: list<string>
+    @return: Account numbers, some with broken check digits.
+    """
+    rnd = random.Random(seed)
+    numbers = []
+    for number in range(count):
+        bban = '{0}{1:013}'.format(rnd.choice('124568'),
+                                   rnd.randint(0, 10 ** 13 - 1))
+        if number % 2:
+            numbers.append(_finnish_iban(bban))
+        else:
+            numbers.append(bban[:6] + '-' + bban[6:].lstrip('0'))
+    return numbers
+
+
+def sepa_ibans(count, seed=0, invalid=0.1):
+    """ Generates IBANs of all SEPA countries in random order.
+
+    @type  count: int
+    @param count: Number of IBANs.
+    @type  seed: int
+    @param seed: Random seed.
+    @type  invalid: float
+    @param invalid: Share of IBANs with broken check digits.
+    @rtype: list<string>
+    @return: IBANs without spaces.
+    """
+    from bankws import util
+    rnd = random.Random(seed)
+    characters = {'n': '0123456789', 'a': 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'}
+    characters['c'] = characters['n'] + characters['a']
+    countries = sorted(util.IBAN_FORMATS)
+    ibans = []
+    for number in range(count):
+        country = rnd.choice(countries)
+        bban = ''.join(rnd.choice(characters[kind])
+                       for kind in util.iban_structure(country))
+        check = 98 - util.iban_remainder(country + '00' + bban)
+        if rnd.random() < invalid:
+            check = (check + 1) % 100
+        ibans.append('{0}{1:02}{2}'.format(country, check, bban))
+    return ibans
+
+
+def payment_csv(rows, seed=0, invalid=0.01):
+    """ Generates payroll CSV for payment import.
+
+    @type  rows: int
+    @param rows: Number of payment rows.
+    @type  seed: int
+    @param seed: Random seed.
+    @type  invalid: float
+    @param invalid: Share of rows with a broken IBAN.
+    @rtype: string
+    @return: CSV text with a header row.
+    """
+    rnd = random.Random(seed)
+    lines = ['end_to_end_id,name,iban,bic,amount,purpose,message']
+    for number in range(rows):
+        iban = _finnish_iban('{0:014}'.format(rnd.randint(0, 10 ** 14 - 1)))
+        if rnd.random() < invalid:
+            iban = iban[:-1] + str((int(iban[-1]) + 1) % 10)
+        # Short messages with characters escaped in XML, longer escaped
+        # than the widest message.
+        lines.append('SAL-{0},Employee {1},{2},OKOYFIHH,{3}.{4:02},SALA,'
+                     '{5}'.format(number, number % 5000, iban,
+                                  rnd.randint(1000, 6000), rnd.randint(0, 99),
+                                  rnd.choice(('05', 'R&D', '<1'))))
+    return '\n'.join(lines) + '\n'
+
+
+def test_pki():
+    """ Gets keys and certificates of the mock bank, generated on first use.
+
+    @rtype: L{bankws.mockbank.TestPKI}
+    @return: PKI kept in the temporary directory between runs.
+    """
+    from bankws import mockbank
+    return mockbank.TestPKI(os.path.join(tempfile.gettempdir(),
+                                         'bankws-benchmark-pki'))
+
+
+def c2b_message(transactions, seed=0):
+    """ Generates salary C2B-message with one payment.
+
+    @type  transactions: int
+    @param transactions: Number of transactions.
+    @type  seed: int
+    @param seed: Random seed.
+    @rtype: L{bankws.c2b.C2B}
+    @return: Message with group header set.
+    """
+    from bankws import c2b, c2bhelper
+    from bankws.entity import Entity
+    rnd = random.Random(seed)
+    payer = Entity('Payer Oy', 'FI', 'Street 1')
+    sepa = c2bhelper.SEPA(payer, 'TRF', 'SEPA', '2013-05-31', 'MATID',
+                          'FI4950009420028730', 'OKOYFIHH', 'SLEV',
+                          pmt_inf_id='SALARY', ccy='EUR')
+    for number in range(transactions):
+        iban = _finnish_iban('{0:014}'.format(rnd.randint(0, 10 ** 14 - 1)))
+        sepa.add_transaction(c2bhelper.CdtTrfTxInf(
+                Entity('Employee {0}'.format(number), None), 'SALA',
+                'SAL-{0}'.format(number),
+                '{0}.{1:02}'.format(rnd.randint(1000, 6000),
+                                    rnd.randint(0, 99)),
+                'EUR', 'OKOYFIHH', iban, ustrd='Salary 05/2013'))
+    message = c2b.C2B(payer)
+    message.group_header('SALARY-0513', 'MIXD')
+    message.add_SEPA_payment(sepa)
+    return message
+
+
+_APPLICATION_RESPONSE = (
+    '<ApplicationResponse xmlns="http://bxd.fi/xmldata/">'
+    '<CustomerId>1234567890</CustomerId>'
+    '<Timestamp>2013-01-15T12:00:00+02:00</Timestamp>'
+    '<ResponseCode>00</ResponseCode><ResponseText>OK.</ResponseText>'
+    '<Compressed>false</Compressed><FileType>{filetype}</FileType>'
+    '<Content>{content}</Content></ApplicationResponse>')
+
+
+def application_response(content, pki, filetype='TP1 3ST'):
+    """ Generates ApplicationResponse signed with the mock bank's key.
+
+    @type  content: string or bytes
+    @param content: Content of the response.
+    @type  pki: L{bankws.mockbank.TestPKI}
+    @param pki: Keys and certificates.
+    @type  filetype: string
+    @param filetype: FileType of the content.
+    @rtype: bytes
+    @return: Signed ApplicationResponse XML.
+    """
+    from bankws import signature
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    text = _APPLICATION_RESPONSE.format(
+                filetype=filetype,
+                content=str(base64.b64encode(content), 'ascii'))
+    return signature.sign(text, pki.bank_key, pki.bank_certificate)
+
+
+_SOAP_ENVELOPE = (
+    '<SOAP-ENV:Envelope '
+    'xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" '
+    'xmlns:ns0="http://model.bxd.fi">'
+    '<SOAP-ENV:Header><wsse:Security xmlns:wsse="http://docs.oasis-open.org/'
+    'wss/2004/01/oasis-200401-wss-wssecurity-secext-1.0.xsd" '
+    'mustUnderstand="true"><wsu:Timestamp xmlns:wsu="http://docs.oasis-open'
+    '.org/wss/2004/01/oasis-200401-wss-wssecurity-utility-1.0.xsd">'
+    '<wsu:Created>2013-01-15T10:00:00.123456Z</wsu:Created>'
+    '<wsu:Expires>2013-01-15T10:01:30.123456Z</wsu:Expires>'
+    '</wsu:Timestamp></wsse:Security></SOAP-ENV:Header>'
+    '<SOAP-ENV:Body><ns0:{operation}>'
+    '<ns0:RequestHeader><ns0:SenderId>1234567890</ns0:SenderId>'
+    '<ns0:RequestId>1</ns0:RequestId>'
+    '<ns0:Timestamp>2013-01-15T12:00:00+02:00</ns0:Timestamp>'
+    '<ns0:Language>FI</ns0:Language><ns0:UserAgent>bankws 1.01'
+    '</ns0:UserAgent><ns0:ReceiverId>OKOYFIHH</ns0:ReceiverId>'
+    '</ns0:RequestHeader><ns0:ApplicationRequest>{request}'
+    '</ns0:ApplicationRequest></ns0:{operation}></SOAP-ENV:Body>'
+    '</SOAP-ENV:Envelope>')
+
+
+def soap_envelope(application_request, operation='uploadFilein'):
+    """ Generates unsigned SOAP request like the one Suds marshals.
+
+    @type  application_request: bytes
+    @param application_request: Base64 encoded ApplicationRequest.
+    @type  operation: string
+    @param operation: Element name of the request.
+    @rtype: bytes
+    @return: SOAP envelope with a WS-Security timestamp.
+    """
+    return _SOAP_ENVELOPE.format(
+                operation=operation,
+                request=str(application_request, 'ascii')).encode('utf-8')
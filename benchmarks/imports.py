@@ -0,0 +1,107 @@
+'''Measures cold start: time to import bankws modules in a new interpreter.
+
+Every module is imported in its own interpreter, best of --repeat runs.
+Results include the time reported by python -X importtime and which heavy
+dependencies the import loaded, so a module that starts loading suds or
+the crypto libraries eagerly again shows up. Results are written as JSON
+like the stages benchmark:
+    >>> python -m benchmarks.imports --output imports.json
+    >>> python -m benchmarks.imports --compare imports.json
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+from benchmarks import stages
+
+MODULES = ('bankws', 'bankws.transactionlistresponse', 'bankws.util',
+           'bankws.c2b', 'bankws.appresponse', 'bankws.signature',
+           'bankws.uploadfile', 'bankws.webservice', 'bankws.plugin',
+           'bankws.transport', 'bankws.idservice')
+HEAVY = ('suds.client', 'Crypto', 'OpenSSL', 'cryptography', 'numpy',
+         'pyarrow', 'http.server', 'urllib.request')
+""" Dependencies whose import is reported. """
+
+_PROBE = '''
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(repr((elapsed, heavy)))
+'''
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(module):
+    """ Imports module in new interpreter.
+
+    @rtype: tuple(float, float, list<string>)
+    @return: Seconds measured inside the interpreter, seconds reported by
+             -X importtime and loaded heavy dependencies.
+    """
+    process = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c',
+                 _PROBE.format(module=module, heavy=HEAVY)],
+                cwd=_ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                universal_newlines=True, check=True)
+    elapsed, heavy = eval(process.stdout.strip().splitlines()[-1])
+    reported = 0
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            reported = int(parts[1]) / 1e6
+    return elapsed, reported, heavy
+
+
+def run(modules=MODULES, repeat=5):
+    """ Measures modules.
+
+    @rtype: dict
+    @return: Results and environment, as written to the JSON file.
+    """
+    results = []
+    for module in modules:
+        runs = [_run(module) for i in range(repeat)]
+        best = min(elapsed for elapsed, reported, heavy in runs)
+        reported = min(reported for elapsed, reported, heavy in runs)
+        heavy = runs[-1][2]
+        print("{0:<34} {1:8.1f} ms {2:8.1f} ms  {3}".format(
+              module, best * 1000, reported * 1000, ', '.join(heavy)))
+        results.append({'stage': 'import ' + module, 'size': 'cold',
+                        'items': 1, 'bytes': 0, 'repeat': repeat,
+                        'best_s': best, 'importtime_s': reported,
+                        'mean_s': sum(r[0] for r in runs) / len(runs),
+                        'runs_s': [r[0] for r in runs], 'loaded': heavy})
+    return {'format': stages.FORMAT_VERSION,
+            'created': datetime.now().isoformat(),
+            'environment': stages._environment(),
+            'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+                description="Benchmark import time of bankws modules.")
+    parser.add_argument('--modules', default=','.join(MODULES),
+                        help="comma separated modules")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='benchmark-imports.json')
+    parser.add_argument('--compare', help="earlier JSON result file")
+    args = parser.parse_args(argv)
+    print("{0:<34} {1:>11} {2:>11}  {3}".format('module', 'best', 'importtime',
+                                                 'loaded'))
+    report = run([module for module in args.modules.split(',') if module],
+                 args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("Results written to {0}".format(args.output))
+    if args.compare:
+        stages._compare(report['results'], args.compare)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
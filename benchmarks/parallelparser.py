@@ -0,0 +1,45 @@
+'''Measures scaling of parallel statement parsing with number of processes.
+
+Usage:
+    >>> python -m benchmarks.parallelparser [files] [transactions per file]
+'''
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import fixtures
+from bankws import bulkparser
+from bankws import parallelparser
+
+
+def _best(function, repeat=3):
+    """ Gets best wall clock time of function. """
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(files=64, transactions=20000):
+    with tempfile.TemporaryDirectory() as directory:
+        size = fixtures.write_tito_archive(directory, files, transactions)
+        print("Archive: {0} files, {1:.1f} MB".format(files, size / 1e6))
+        serial = _best(lambda: bulkparser.parse_columns(directory))
+        print("{0:<12} {1:8.3f} s {2:8.3f} GB/s".format("serial", serial,
+                                                         size / serial / 1e9))
+        processes = 1
+        while processes <= (os.cpu_count() or 1):
+            elapsed = _best(lambda: parallelparser.parse_columns(
+                                        directory, processes=processes))
+            print("{0:<12} {1:8.3f} s {2:8.3f} GB/s  speedup {3:5.2f}".format(
+                  "{0} procs".format(processes), elapsed,
+                  size / elapsed / 1e9, serial / elapsed))
+            processes *= 2
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:3]])
@@ -0,0 +1,150 @@
+'''Replays recorded SOAP traffic through WebService and times the client side.
+
+A recording is made with bankws.recording.RecordingTransport, either from
+production or with the "record" command against bankws.mockbank:
+    >>> python -m benchmarks.replay record traffic.jsonl --size medium
+    >>> python -m benchmarks.replay replay traffic.jsonl --repeat 5
+
+Replay calls the WebService operation of every recorded SOAP request in
+order; arguments don't matter because replies come from the recording.
+Without --speed replies come without waiting, so the times are those of
+signing, verifying and parsing and don't depend on the network.
+
+Signatures of replies are validated, so the suite runs in a temporary
+directory with the revocation list of the test PKI in resources/.
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import fixtures
+from bankws import instrumentation, mockbank, recording
+from bankws.bank import Bank
+from bankws.webservice import WebService
+
+ACCOUNT = '50009420028730'
+CUSTOMER_ID = '1234567890'
+_OPERATIONS = {
+    'uploadFile': lambda ws: ws.upload_file('<Replay/>'),
+    'downloadFileList': lambda ws: ws.download_filelist('NEW'),
+    'downloadFile': lambda ws: ws.download_file('1'),
+}
+
+
+def record(filename, size, files=5, latency=0.0):
+    """ Records transaction query, file list and downloads from mock bank.
+
+    @type  filename: string
+    @param filename: Recording, appended to.
+    @type  size: string
+    @param size: Name of fixture size of the statement and files.
+    @type  files: int
+    @param files: Number of files downloaded.
+    @type  latency: float
+    @param latency: Latency of the mock bank in seconds.
+    """
+    pki = fixtures.test_pki()
+    count = fixtures.SIZES[size]
+    with mockbank.MockBank(pki, latency=latency, seed=0) as server:
+        account = server.add_statement(fixtures.tito_statement(count,
+                                                               account=ACCOUNT))
+        statement = fixtures.tito_statement(count, account=ACCOUNT)
+        references = [server.add_file(statement.encode('iso-8859-1'),
+                                      mockbank.STATEMENT_FILETYPE)
+                      for i in range(files)]
+        ws = WebService(CUSTOMER_ID, pki.client_key, pki.client_certificate,
+                        server.bank,
+                        http_transport=recording.RecordingTransport(filename))
+        ws.transaction_query(account)
+        ws.download_filelist('NEW')
+        for reference in references:
+            ws.download_file(reference)
+
+
+def _bank(records):
+    """ Gets bank whose WSDL url is the first recorded document. """
+    for record in records:
+        if record['kind'] == 'open':
+            return Bank('REPLAY', record['url'], record['url'])
+    raise ValueError("Recording has no WSDL")
+
+
+def replay(filename, repeat=3, speed=None):
+    """ Replays recording repeat times and prints the best times.
+
+    @type  filename: string
+    @param filename: Recording.
+    @type  repeat: int
+    @param repeat: Number of replays.
+    @type  speed: float
+    @param speed: Speed of replies, None for no waiting.
+    @rtype: dict
+    @return: Best seconds by operation and stage.
+    """
+    records = recording.read_records(filename)
+    actions = [record['action'].rsplit('/', 1)[-1] for record in records
+               if record['kind'] == 'send']
+    unknown = set(actions) - set(_OPERATIONS)
+    if unknown:
+        raise ValueError("Can't replay {0}".format(', '.join(sorted(unknown))))
+    pki = fixtures.test_pki()
+    bank = _bank(records)
+    best = {}
+    for i in range(repeat):
+        recorder = instrumentation.Recorder()
+        ws = WebService(CUSTOMER_ID, pki.client_key, pki.client_certificate,
+                        bank, instruments=[recorder],
+                        http_transport=recording.ReplayTransport(filename,
+                                                                 speed))
+        start = time.perf_counter()
+        for action in actions:
+            try:
+                _OPERATIONS[action](ws)
+            except RuntimeError:
+                # Recorded error replies are replayed too.
+                pass
+        totals = recorder.totals()
+        totals[('replay', None)] = time.perf_counter() - start
+        for key, seconds in totals.items():
+            best[key] = min(seconds, best.get(key, seconds))
+    for (operation, stage), seconds in sorted(best.items(), key=str):
+        print("{0:<20} {1:<22} {2:9.4f} s".format(operation,
+                                                   stage or '(total)',
+                                                   seconds))
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+                description="Record or replay web service traffic.")
+    parser.add_argument('command', choices=('record', 'replay'))
+    parser.add_argument('filename')
+    parser.add_argument('--size', default='small',
+                        choices=sorted(fixtures.SIZES))
+    parser.add_argument('--files', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--speed', type=float,
+                        help="replay speed, e.g. 1 for recorded timing")
+    args = parser.parse_args(argv)
+
+    filename = os.path.abspath(args.filename)
+    pki = fixtures.test_pki()
+    directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            pki.write_crl(os.path.join('resources', 'OP-Pohjola-ws.crl'))
+            if args.command == 'record':
+                record(filename, args.size, args.files, args.latency)
+                print("Recorded to {0}".format(args.filename))
+            else:
+                replay(filename, args.repeat, args.speed)
+        finally:
+            os.chdir(directory)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,94 @@
+'''Measures throughput of signing GetFile ApplicationRequests inline and with
+bankws.signingservice.SigningService, and writes the results as JSON.
+
+Inline signing uses one core. The service is measured with sign_many and
+with futures for every number of worker processes up to --processes:
+    >>> python -m benchmarks.signing --requests 2000 --processes 4
+    >>> python -m benchmarks.signing --compare old.json --output new.json
+'''
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+from benchmarks import fixtures, stages
+from bankws import signature
+from bankws.getfile import GetFile
+from bankws.signingservice import SigningService
+
+CUSTOMER_ID = '1234567890'
+
+
+def _messages(pki, count):
+    """ Gets unsigned GetFile ApplicationRequests. """
+    messages = []
+
+    class Capture(GetFile):
+        def _sign(self, message):
+            messages.append(message)
+
+    request = Capture(CUSTOMER_ID, 'TEST', pki.client_key,
+                      pki.client_certificate)
+    for i in range(count):
+        request.generate_message(str(i))
+    return messages
+
+
+def run(count, processes, repeat=3):
+    """ Runs inline and service signing.
+
+    @type  count: int
+    @param count: Number of requests signed per run.
+    @type  processes: int
+    @param processes: Largest number of worker processes.
+    @rtype: dict
+    @return: Results and environment, as written to the JSON file.
+    """
+    pki = fixtures.test_pki()
+    messages = _messages(pki, count)
+    size = sum(len(message) for message in messages)
+    results = [stages._measure(
+        'inline', 'fixed', count, size,
+        lambda: [signature.sign(message, pki.client_key,
+                                pki.client_certificate)
+                 for message in messages], repeat)]
+    for workers in range(1, processes + 1):
+        with SigningService(pki.client_key, pki.client_certificate,
+                            workers) as signer:
+            # Starts the workers.
+            signer.sign_many(messages[:workers])
+            results.append(stages._measure(
+                'sign_many {0}'.format(workers), 'fixed', count, size,
+                lambda: signer.sign_many(messages), repeat))
+            results.append(stages._measure(
+                'submit {0}'.format(workers), 'fixed', count, size,
+                lambda: [future.result() for future in
+                         [signer.submit(message) for message in messages]],
+                repeat))
+    return {'format': stages.FORMAT_VERSION,
+            'created': datetime.now().isoformat(),
+            'environment': stages._environment(),
+            'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+                description="Benchmark signing with worker processes.")
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='benchmark-signing.json')
+    parser.add_argument('--compare', help="earlier JSON result file")
+    args = parser.parse_args(argv)
+
+    report = run(args.requests, args.processes, args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("Results written to {0}".format(args.output))
+    if args.compare:
+        stages._compare(report['results'], args.compare)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,214 @@
+'''Measures the stages of web service calls and writes the results as JSON.
+
+Stages are building and signing ApplicationRequests (UploadFile, GetFile,
+GetFileList), signing and validating XML signatures, signing SOAP
+envelopes in SignerPlugin.sending, parsing ApplicationResponses and
+"Tapahtumaotekysely" statements and generating C2B-messages. Every stage
+runs at fixture sizes given as number of transactions in the payload.
+
+Results are printed and written to a JSON file together with the
+environment, so runs of different releases can be compared:
+    >>> python -m benchmarks.stages --sizes small,medium --output new.json
+    >>> python -m benchmarks.stages --compare old.json --output new.json
+
+Signatures are made with the test PKI of bankws.mockbank. Validation
+checks the revocation list in resources/ of the working directory, so the
+suite runs in a temporary directory with a list of the test CA there.
+'''
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks import fixtures
+from bankws import plugin, signature
+from bankws.appresponse import ApplicationResponse
+from bankws.getfile import GetFile
+from bankws.getfilelist import GetFileList
+from bankws.transactionlistresponse import TransactionListResponse
+from bankws.uploadfile import UploadFile
+
+FORMAT_VERSION = 1
+""" Version of the JSON result format. """
+CUSTOMER_ID = '1234567890'
+
+
+class _Context():
+    """ Message context for L{plugin.SignerPlugin}. """
+    def __init__(self, envelope):
+        self.envelope = envelope
+
+
+def _measure(stage, size, items, data_bytes, function, repeat=3):
+    """ Runs function repeat times and prints the best run.
+
+    @rtype: dict
+    @return: Result of the stage.
+    """
+    runs = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        runs.append(time.perf_counter() - start)
+    best = min(runs)
+    print("{0:<28} {1:<7} {2:>7} items {3:>10} bytes {4:9.4f} s".format(
+          stage, size, items, data_bytes, best))
+    return {'stage': stage, 'size': size, 'items': items,
+            'bytes': data_bytes, 'repeat': repeat, 'best_s': best,
+            'mean_s': sum(runs) / len(runs), 'runs_s': runs}
+
+
+def _sending(signer, envelope):
+    signer.sending(_Context(envelope))
+
+
+def _fixed_stages(pki, repeat):
+    """ Measures stages whose payload doesn't depend on size. """
+    get_file = GetFile(CUSTOMER_ID, 'TEST', pki.client_key,
+                       pki.client_certificate)
+    file_list = GetFileList(CUSTOMER_ID, 'TEST', pki.client_key,
+                            pki.client_certificate)
+    get_file.generate_message('1')
+    file_list.generate_message('NEW')
+    return [
+        _measure('GetFile.generate_message', 'fixed', 1,
+                 len(get_file.text),
+                 lambda: get_file.generate_message('1'), repeat),
+        _measure('GetFileList.generate_message', 'fixed', 1,
+                 len(file_list.text),
+                 lambda: file_list.generate_message('NEW'), repeat)]
+
+
+def _sized_stages(pki, size, count, repeat):
+    """ Measures stages whose payload has count transactions. """
+    results = []
+    message = fixtures.c2b_message(count)
+    results.append(_measure('C2B.to_bytes', size, count,
+                            len(message.to_bytes()), message.to_bytes,
+                            repeat))
+    document = message.to_bytes()
+    results.append(_measure(
+            'signature.sign', size, count, len(document),
+            lambda: signature.sign(document, pki.client_key,
+                                   pki.client_certificate), repeat))
+    signed = signature.sign(document, pki.client_key, pki.client_certificate)
+    results.append(_measure('signature.validate', size, count, len(signed),
+                            lambda: signature.validate(signed), repeat))
+
+    upload = UploadFile(CUSTOMER_ID, 'TEST', pki.client_key,
+                        pki.client_certificate)
+    content = str(document, 'utf-8')
+    results.append(_measure('UploadFile.generate_message', size, count,
+                            len(document),
+                            lambda: upload.generate_message(content),
+                            repeat))
+    upload.generate_message(content)
+    envelope = fixtures.soap_envelope(upload.get_request())
+    signer = plugin.SignerPlugin(pki.client_key, pki.client_certificate)
+    results.append(_measure('SignerPlugin.sending', size, count,
+                            len(envelope),
+                            lambda: _sending(signer, envelope), repeat))
+
+    statement = fixtures.tito_statement(count, account='50009420028730')
+    response = fixtures.application_response(statement, pki)
+    results.append(_measure('ApplicationResponse', size, count,
+                            len(response),
+                            lambda: ApplicationResponse(response).content,
+                            repeat))
+    results.append(_measure('TransactionListResponse', size, count,
+                            len(statement),
+                            lambda: TransactionListResponse(statement),
+                            repeat))
+    return results
+
+
+def _environment():
+    """ Gets information of the machine and the code that was measured. """
+    try:
+        commit = subprocess.check_output(
+                    ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                    cwd=os.path.dirname(os.path.abspath(__file__))
+                    ).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpus': os.cpu_count(),
+            'commit': commit}
+
+
+def _compare(results, filename):
+    """ Prints best times relative to an earlier result file. """
+    with open(filename) as f:
+        old = json.load(f)
+    previous = dict(((result['stage'], result['size']), result['best_s'])
+                    for result in old['results'])
+    print("\nCompared to {0} ({1})".format(filename,
+                                           old['environment']['commit']))
+    for result in results:
+        key = (result['stage'], result['size'])
+        if key in previous and previous[key] > 0:
+            print("{0:<28} {1:<7} {2:7.2f}x".format(
+                  key[0], key[1], result['best_s'] / previous[key]))
+
+
+def run(sizes, repeat=3):
+    """ Runs all stages.
+
+    @type  sizes: list<string>
+    @param sizes: Names of fixture sizes in L{fixtures.SIZES}.
+    @type  repeat: int
+    @param repeat: Runs per stage.
+    @rtype: dict
+    @return: Results and environment, as written to the JSON file.
+    """
+    pki = fixtures.test_pki()
+    directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            pki.write_crl(os.path.join('resources', 'OP-Pohjola-ws.crl'))
+            results = _fixed_stages(pki, repeat)
+            for size in sizes:
+                results.extend(_sized_stages(pki, size, fixtures.SIZES[size],
+                                             repeat))
+        finally:
+            os.chdir(directory)
+    return {'format': FORMAT_VERSION,
+            'created': datetime.now().isoformat(),
+            'environment': _environment(),
+            'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+                description="Benchmark web service call stages.")
+    parser.add_argument('--sizes', default='small,medium',
+                        help="comma separated sizes of {0}".format(
+                             ', '.join(sorted(fixtures.SIZES))))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='benchmark-stages.json')
+    parser.add_argument('--compare', help="earlier JSON result file")
+    args = parser.parse_args(argv)
+    sizes = [size for size in args.sizes.split(',') if size]
+    unknown = [size for size in sizes if size not in fixtures.SIZES]
+    if unknown:
+        parser.error("unknown sizes: {0}".format(', '.join(unknown)))
+
+    report = run(sizes, args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("Results written to {0}".format(args.output))
+    if args.compare:
+        _compare(report['results'], args.compare)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])